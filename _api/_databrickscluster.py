@@ -54,6 +54,12 @@ class APIDatabricksCluster(metaclass=_meta_.MetaAPI):
         # exit(0)
 
 
+    def close(self) -> None:
+        """ stop the databricks connect session, called when the cached instance is evicted from _connect
+
+        """
+        self.client.stop()
+
     def raw_query(self, query_string: str, ignore_error_flg: bool=False, logger: Log = None) -> pd.DataFrame:
         """ execute sql in the databricks compute class and return the query result
 
@@ -15,6 +15,9 @@ from pprint import pprint
 
 
 class AwsApiRedshift(metaclass=_meta_.Meta):
+    # the session is replaced by change_account_by_profile_name and switch_aws_account, not cached
+    __reusable__ = False
+
     def __init__(self, config: _config_.ConfigSingleton = None, logger: Log = None):
         self._config = config if config else _config_.ConfigSingleton("config_dev")
 
@@ -33,14 +36,14 @@ class AwsApiRedshift(metaclass=_meta_.Meta):
             self._config.config.get("aws_profile_name") and self._config.config.get("aws_region_name") else _aws_config_.setup_session(self._config)
         # print(self._session)
         # exit(0)
-        self._client = self._session.client("redshift")
+        self._client = _aws_config_.get_client(self._session, "redshift")
 
 
 
     @_common_.exception_handler
     def change_account_by_profile_name(self, profile_name: str, aws_region: str):
         self._session = _aws_config_.setup_session_by_profile(profile_name, aws_region)
-        self._client = self._session.client("redshift")
+        self._client = _aws_config_.get_client(self._session, "redshift")
 
     def switch_aws_account(self, account_name: str, logger: Log = None) -> bool:
         try:
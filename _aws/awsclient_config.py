@@ -1,7 +1,12 @@
 import base64
+import hashlib
+import itertools
+import threading
+import weakref
 import boto3
 from boto3 import session
 from inspect import currentframe
+from typing import Dict, Tuple
 from botocore.config import Config
 from logging import Logger as Log
 from _common import _common as _common_
@@ -17,16 +22,136 @@ iaws_config = Config(
     }
 )
 
+__DEFAULT_MAX_POOL_CONNECTIONS__ = 50
+
+# process wide pool, sessions are keyed by their credential source and clients by
+# (credential source, region, service, botocore config). boto3 clients are thread safe once created but
+# session.client() is not, so creation happens under the lock
+_pool_lock = threading.RLock()
+_session_pool: Dict[Tuple, session.Session] = {}
+_session_keys = weakref.WeakKeyDictionary()
+_client_pool: Dict[Tuple, object] = {}
+_foreign_session_ids = itertools.count()
+_pool_stats = {"hits": 0, "misses": 0}
+_max_pool_connections = __DEFAULT_MAX_POOL_CONNECTIONS__
+
+
+def _credential_fingerprint(aws_access_key_id: str, aws_secret_access_key: str) -> str:
+    return hashlib.sha256(f"{aws_access_key_id}:{aws_secret_access_key}".encode("UTF-8")).hexdigest()[:16]
+
+
+def _get_or_create_session(session_key: Tuple, **session_parameters) -> session.Session:
+    with _pool_lock:
+        if (_session := _session_pool.get(session_key)) is None:
+            _session = boto3.session.Session(**session_parameters)
+            _session_pool[session_key] = _session
+            _session_keys[_session] = session_key
+        return _session
+
+
+def _client_config_key(client_config: Config) -> Tuple:
+    return tuple(sorted((_name, repr(_value)) for _name, _value in client_config._user_provided_options.items()))
+
+
+def _evict_session(session_key: Tuple) -> None:
+    """ drop the clients of a session which is gone, called when a session not created here is garbage collected """
+    with _pool_lock:
+        for _each_key in [each_key for each_key in _client_pool if each_key[0] == session_key]:
+            del _client_pool[_each_key]
+
+
+def set_max_pool_connections(max_pool_connections: int) -> None:
+    """ set the default size of the connection pool of clients created from now on
+
+    Args:
+        max_pool_connections: maximum number of connections kept by each client
+
+    """
+    global _max_pool_connections
+    _max_pool_connections = max_pool_connections
+
+
+def get_client(iaws_session: session.Session,
+               service_name: str,
+               client_config: Config = None,
+               max_pool_connections: int = None,
+               logger: Log = None):
+    """ return a pooled client of the service, the same client (and its connection pool) is handed to every
+        caller with the same credential source, region, service and botocore config
+
+    Args:
+        iaws_session: session returned by one of the setup_session functions
+        service_name: aws service name, for example s3
+        client_config: optional botocore config, merged on top of the pool defaults
+        max_pool_connections: size of the client connection pool, defaults to set_max_pool_connections()
+        logger: logger object
+
+    Returns: boto3 client
+
+    """
+    try:
+        _client_config = Config(max_pool_connections=max_pool_connections or _max_pool_connections)
+        if client_config:
+            _client_config = _client_config.merge(client_config)
+
+        with _pool_lock:
+            if (_session_key := _session_keys.get(iaws_session)) is None:
+                # session was not created by this module, pool it under its own identity
+                _session_key = ("session", next(_foreign_session_ids))
+                _session_keys[iaws_session] = _session_key
+                # its clients live as long as the session, the pool does not keep them alive
+                weakref.finalize(iaws_session, _evict_session, _session_key)
+            _client_key = (_session_key, iaws_session.region_name, service_name, _client_config_key(_client_config))
+            if (_client := _client_pool.get(_client_key)) is not None:
+                _pool_stats["hits"] += 1
+                return _client
+            _pool_stats["misses"] += 1
+            _client = iaws_session.client(service_name, config=_client_config)
+            _client_pool[_client_key] = _client
+            return _client
+
+    except Exception as err:
+        _common_.error_logger(currentframe().f_code.co_name,
+                              err,
+                              logger=logger,
+                              mode="error",
+                              ignore_flag=False)
+
+
+def client_pool_stats() -> Dict[str, int]:
+    """ return the hit / miss counters along with the number of live sessions and clients
+
+    Returns: a dictionary of pool statistics
+
+    """
+    with _pool_lock:
+        return {**_pool_stats, "sessions": len(_session_pool), "live_clients": len(_client_pool)}
+
+
+def clear_client_pool() -> None:
+    """ drop every pooled session and client, for example after credentials are rotated. the clients are not
+        closed, objects still holding one keep working and the next get_client creates a new one
+
+    """
+    with _pool_lock:
+        _client_pool.clear()
+        _session_pool.clear()
+        _session_keys.clear()
+        _pool_stats.update({"hits": 0, "misses": 0})
+
 
 def setup_session_by_credential(aws_access_key_id: str,
                                 aws_secret_access_key: str,
                                 aws_region_name: str,
                                 logger: Log = None):
     try:
-        return boto3.session.Session(aws_access_key_id=base64.b64decode(aws_access_key_id).decode("UTF-8"),
-                                     aws_secret_access_key=base64.b64decode(aws_secret_access_key).decode("UTF-8"),
-                                     region_name=aws_region_name
-                                     )
+        _aws_access_key_id = base64.b64decode(aws_access_key_id).decode("UTF-8")
+        _aws_secret_access_key = base64.b64decode(aws_secret_access_key).decode("UTF-8")
+        return _get_or_create_session(("credential", _credential_fingerprint(_aws_access_key_id, _aws_secret_access_key), aws_region_name),
+                                      aws_access_key_id=_aws_access_key_id,
+                                      aws_secret_access_key=_aws_secret_access_key,
+                                      region_name=aws_region_name
+                                      )
 
 
         # return boto3.session.Session(aws_access_key_id=aws_access_key_id,
@@ -45,7 +170,9 @@ def setup_session_by_profile(profile_name: str,
                              aws_region_name: str,
                              logger: Log = None):
     try:
-        return boto3.session.Session(profile_name=profile_name, region_name=aws_region_name)
+        return _get_or_create_session(("profile", profile_name, aws_region_name),
+                                      profile_name=profile_name,
+                                      region_name=aws_region_name)
 
     except Exception as err:
         _common_.error_logger(currentframe().f_code.co_name,
@@ -57,10 +184,10 @@ def setup_session_by_profile(profile_name: str,
 
 def setup_session(config: _config_.AwsApiConfig, logger: Log = None):
     try:
-        return session.Session(aws_access_key_id=base64.b64decode(config.config.get("aws_access_key_id", "")).decode("UTF-8"),
-                               aws_secret_access_key=base64.b64decode(config.config.get("aws_secret_access_key", "")).decode("UTF-8"),
-                               region_name=config.config.get("aws_region_name", "")
-                               )
+        return setup_session_by_credential(config.config.get("aws_access_key_id", ""),
+                                           config.config.get("aws_secret_access_key", ""),
+                                           config.config.get("aws_region_name", ""),
+                                           logger=logger)
     except Exception as err:
         _common_.error_logger(currentframe().f_code.co_name,
                               err,
@@ -71,10 +198,10 @@ def setup_session(config: _config_.AwsApiConfig, logger: Log = None):
 
 def setup_session_by_prefix(config: _config_.AwsApiConfig, aws_account_prefix: str = "tag", logger: Log = None):
     try:
-        return boto3.session.Session(aws_access_key_id=base64.b64decode(config.config.get(f"{aws_account_prefix}_aws_access_key_id", "")).decode("UTF-8"),
-                                     aws_secret_access_key=base64.b64decode(config.config.get(f"{aws_account_prefix}_aws_secret_access_key", "")).decode("UTF-8"),
-                                     region_name=config.config.get(f"{aws_account_prefix}_aws_region_name", "")
-                                    )
+        return setup_session_by_credential(config.config.get(f"{aws_account_prefix}_aws_access_key_id", ""),
+                                           config.config.get(f"{aws_account_prefix}_aws_secret_access_key", ""),
+                                           config.config.get(f"{aws_account_prefix}_aws_region_name", ""),
+                                           logger=logger)
 
     except Exception as err:
         _common_.error_logger(currentframe().f_code.co_name,
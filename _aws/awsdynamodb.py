@@ -16,7 +16,7 @@ class AwsApiDynamoDB(metaclass=_meta_.Meta):
     def __init__(self, config: _config_.ConfigSingleton = None, logger: Log = None):
         self._config = config if config else _config_.ConfigSingleton()
         self._session = _aws_config_.setup_session(self._config)
-        self._client = self._session.client("dynamodb")
+        self._client = _aws_config_.get_client(self._session, "dynamodb")
 
     @_common_.exception_handler
     def describe_table(self, table_name: str, logger: Log = None) -> Dict:
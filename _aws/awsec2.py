@@ -18,24 +18,27 @@ __WAIT_TIME__ = 5
 
 
 class AwsApiAWSEC2(metaclass=_meta_.Meta):
+    # change_account_by_profile_name / _by_credential rebind the client, every caller gets its own instance
+    __reusable__ = False
+
     def __init__(self, config: _config_.ConfigSingleton = None, logger: Log = None):
         self._config = config if config else _config_.ConfigSingleton("config_dev")
 
         self._session = _aws_config_.setup_session_by_profile(self._config.config.get("aws_profile_name"), self._config.config.get("aws_region_name")) if \
             self._config.config.get("aws_profile_name") and self._config.config.get("aws_region_name") else _aws_config_.setup_session(self._config)
-        self._client = self._session.client("ec2")
+        self._client = _aws_config_.get_client(self._session, "ec2")
 
     @_common_.exception_handler
     def change_account_by_profile_name(self, profile_name: str, aws_region: str):
         self._session = _aws_config_.setup_session_by_profile(profile_name, aws_region)
-        self._client = self._session.client("ec2")
+        self._client = _aws_config_.get_client(self._session, "ec2")
 
     @_common_.exception_handler
     def change_account_by_credential(self, aws_access_key_id: str, aws_secret_access_key: str, aws_region: str):
         self._session = _aws_config_.setup_session_by_credential(aws_access_key_id,
                                                                  aws_secret_access_key,
                                                                  aws_region)
-        self._client = self._session.client("ec2")
+        self._client = _aws_config_.get_client(self._session, "ec2")
 
     @_common_.exception_handler
     def describe_instance(self,
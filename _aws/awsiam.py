@@ -15,7 +15,7 @@ class AwsApiAWSIAM(metaclass=_meta_.Meta):
 
         self._session = _aws_config_.setup_session_by_profile(self._config.config.get("aws_profile_name"), self._config.config.get("aws_region_name")) if \
             self._config.config.get("aws_profile_name") and self._config.config.get("aws_region_name") else _aws_config_.setup_session(self._config)
-        self._client = self._session.client("iam")
+        self._client = _aws_config_.get_client(self._session, "iam")
 
     @_common_.exception_handler
     def list_roles(self,
@@ -15,7 +15,7 @@ class AwsApiAWSLambda(metaclass=_meta_.Meta):
         self._session = _aws_config_.setup_session_by_profile(self._config.config.get("aws_profile_name"), self._config.config.get("aws_region_name")) if \
             self._config.config.get("aws_profile_name") and self._config.config.get("aws_region_name") else _aws_config_.setup_session(self._config)
 
-        self._client = self._session.client("lambda")
+        self._client = _aws_config_.get_client(self._session, "lambda")
 
     @_common_.cache_result("/Users/jhuang15/opt/miniconda3/envs/identity_meta/identity_meta/Save/preprod_lambda_arn_name.json")
     @_common_.get_aws_resource("Marker")
@@ -20,7 +20,7 @@ class AwsApiAWSRDS(metaclass=_meta_.Meta):
 
         self._session = _aws_config_.setup_session_by_profile(self._config.config.get("aws_profile_name"), self._config.config.get("aws_region_name")) if \
             self._config.config.get("aws_profile_name") and self._config.config.get("aws_region_name") else _aws_config_.setup_session(self._config)
-        self._client = self._session.client("rds")
+        self._client = _aws_config_.get_client(self._session, "rds")
 
     def switch_aws_account(self, account_name: str, logger: Log = None) -> bool:
         try:
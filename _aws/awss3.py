@@ -1,13 +1,17 @@
 import random
-import time
 from inspect import currentframe
-from typing import List, Dict
+from typing import List, Dict, Iterator, Tuple
 from logging import Logger as Log
 from botocore.exceptions import ClientError
 from _meta import _meta as _meta_
 from _config import config as _config_
 from _common import _common as _common_
 from _aws import awsclient_config as _aws_config_
+from _aws import awss3_listing as _s3_listing_
+from _aws import awss3_transfer as _s3_transfer_
+from _aws import awss3_inventory as _s3_inventory_
+from _aws import awss3_head as _s3_head_
+from _aws import awss3_reader as _s3_reader_
 from _util import _util_common as _util_
 from pprint import pprint
 from botocore.exceptions import ClientError
@@ -15,6 +19,9 @@ from botocore.exceptions import ClientError
 
 
 class AwsApiAWSS3(metaclass=_meta_.Meta):
+    # switch_account_by_credential moves the instance to another account, it is never shared
+    __reusable__ = False
+
     def __init__(self,
                  profile_name: str,
                  config: _config_.ConfigSingleton = None, logger: Log = None):
@@ -25,7 +32,10 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
 
         self._session = _aws_config_.setup_session_by_profile(icase_aws_profile_name, icase_aws_region_name) if \
             icase_aws_profile_name and icase_aws_region_name else _aws_config_.setup_session(self._config)
-        self._client = self._session.client("s3")
+        # bulk transfers run several multipart transfers at once, the pool has to cover all of their parts
+        self._max_pool_connections = int(self._config.config.get("S3_MAX_POOL_CONNECTIONS") or 128)
+        self._client = _aws_config_.get_client(self._session, "s3", max_pool_connections=self._max_pool_connections)
+        self._transfer_config = _s3_transfer_.get_transfer_config_from_profile(self._config)
 
 
     def check_s3_object_exist(self, s3_filepath: str, logger: Log = None) -> bool:
@@ -49,6 +59,43 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
         except Exception as err:
             return False
 
+    @_common_.exception_handler
+    def head_many(self,
+                  s3_filepaths: List[str],
+                  max_workers: int = _s3_head_.__DEFAULT_MAX_WORKERS__,
+                  use_listing: bool = True,
+                  logger: Log = None) -> Dict[str, _s3_head_.HeadResult]:
+        """the method checks the existence, size and etag of many s3 objects, keys sharing a prefix are resolved
+        with a listing when it is cheaper than one HEAD request per key
+
+        Args:
+            s3_filepaths: A list of s3 filepaths
+            max_workers: number of concurrent requests
+            use_listing: resolve keys sharing a prefix with a listing, False forces one HEAD request per key
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a dictionary of s3 filepath to HeadResult (exists, size, etag, last modified, error)
+
+        """
+        return _s3_head_.head_many(self._client, s3_filepaths, max_workers=max_workers, use_listing=use_listing, logger=logger)
+
+    @_common_.exception_handler
+    def exists_many(self,
+                    s3_filepaths: List[str],
+                    max_workers: int = _s3_head_.__DEFAULT_MAX_WORKERS__,
+                    logger: Log = None) -> Dict[str, bool]:
+        """the method checks whether each s3 object exists, see head_many
+
+        Args:
+            s3_filepaths: A list of s3 filepaths
+            max_workers: number of concurrent requests
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a dictionary of s3 filepath to whether the object exists
+
+        """
+        return _s3_head_.exists_many(self._client, s3_filepaths, max_workers=max_workers, logger=logger)
+
     @_common_.exception_handler
     def switch_account_by_credential(self,
                                      aws_access_key_id: str,
@@ -59,7 +106,7 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
                                                                  aws_secret_access_key,
                                                                  aws_region_name,
                                                                  logger=logger)
-        self._client = self._session.client("s3")
+        self._client = _aws_config_.get_client(self._session, "s3", max_pool_connections=self._max_pool_connections)
         return True
 
     def list_buckets(self, logger: Log = None, *args, **kwargs) -> Dict:
@@ -106,51 +153,47 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
                                  mode="error",
                                  ignore_flag=False)
 
-    @_common_.exception_handler
-    def list_objects_version(self,
+    def iter_objects_version(self,
                              bucket_name: str,
                              prefix: str,
                              search_like: str = "",
-                             logger: Log = None) -> List:
+                             max_workers: int = _s3_listing_.__DEFAULT_MAX_WORKERS__,
+                             logger: Log = None) -> Iterator[Tuple]:
+        """The method streams the version id and last modified time of every object version under the prefix
 
-        _result = []
-        _NextVersionIdMarker = None
-        _cnt = 0
-        while True:
-            if prefix:
-                _s3_bucket_prefix = {"Prefix": prefix}
-            else:
-                _s3_bucket_prefix = {}
+        Args:
+            bucket_name: A string representing the name of s3 bucket
+            prefix: A string representing the s3 prefix
+            search_like: only objects whose key contains the string are returned
+            max_workers: number of common prefix shards listed concurrently
+            logger: An optional logger object to use for logging error messages and debugging information
 
-            _parameters = {**{"Bucket": bucket_name}, **_s3_bucket_prefix}
-            if _NextVersionIdMarker:
-                _parameters = {**{"Bucket": bucket_name}, **{"NextVersionIdMarker": _NextVersionIdMarker}}
-            # print(_parameters)
-            _response = self._client.list_object_versions(**_parameters)
+        Returns: yield a tuple of (version id, last modified time)
 
-            if _response.get("ResponseMetadata").get("HTTPStatusCode") != 200:
-                _common_.error_logger(currentframe().f_code.co_name,
-                                     f"not able to retrieve object",
-                                     logger=logger,
-                                     mode="error",
-                                     ignore_flag=False)
-                return _result
-            # for _each_record in _response.get("Versions", []):
-            #     print(_each_record)
-            # exit(0)
-            for _each_record in _response.get("Versions", []):
-                _cnt += 1
-                if _cnt % 2000 == 0:
-                    _common_.info_logger(f"processed {_cnt} records", logger=logger)
-                if search_like:
-                    if search_like not in _each_record.get("Key", ""): continue
-                _result.append((_each_record.get("VersionId"), _each_record.get("LastModified")))
-            if not _response.get("IsTruncated"):
-                return _result
-            else:
-                _NextVersionIdMarker = _response.get("NextVersionIdMarker")
+        """
+        for _cnt, _each_record in enumerate(_s3_listing_.iter_objects(self._client,
+                                                                      bucket_name,
+                                                                      prefix,
+                                                                      search_like=search_like,
+                                                                      operation="list_object_versions",
+                                                                      max_workers=max_workers,
+                                                                      logger=logger), 1):
+            if _cnt % _s3_listing_.__PROGRESS_INTERVAL__ == 0:
+                _common_.info_logger(f"processed {_cnt} records", logger=logger)
+            yield _each_record.get("VersionId"), _each_record.get("LastModified")
 
-            time.sleep(2)
+    @_common_.exception_handler
+    def list_objects_version(self,
+                             bucket_name: str,
+                             prefix: str,
+                             search_like: str = "",
+                             max_workers: int = _s3_listing_.__DEFAULT_MAX_WORKERS__,
+                             logger: Log = None) -> List:
+        return list(self.iter_objects_version(bucket_name,
+                                              prefix,
+                                              search_like=search_like,
+                                              max_workers=max_workers,
+                                              logger=logger))
 
     @_common_.exception_handler
     def get_object(self,
@@ -176,66 +219,69 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
         else:
             return _response.get("Body")
 
-    @_common_.exception_handler
-    def list_objects_with_timestamp(self,
+    def open_reader(self,
+                    s3_filepath: str,
+                    version_id: str = "",
+                    block_size: int = _s3_reader_.__DEFAULT_BLOCK_SIZE__,
+                    cache_blocks: int = _s3_reader_.__DEFAULT_CACHE_BLOCKS__,
+                    read_ahead_blocks: int = _s3_reader_.__DEFAULT_READ_AHEAD_BLOCKS__,
+                    logger: Log = None) -> _s3_reader_.S3RangeReader:
+        """the method opens the s3 object as a seekable file object, only the byte ranges actually read are fetched
+        so pyarrow / pandas can read the footer or a subset of columns of a parquet file without downloading it
+
+        Args:
+            s3_filepath: A string representing the s3 filepath
+            version_id: An optional version id of the s3 object
+            block_size: size in bytes of each ranged GET
+            cache_blocks: number of blocks kept in the LRU cache
+            read_ahead_blocks: number of blocks prefetched during sequential reads
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a S3RangeReader object, to be closed by the caller
+
+        """
+        return _s3_reader_.S3RangeReader(self._client,
+                                         s3_filepath,
+                                         version_id=version_id,
+                                         block_size=block_size,
+                                         cache_blocks=cache_blocks,
+                                         read_ahead_blocks=read_ahead_blocks,
+                                         logger=logger)
+
+    def iter_objects_with_timestamp(self,
                                     bucket_name: str,
                                     prefix: str,
                                     search_like: str = "",
-                                    start_time: int = 0,
+                                    start_time: float = 0,
                                     end_time: float = float("inf"),
-                                    logger: Log = None) -> List:
-        _result = []
-        _ContinuationToken = None
-        _cnt = 0
-
-        try:
-
-            while True:
-                if prefix:
-                    _s3_bucket_prefix = {"Prefix": prefix}
-                else:
-                    _s3_bucket_prefix = {}
-
-                _parameters = {**{"Bucket": bucket_name}, **_s3_bucket_prefix}
-                if _ContinuationToken:
-                    _parameters = {**{"Bucket": bucket_name}, **{"ContinuationToken": _ContinuationToken}}
-
-                # print(_parameters)
+                                    max_workers: int = _s3_listing_.__DEFAULT_MAX_WORKERS__,
+                                    logger: Log = None) -> Iterator[Tuple]:
+        """The method streams the s3 filepath and last modified time of every object under the prefix
 
-                _response = self._client.list_objects_v2(**_parameters)
-
-                if _response.get("ResponseMetadata").get("HTTPStatusCode") != 200:
-                    _common_.error_logger(currentframe().f_code.co_name,
-                                         f"not able to retrieve object",
-                                         logger=logger,
-                                         mode="error",
-                                         ignore_flag=False)
-                    return _result
-
-                for _each_record in _response.get("Contents", []):
-                    _cnt += 1
-                    if _cnt % 2000 == 0:
-                        _common_.info_logger(f"processed {_cnt} records", logger=logger)
-
-                    if int(_each_record.get("LastModified").timestamp()) > end_time:
-                        print("returned")
-                        return _result
-                    if search_like:
-                        if search_like not in _each_record.get("Key", ""): continue
-                    _result.append((f"s3://{bucket_name}/{_each_record.get('Key')}", _each_record.get("LastModified")))
-
-                # print(f"istruncated: {_response.get('IsTruncated')}")
-                # print(f"continue: {_response.get('NextContinuationToken')}")
-
-                if not _response.get("IsTruncated"):
-                    return _result
-                else:
-                    _ContinuationToken = _response.get("NextContinuationToken")
-
-                time.sleep(2)
+        Args:
+            bucket_name: A string representing the name of s3 bucket
+            prefix: A string representing the s3 prefix
+            search_like: only objects whose key contains the string are returned
+            start_time: objects last modified before the epoch timestamp are skipped
+            end_time: listing of a shard stops once an object last modified after the epoch timestamp is found
+            max_workers: number of common prefix shards listed concurrently
+            logger: An optional logger object to use for logging error messages and debugging information
 
+        Returns: yield a tuple of (s3 filepath, last modified time)
 
-                # return [{_object.get("Key"): _object.get("LastModified")} for _object in _response.get("Contents", {})]
+        """
+        try:
+            for _cnt, _each_record in enumerate(_s3_listing_.iter_objects(self._client,
+                                                                          bucket_name,
+                                                                          prefix,
+                                                                          search_like=search_like,
+                                                                          start_time=start_time,
+                                                                          end_time=end_time,
+                                                                          max_workers=max_workers,
+                                                                          logger=logger), 1):
+                if _cnt % _s3_listing_.__PROGRESS_INTERVAL__ == 0:
+                    _common_.info_logger(f"processed {_cnt} records", logger=logger)
+                yield f"s3://{bucket_name}/{_each_record.get('Key')}", _each_record.get("LastModified")
 
         except ClientError as err:
             _common_.error_logger(currentframe().f_code.co_name,
@@ -244,6 +290,23 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
                                  mode="error",
                                  ignore_flag=False)
 
+    @_common_.exception_handler
+    def list_objects_with_timestamp(self,
+                                    bucket_name: str,
+                                    prefix: str,
+                                    search_like: str = "",
+                                    start_time: float = 0,
+                                    end_time: float = float("inf"),
+                                    max_workers: int = _s3_listing_.__DEFAULT_MAX_WORKERS__,
+                                    logger: Log = None) -> List:
+        return list(self.iter_objects_with_timestamp(bucket_name,
+                                                     prefix,
+                                                     search_like=search_like,
+                                                     start_time=start_time,
+                                                     end_time=end_time,
+                                                     max_workers=max_workers,
+                                                     logger=logger))
+
     def list_objects(self, bucket_name: str, prefix: str, logger: Log = None) -> List:
         try:
             if prefix:
@@ -414,7 +477,7 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
                        }
 
         try:
-            self._client.upload_file(**_parameters)
+            self._client.upload_file(**_parameters, Config=self._transfer_config)
             return True
 
         except ClientError as err:
@@ -434,6 +497,7 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
         Args:
             source_filepath: A string representing the s3 filepath
             target_filepath: A string representing the local filepath
+            version_id: An optional version id of the s3 object
             logger:  An optional logger object to use for logging error messages and debugging information
 
         Returns: returns True if the source s3 filepath is successfully copied to the target local filepath
@@ -461,14 +525,12 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
                        "Filename": target_filepath,
                        }
 
+        if version_id:
+            _parameters["ExtraArgs"] = {"VersionId": version_id}
+
         try:
-            if version_id:
-                with open(target_filepath, "wb") as file:
-                    file.write(self.get_object(bucket_name=_bucket_name,
-                                               bucket_key=_bucket_key,
-                                               version_id=version_id).read())
-            else:
-                self._client.download_file(**_parameters)
+            # ranged parts are streamed to disk, versioned objects are no longer read into memory
+            self._client.download_file(**_parameters, Config=self._transfer_config)
             return True
 
         except ClientError as err:
@@ -513,7 +575,7 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
 
         try:
             with open(fileobj, "rb") as _data:
-                self._client.upload_fileobj(_data, _bucket_name, _bucket_key)
+                self._client.upload_fileobj(_data, _bucket_name, _bucket_key, Config=self._transfer_config)
             return True
 
         except ClientError as err:
@@ -523,6 +585,184 @@ class AwsApiAWSS3(metaclass=_meta_.Meta):
                                  mode="error",
                                  ignore_flag=False)
 
+    def bulk_transfer(self, max_workers: int = _s3_transfer_.__DEFAULT_MAX_WORKERS__, logger: Log = None) -> _s3_transfer_.S3BulkTransfer:
+        """the method returns a bulk transfer manager sharing the client and transfer configuration of this object
+
+        Args:
+            max_workers: number of files transferred concurrently
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a S3BulkTransfer object
+
+        """
+        return _s3_transfer_.S3BulkTransfer(self._client,
+                                            transfer_config=self._transfer_config,
+                                            max_workers=max_workers,
+                                            logger=logger)
+
+    @_common_.exception_handler
+    def upload_many(self,
+                    pairs: List[Tuple],
+                    max_workers: int = _s3_transfer_.__DEFAULT_MAX_WORKERS__,
+                    logger: Log = None) -> _s3_transfer_.TransferReport:
+        """the method uploads (local filepath, s3 filepath) pairs concurrently
+
+        Args:
+            pairs: A list of (local filepath, s3 filepath) or (local filepath, s3 filepath, extra args)
+            max_workers: number of files transferred concurrently
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a transfer report with per file results and aggregate throughput
+
+        """
+        return self.bulk_transfer(max_workers=max_workers, logger=logger).upload_many(pairs)
+
+    @_common_.exception_handler
+    def download_many(self,
+                      pairs: List[Tuple],
+                      max_workers: int = _s3_transfer_.__DEFAULT_MAX_WORKERS__,
+                      logger: Log = None) -> _s3_transfer_.TransferReport:
+        """the method downloads (s3 filepath, local filepath) pairs concurrently
+
+        Args:
+            pairs: A list of (s3 filepath, local filepath) or (s3 filepath, local filepath, {"VersionId": version id})
+            max_workers: number of files transferred concurrently
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a transfer report with per file results and aggregate throughput
+
+        """
+        return self.bulk_transfer(max_workers=max_workers, logger=logger).download_many(pairs)
+
+    @_common_.exception_handler
+    def sync_to_directory(self,
+                          s3_prefix: str,
+                          local_dirpath: str,
+                          search_like: str = "",
+                          max_workers: int = _s3_transfer_.__DEFAULT_MAX_WORKERS__,
+                          logger: Log = None) -> _s3_transfer_.TransferReport:
+        """the method downloads every object under the s3 prefix into the local directory, unchanged files are skipped
+
+        Args:
+            s3_prefix: A string representing the s3 prefix
+            local_dirpath: A string representing the local directory
+            search_like: only objects whose key contains the string are synced
+            max_workers: number of files transferred concurrently
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a transfer report with per file results and aggregate throughput
+
+        """
+        return self.bulk_transfer(max_workers=max_workers, logger=logger).sync_prefix_to_directory(s3_prefix,
+                                                                                                   local_dirpath,
+                                                                                                   search_like=search_like)
+
+    @_common_.exception_handler
+    def sync_from_directory(self,
+                            local_dirpath: str,
+                            s3_prefix: str,
+                            max_workers: int = _s3_transfer_.__DEFAULT_MAX_WORKERS__,
+                            logger: Log = None) -> _s3_transfer_.TransferReport:
+        """the method uploads every file under the local directory to the s3 prefix
+
+        Args:
+            local_dirpath: A string representing the local directory
+            s3_prefix: A string representing the s3 prefix
+            max_workers: number of files transferred concurrently
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a transfer report with per file results and aggregate throughput
+
+        """
+        return self.bulk_transfer(max_workers=max_workers, logger=logger).sync_directory_to_prefix(local_dirpath,
+                                                                                                   s3_prefix)
+
+    def inventory_index(self, db_filepath: str = "", logger: Log = None) -> _s3_inventory_.S3InventoryIndex:
+        """the method returns the local inventory index sharing the client of this object, the location defaults to
+        S3_INVENTORY_LOC in the profile or ~/.deat/s3_inventory.sqlite
+
+        Args:
+            db_filepath: A string representing the sqlite file of the index
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a S3InventoryIndex object
+
+        """
+        return _s3_inventory_.S3InventoryIndex(self._client,
+                                               db_filepath=db_filepath or self._config.config.get("S3_INVENTORY_LOC") or _s3_inventory_.__DEFAULT_INVENTORY_LOC__,
+                                               logger=logger)
+
+    @_common_.exception_handler
+    def refresh_inventory(self,
+                          s3_prefix: str,
+                          full: bool = False,
+                          versions: bool = False,
+                          db_filepath: str = "",
+                          logger: Log = None) -> Dict:
+        """the method brings the local inventory index of the s3 prefix up to date, only records newer than the
+        watermark of the prefix are written unless a full refresh is requested
+
+        Args:
+            s3_prefix: A string representing the s3 prefix
+            full: relist the prefix and drop the keys which no longer exist
+            versions: index every object version instead of the current objects
+            db_filepath: A string representing the sqlite file of the index
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a dictionary of the number of records written and deleted and the new watermark
+
+        """
+        with self.inventory_index(db_filepath=db_filepath, logger=logger) as inventory:
+            return inventory.refresh(s3_prefix, full=full, versions=versions)
+
+    @_common_.exception_handler
+    def copy_many(self,
+                  pairs: List[Tuple],
+                  max_workers: int = _s3_transfer_.__DEFAULT_MAX_WORKERS__,
+                  logger: Log = None) -> _s3_transfer_.TransferReport:
+        """the method copies (s3 filepath, s3 filepath) pairs concurrently on the server side, large objects are
+        copied part by part with upload_part_copy
+
+        Args:
+            pairs: A list of (source s3 filepath, target s3 filepath) or (source, target, size in bytes)
+            max_workers: number of objects copied concurrently
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a transfer report with per object results and aggregate throughput
+
+        """
+        return self.bulk_transfer(max_workers=max_workers, logger=logger).copy_many(pairs)
+
+    @_common_.exception_handler
+    def sync_prefix(self,
+                    source_prefix: str,
+                    target_prefix: str,
+                    search_like: str = "",
+                    delete: bool = False,
+                    dry_run: bool = False,
+                    max_workers: int = _s3_transfer_.__DEFAULT_MAX_WORKERS__,
+                    logger: Log = None) -> _s3_transfer_.TransferReport:
+        """the method copies every object under the source prefix to the target prefix on the server side, objects
+        with the same size and etag under the target prefix are skipped
+
+        Args:
+            source_prefix: A string representing the source s3 prefix
+            target_prefix: A string representing the target s3 prefix
+            search_like: only objects whose key contains the string are synced
+            delete: delete target objects which do not exist under the source prefix
+            dry_run: only report what would be copied and deleted
+            max_workers: number of objects copied concurrently
+            logger: An optional logger object to use for logging error messages and debugging information
+
+        Returns: returns a transfer report with per object results and aggregate throughput
+
+        """
+        return self.bulk_transfer(max_workers=max_workers, logger=logger).sync_prefix_to_prefix(source_prefix,
+                                                                                                target_prefix,
+                                                                                                search_like=search_like,
+                                                                                                delete=delete,
+                                                                                                dry_run=dry_run)
+
     def put_object(self,
                    data: bytes,
                    target_filepath: str,
@@ -0,0 +1,162 @@
+import math
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+from logging import Logger as Log
+from botocore.exceptions import ClientError
+from _common import _common as _common_
+from _aws import awscommon as _aws_common_
+from _aws import awss3_listing as _s3_listing_
+
+
+__DEFAULT_MAX_WORKERS__ = 32
+# a listing page is only worth a round trip if it resolves this many requested keys on average, groups with fewer
+# keys are checked with HEAD requests and a listing giving up after its page budget hands the rest over to HEAD
+__LIST_MIN_KEYS__ = 8
+__NOT_FOUND_CODES__ = {"404", "NoSuchKey", "NotFound"}
+
+
+@dataclass
+class HeadResult:
+    s3_filepath: str
+    exists: bool = False
+    size: int = None
+    etag: str = ""
+    last_modified: float = None
+    version_id: str = ""
+    error: str = ""
+
+
+def _group_by_prefix(s3_filepaths: Iterable[str]) -> Dict[Tuple[str, str], Dict[str, str]]:
+    """ group keys by bucket and parent prefix, the keys of a group sit under a single listing """
+    _groups = {}
+    for _each_filepath in s3_filepaths:
+        _bucket_name, _key = _aws_common_.parse_s3_filepath(_each_filepath)
+        _groups.setdefault((_bucket_name, _key[:_key.rfind("/") + 1]), {})[_key] = _each_filepath
+    return _groups
+
+
+def _list_group(client,
+                bucket_name: str,
+                prefix: str,
+                keys: Dict[str, str],
+                backoff: _s3_listing_.AdaptiveBackoff,
+                logger: Log = None) -> Tuple[List[HeadResult], List[str]]:
+    """ resolve a group with a listing restricted to the key range of the group, returns (results, unresolved keys)
+
+        keys are listed in lexicographical order starting right before the smallest requested key, the listing stops
+        past the largest requested key or once the page budget is spent
+    """
+    _pending = dict(keys)
+    _sorted_keys = sorted(keys)
+    _parameters = {"Bucket": bucket_name,
+                   "Prefix": prefix,
+                   "Delimiter": "/",
+                   "StartAfter": _sorted_keys[0][:-1]}
+    _budget = math.ceil(len(keys) / __LIST_MIN_KEYS__)
+    _results = []
+
+    for _page_num, _page in enumerate(_s3_listing_.iter_pages(client, "list_objects_v2", _parameters,
+                                                              backoff=backoff, logger=logger), 1):
+        _passed_last_key = not _page.get("IsTruncated")
+        for _each_record in _page.get("Contents", []):
+            _key = _each_record.get("Key")
+            if _key > _sorted_keys[-1]:
+                _passed_last_key = True
+                break
+            if _key in _pending:
+                _results.append(HeadResult(_pending.pop(_key),
+                                           exists=True,
+                                           size=_each_record.get("Size"),
+                                           etag=(_each_record.get("ETag") or "").strip('"'),
+                                           last_modified=_each_record.get("LastModified").timestamp()))
+        if _passed_last_key or not _pending:
+            # the whole key range was listed, whatever is left does not exist
+            _results.extend(HeadResult(_each_filepath) for _each_filepath in _pending.values())
+            return _results, []
+        if _page_num >= _budget:
+            break
+
+    _common_.info_logger(f"listing s3://{bucket_name}/{prefix} exceeded {_budget} pages, "
+                         f"checking {len(_pending)} remaining keys with HEAD requests", logger=logger)
+    return _results, list(_pending)
+
+
+def _head(client, bucket_name: str, key: str, s3_filepath: str, backoff: _s3_listing_.AdaptiveBackoff) -> HeadResult:
+    try:
+        _response = backoff.call(client.head_object, Bucket=bucket_name, Key=key)
+        return HeadResult(s3_filepath,
+                          exists=True,
+                          size=_response.get("ContentLength"),
+                          etag=(_response.get("ETag") or "").strip('"'),
+                          last_modified=_response.get("LastModified").timestamp() if _response.get("LastModified") else None,
+                          version_id=_response.get("VersionId") or "")
+    except ClientError as err:
+        if str(err.response.get("Error", {}).get("Code", "")) in __NOT_FOUND_CODES__:
+            return HeadResult(s3_filepath)
+        return HeadResult(s3_filepath, error=str(err))
+    except Exception as err:
+        return HeadResult(s3_filepath, error=str(err))
+
+
+def head_many(client,
+              s3_filepaths: Iterable[str],
+              max_workers: int = __DEFAULT_MAX_WORKERS__,
+              use_listing: bool = True,
+              logger: Log = None) -> Dict[str, HeadResult]:
+    """ existence and metadata of many s3 objects. paths are grouped by bucket and parent prefix, a group holding
+        at least __LIST_MIN_KEYS__ keys is resolved with a listing of its key range, the other keys are checked with
+        concurrent HEAD requests through a bounded pool. a missing object is reported with exists False and no
+        error, any other failure (access denied, throttling) is reported in error
+
+    Args:
+        client: boto3 s3 client
+        s3_filepaths: iterable of s3 filepaths
+        max_workers: number of concurrent requests
+        use_listing: resolve large groups with a listing, False forces one HEAD request per key
+        logger: logger object
+
+    Returns: a dictionary of s3 filepath to HeadResult
+
+    """
+    _groups = _group_by_prefix(s3_filepaths)
+    _backoff = _s3_listing_.AdaptiveBackoff()
+    _results: Dict[str, HeadResult] = {}
+    _head_jobs = []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        _list_futures = {}
+        for (_bucket_name, _prefix), _keys in _groups.items():
+            if use_listing and len(_keys) >= __LIST_MIN_KEYS__:
+                _list_futures[(_bucket_name, _prefix)] = executor.submit(_list_group, client, _bucket_name, _prefix,
+                                                                         _keys, _backoff, logger)
+            else:
+                _head_jobs.extend((_bucket_name, _key, _filepath) for _key, _filepath in _keys.items())
+
+        for (_bucket_name, _prefix), _each_future in _list_futures.items():
+            _keys = _groups[(_bucket_name, _prefix)]
+            try:
+                _listed, _unresolved = _each_future.result()
+            except Exception as err:
+                _common_.info_logger(f"listing s3://{_bucket_name}/{_prefix} failed ({err}), "
+                                     f"falling back to HEAD requests", logger=logger)
+                _listed, _unresolved = [], list(_keys)
+            _results.update({_each_result.s3_filepath: _each_result for _each_result in _listed})
+            _head_jobs.extend((_bucket_name, _key, _keys[_key]) for _key in _unresolved)
+
+        for _each_result in executor.map(lambda job: _head(client, *job, _backoff), _head_jobs):
+            _results[_each_result.s3_filepath] = _each_result
+
+    _common_.info_logger(f"checked {len(_results)} objects, {len(_head_jobs)} with HEAD requests, "
+                         f"{sum(1 for each_result in _results.values() if each_result.error)} errors", logger=logger)
+    return _results
+
+
+def exists_many(client,
+                s3_filepaths: Iterable[str],
+                max_workers: int = __DEFAULT_MAX_WORKERS__,
+                logger: Log = None) -> Dict[str, bool]:
+    """ whether each s3 object exists, see head_many. objects which could not be checked are reported as False """
+    return {_filepath: _result.exists for _filepath, _result in head_many(client, s3_filepaths,
+                                                                          max_workers=max_workers,
+                                                                          logger=logger).items()}
@@ -0,0 +1,314 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional
+from logging import Logger as Log
+from _common import _common as _common_
+from _aws import awscommon as _aws_common_
+from _aws import awss3_listing as _s3_listing_
+
+
+__DEFAULT_INVENTORY_LOC__ = "~/.deat/s3_inventory.sqlite"
+__WRITE_BATCH_SIZE__ = 10000
+__LOOKUP_BATCH_SIZE__ = 500
+# last modified of a multipart upload is the time the upload started, a delta refresh looks back this many
+# seconds behind the watermark so uploads completing after the previous refresh are not missed
+__WATERMARK_SKEW__ = 900
+
+__TABLES__ = {
+    "list_objects_v2": "objects",
+    "list_object_versions": "object_versions",
+}
+
+_SCHEMA_ = """
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER,
+    etag TEXT,
+    last_modified REAL,
+    version_id TEXT NOT NULL DEFAULT '',
+    refresh_id INTEGER,
+    PRIMARY KEY (bucket, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS objects_last_modified ON objects (bucket, last_modified);
+CREATE TABLE IF NOT EXISTS object_versions (
+    bucket TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version_id TEXT NOT NULL,
+    size INTEGER,
+    etag TEXT,
+    last_modified REAL,
+    is_latest INTEGER,
+    refresh_id INTEGER,
+    PRIMARY KEY (bucket, key, version_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS object_versions_last_modified ON object_versions (bucket, key, last_modified);
+CREATE TABLE IF NOT EXISTS watermarks (
+    bucket TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    watermark REAL,
+    refreshed_at REAL,
+    PRIMARY KEY (bucket, prefix, operation)
+);
+"""
+
+
+def _prefix_range(prefix: str) -> Optional[str]:
+    """ smallest string greater than every key starting with the prefix, keys under a prefix are a range scan """
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class S3InventoryIndex:
+    def __init__(self, client, db_filepath: str = __DEFAULT_INVENTORY_LOC__, logger: Log = None):
+        """ local inventory of s3 objects (key, size, etag, last modified, version id) kept in sqlite, existence,
+            prefix and time range questions are answered from the index instead of HEAD calls or relisting.
+            the index is refreshed per prefix, a delta refresh only writes the records newer than the watermark
+            of the prefix while a full refresh also drops the keys deleted since the previous refresh
+
+        Args:
+            client: boto3 s3 client
+            db_filepath: sqlite file, :memory: keeps the index in process
+            logger: logger object
+        """
+        self._client = client
+        self.logger = logger
+        self.db_filepath = db_filepath if db_filepath == ":memory:" else os.path.expanduser(db_filepath)
+        if self.db_filepath != ":memory:" and (_dirpath := os.path.dirname(self.db_filepath)):
+            os.makedirs(_dirpath, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_filepath, check_same_thread=False, isolation_level=None)
+        if self.db_filepath != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA_)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def watermark(self, s3_prefix: str, versions: bool = False) -> Optional[float]:
+        """ epoch timestamp of the newest record seen under the prefix, None if the prefix was never indexed """
+        _bucket_name, _prefix = _aws_common_.parse_s3_filepath(s3_prefix)
+        with self._lock:
+            _row = self._conn.execute("SELECT watermark FROM watermarks WHERE bucket = ? AND prefix = ? AND operation = ?",
+                                      (_bucket_name, _prefix, "list_object_versions" if versions else "list_objects_v2")).fetchone()
+        return _row[0] if _row else None
+
+    def refresh(self,
+                s3_prefix: str,
+                full: bool = False,
+                versions: bool = False,
+                max_workers: int = _s3_listing_.__DEFAULT_MAX_WORKERS__) -> Dict:
+        """ bring the index of the prefix up to date, a prefix never indexed before is always fully refreshed.
+            s3 listings can not be filtered by time on the server, a delta refresh still pages through the prefix
+            but only records newer than the watermark are written and no deletion is detected
+
+        Args:
+            s3_prefix: s3 prefix, for example s3://bucket/unload/table/
+            full: relist the prefix and drop the keys which no longer exist
+            versions: index every object version instead of the current objects
+            max_workers: number of common prefix shards listed concurrently
+
+        Returns: a dictionary of the number of records written and deleted, the new watermark and the elapsed time
+
+        """
+        _bucket_name, _prefix = _aws_common_.parse_s3_filepath(s3_prefix)
+        _operation = "list_object_versions" if versions else "list_objects_v2"
+        _table = __TABLES__[_operation]
+        _watermark = self.watermark(s3_prefix, versions=versions)
+        _full = full or _watermark is None
+        _start_time = 0 if _full else max(0.0, _watermark - __WATERMARK_SKEW__)
+        _refresh_id = time.time_ns()
+        _begin = time.perf_counter()
+
+        _common_.info_logger(f"{'full' if _full else 'delta'} refresh of s3://{_bucket_name}/{_prefix} "
+                             f"({_table}) into {self.db_filepath}...", logger=self.logger)
+
+        _written, _new_watermark, _batch = 0, _watermark or 0.0, []
+        for _each_record in _s3_listing_.iter_objects(self._client,
+                                                      _bucket_name,
+                                                      _prefix,
+                                                      start_time=_start_time,
+                                                      operation=_operation,
+                                                      max_workers=max_workers,
+                                                      logger=self.logger):
+            _last_modified = _each_record.get("LastModified").timestamp()
+            _new_watermark = max(_new_watermark, _last_modified)
+            _etag = (_each_record.get("ETag") or "").strip('"')
+            if versions:
+                _batch.append((_bucket_name, _each_record.get("Key"), _each_record.get("VersionId") or "null",
+                               _each_record.get("Size"), _etag, _last_modified,
+                               int(bool(_each_record.get("IsLatest"))), _refresh_id))
+            else:
+                _batch.append((_bucket_name, _each_record.get("Key"), _each_record.get("Size"), _etag,
+                               _last_modified, _each_record.get("VersionId") or "", _refresh_id))
+            if len(_batch) >= __WRITE_BATCH_SIZE__:
+                _written += self._write(_table, _batch)
+                _batch = []
+        if _batch:
+            _written += self._write(_table, _batch)
+
+        _deleted = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if _full:
+                    _deleted = self._conn.execute(f"DELETE FROM {_table} WHERE {self._prefix_clause(_prefix)} "
+                                                  f"AND refresh_id != ?",
+                                                  (_bucket_name, *self._prefix_args(_prefix), _refresh_id)).rowcount
+                if versions:
+                    # a key listed with a new latest version, the versions recorded by a previous refresh are no
+                    # longer the latest
+                    self._conn.execute(f"UPDATE object_versions SET is_latest = 0 WHERE {self._prefix_clause(_prefix)} "
+                                       f"AND refresh_id != ? AND is_latest = 1 AND key IN "
+                                       f"(SELECT key FROM object_versions WHERE {self._prefix_clause(_prefix)} "
+                                       f"AND refresh_id = ? AND is_latest = 1)",
+                                       (_bucket_name, *self._prefix_args(_prefix), _refresh_id,
+                                        _bucket_name, *self._prefix_args(_prefix), _refresh_id))
+                self._conn.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?, ?)",
+                                   (_bucket_name, _prefix, _operation, _new_watermark, time.time()))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        _result = {"written": _written,
+                   "deleted": _deleted,
+                   "watermark": _new_watermark,
+                   "seconds": time.perf_counter() - _begin}
+        _common_.info_logger(f"{_written} records written, {_deleted} deleted in {_result['seconds']:.1f} seconds",
+                             logger=self.logger)
+        return _result
+
+    def _write(self, table: str, batch: List) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({', '.join('?' * len(batch[0]))})", batch)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(batch)
+
+    @staticmethod
+    def _prefix_clause(prefix: str) -> str:
+        return "bucket = ? AND key >= ? AND key < ?" if prefix else "bucket = ?"
+
+    @staticmethod
+    def _prefix_args(prefix: str) -> tuple:
+        return (prefix, _prefix_range(prefix)) if prefix else ()
+
+    def _indexed_prefixes(self, bucket_name: str, operation: str) -> List[str]:
+        with self._lock:
+            return [_row[0] for _row in self._conn.execute("SELECT prefix FROM watermarks WHERE bucket = ? AND operation = ?",
+                                                           (bucket_name, operation))]
+
+    def is_indexed(self, s3_filepath: str, versions: bool = False) -> bool:
+        """ whether the key is under a prefix which was refreshed, the index knows nothing of the other keys """
+        _bucket_name, _key = _aws_common_.parse_s3_filepath(s3_filepath)
+        return any(_key.startswith(_each_prefix) for _each_prefix in
+                   self._indexed_prefixes(_bucket_name, "list_object_versions" if versions else "list_objects_v2"))
+
+    def get(self, s3_filepath: str) -> Optional[Dict]:
+        """ indexed record of the object, None if the key is not in the index """
+        _bucket_name, _key = _aws_common_.parse_s3_filepath(s3_filepath)
+        with self._lock:
+            _cursor = self._conn.execute("SELECT key, size, etag, last_modified, version_id FROM objects "
+                                         "WHERE bucket = ? AND key = ?", (_bucket_name, _key))
+            _row = _cursor.fetchone()
+        return dict(zip(("key", "size", "etag", "last_modified", "version_id"), _row)) if _row else None
+
+    def exists(self, s3_filepath: str) -> Optional[bool]:
+        """ whether the key is in the index, None if no refreshed prefix covers it """
+        return self.exists_many([s3_filepath])[s3_filepath]
+
+    def exists_many(self, s3_filepaths: Iterable[str]) -> Dict[str, Optional[bool]]:
+        """ look up many keys at once, keys are checked in batches of indexed IN queries. a key under no refreshed
+            prefix is not known to be missing, it is reported as None for the caller to fall back to s3
+
+        Args:
+            s3_filepaths: iterable of s3 filepaths
+
+        Returns: a dictionary of s3 filepath to whether the key is in the index, None if the key is not covered
+
+        """
+        _by_bucket: Dict[str, Dict[str, str]] = {}
+        for _each_filepath in s3_filepaths:
+            _bucket_name, _key = _aws_common_.parse_s3_filepath(_each_filepath)
+            _by_bucket.setdefault(_bucket_name, {})[_key] = _each_filepath
+
+        _result = {}
+        with self._lock:
+            for _bucket_name, _keys in _by_bucket.items():
+                _found = set()
+                _prefixes = self._indexed_prefixes(_bucket_name, "list_objects_v2")
+                _covered = {_key for _key in _keys if any(_key.startswith(_each_prefix) for _each_prefix in _prefixes)}
+                _key_list = list(_covered)
+                for _index in range(0, len(_key_list), __LOOKUP_BATCH_SIZE__):
+                    _chunk = _key_list[_index: _index + __LOOKUP_BATCH_SIZE__]
+                    _found.update(_row[0] for _row in self._conn.execute(
+                        f"SELECT key FROM objects WHERE bucket = ? AND key IN ({', '.join('?' * len(_chunk))})",
+                        (_bucket_name, *_chunk)))
+                _result.update({_filepath: (_key in _found) if _key in _covered else None for _key, _filepath in _keys.items()})
+        return _result
+
+    def iter_prefix(self,
+                    s3_prefix: str,
+                    start_time: float = 0,
+                    end_time: float = float("inf")) -> Iterator[Dict]:
+        """ stream the indexed objects under the prefix last modified within [start_time, end_time]
+
+        Args:
+            s3_prefix: s3 prefix
+            start_time: epoch timestamp
+            end_time: epoch timestamp
+
+        Returns: yield a dictionary of key, size, etag, last modified and version id ordered by key
+
+        """
+        _bucket_name, _prefix = _aws_common_.parse_s3_filepath(s3_prefix)
+        _sql = (f"SELECT key, size, etag, last_modified, version_id FROM objects "
+                f"WHERE {self._prefix_clause(_prefix)} AND last_modified >= ? AND last_modified <= ? ORDER BY key")
+        with self._lock:
+            _rows = self._conn.execute(_sql, (_bucket_name, *self._prefix_args(_prefix), start_time,
+                                              end_time if end_time != float("inf") else 1e18)).fetchall()
+        for _row in _rows:
+            yield dict(zip(("key", "size", "etag", "last_modified", "version_id"), _row))
+
+    def changed_since(self, s3_prefix: str, timestamp: float) -> List[Dict]:
+        """ indexed objects under the prefix last modified after the epoch timestamp """
+        return list(self.iter_prefix(s3_prefix, start_time=timestamp))
+
+    def version_at(self, s3_filepath: str, timestamp: float) -> Optional[Dict]:
+        """ the object version which was live at the epoch timestamp, requires a refresh with versions=True.
+            delete markers are not indexed, a key deleted before the timestamp still returns its last version
+
+        Args:
+            s3_filepath: s3 filepath
+            timestamp: epoch timestamp
+
+        Returns: a dictionary of version id, size, etag and last modified, None if no version existed yet. raises
+                 LookupError if the versions of no refreshed prefix cover the key
+
+        """
+        _bucket_name, _key = _aws_common_.parse_s3_filepath(s3_filepath)
+        if not self.is_indexed(s3_filepath, versions=True):
+            raise LookupError(f"the versions of {s3_filepath} are not indexed, refresh a prefix of it with versions=True")
+        with self._lock:
+            _row = self._conn.execute("SELECT version_id, size, etag, last_modified FROM object_versions "
+                                      "WHERE bucket = ? AND key = ? AND last_modified <= ? "
+                                      "ORDER BY last_modified DESC LIMIT 1", (_bucket_name, _key, timestamp)).fetchone()
+        return dict(zip(("version_id", "size", "etag", "last_modified"), _row)) if _row else None
@@ -0,0 +1,287 @@
+import random
+import threading
+import time
+from queue import Queue, Empty, Full
+from concurrent.futures import ThreadPoolExecutor
+from inspect import currentframe
+from typing import Dict, Iterator, List, Tuple, Callable
+from logging import Logger as Log
+from botocore.exceptions import ClientError
+from _common import _common as _common_
+
+
+__THROTTLE_ERROR_CODES__ = {"SlowDown",
+                            "Throttling",
+                            "ThrottlingException",
+                            "RequestLimitExceeded",
+                            "TooManyRequestsException",
+                            "ServiceUnavailable",
+                            "503"}
+__BACKOFF_BASE__ = 0.05
+__BACKOFF_CAP__ = 20
+__BACKOFF_MAX_RETRIES__ = 12
+__DEFAULT_MAX_WORKERS__ = 8
+__DEFAULT_QUEUE_SIZE__ = 10000
+__PROGRESS_INTERVAL__ = 100000
+
+# pagination fields per listing operation, (request token -> response token)
+__PAGINATION__ = {
+    "list_objects_v2": {"records": "Contents",
+                        "tokens": {"ContinuationToken": "NextContinuationToken"}},
+    "list_object_versions": {"records": "Versions",
+                             "tokens": {"KeyMarker": "NextKeyMarker",
+                                        "VersionIdMarker": "NextVersionIdMarker"}},
+}
+
+_END_OF_SHARD_ = object()
+
+
+class AdaptiveBackoff:
+    def __init__(self,
+                 base: float = __BACKOFF_BASE__,
+                 cap: float = __BACKOFF_CAP__,
+                 max_retries: int = __BACKOFF_MAX_RETRIES__):
+        """ full jitter exponential backoff shared by all listing threads, the delay only grows when s3 pushes
+            back (SlowDown / 503) and decays on every successful call, so an unthrottled listing never sleeps
+
+        Args:
+            base: smallest delay in seconds once throttling is observed
+            cap: largest delay in seconds
+            max_retries: number of consecutive throttled attempts before giving up on a call
+        """
+        self.base = base
+        self.cap = cap
+        self.max_retries = max_retries
+        self.delay = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_throttled(err: Exception) -> bool:
+        if not isinstance(err, ClientError):
+            return False
+        _error_code = str(err.response.get("Error", {}).get("Code", ""))
+        _status_code = str(err.response.get("ResponseMetadata", {}).get("HTTPStatusCode", ""))
+        return _error_code in __THROTTLE_ERROR_CODES__ or _status_code == "503"
+
+    def _on_success(self) -> None:
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > self.base else 0.0
+
+    def _on_throttle(self) -> float:
+        with self._lock:
+            self.throttled += 1
+            self.delay = min(self.cap, max(self.base, self.delay * 2))
+            return self.delay
+
+    def call(self, func: Callable, logger: Log = None, **parameters) -> Dict:
+        """ invoke an aws api call, pacing it with the current shared delay and backing off on throttling
+
+        Args:
+            func: aws client method
+            logger: logger object
+            **parameters: parameters of the aws client method
+
+        Returns: the api response
+
+        """
+        for _attempt in range(self.max_retries):
+            if _pacing := self.delay:
+                time.sleep(random.uniform(0, _pacing))
+            try:
+                _response = func(**parameters)
+                self._on_success()
+                return _response
+            except ClientError as err:
+                if not self.is_throttled(err):
+                    raise err
+                _delay = self._on_throttle()
+                _common_.info_logger(f"throttled by s3, backing off up to {_delay:.2f} seconds...", logger=logger)
+                time.sleep(random.uniform(0, _delay))
+        raise RuntimeError(f"still throttled after {self.max_retries} attempts, giving up")
+
+
+def iter_pages(client,
+               operation: str,
+               parameters: Dict,
+               backoff: AdaptiveBackoff = None,
+               logger: Log = None) -> Iterator[Dict]:
+    """ page through a listing operation, continuation tokens are carried along with the original parameters
+
+    Args:
+        client: boto3 s3 client
+        operation: either list_objects_v2 or list_object_versions
+        parameters: parameters of the first page request
+        backoff: shared backoff object
+        logger: logger object
+
+    Returns: yield each page of the response
+
+    """
+    _backoff = backoff if backoff else AdaptiveBackoff()
+    _func = getattr(client, operation)
+    _tokens = __PAGINATION__[operation]["tokens"]
+    _parameters = dict(parameters)
+
+    while True:
+        _response = _backoff.call(_func, logger=logger, **_parameters)
+        if _response.get("ResponseMetadata", {}).get("HTTPStatusCode") != 200:
+            _common_.error_logger(currentframe().f_code.co_name,
+                                  f"not able to retrieve object",
+                                  logger=logger,
+                                  mode="error",
+                                  ignore_flag=False)
+        yield _response
+        if not _response.get("IsTruncated"):
+            return
+        for _request_token, _response_token in _tokens.items():
+            if _response.get(_response_token):
+                _parameters[_request_token] = _response.get(_response_token)
+
+
+def discover_shards(client,
+                    bucket_name: str,
+                    prefix: str,
+                    operation: str = "list_objects_v2",
+                    delimiter: str = "/",
+                    backoff: AdaptiveBackoff = None,
+                    logger: Log = None) -> Tuple[List[str], List[Dict]]:
+    """ split a prefix into common prefix shards, records sitting directly under the prefix are returned as is
+
+    Args:
+        client: boto3 s3 client
+        bucket_name: s3 bucket name
+        prefix: s3 prefix to be split
+        operation: either list_objects_v2 or list_object_versions
+        delimiter: delimiter used to group keys into shards
+        backoff: shared backoff object
+        logger: logger object
+
+    Returns: a tuple of (list of shard prefixes, list of records directly under the prefix)
+
+    """
+    _shards, _records = [], []
+    _parameters = {"Bucket": bucket_name, "Delimiter": delimiter, **({"Prefix": prefix} if prefix else {})}
+    for _page in iter_pages(client, operation, _parameters, backoff=backoff, logger=logger):
+        _shards.extend(_each.get("Prefix") for _each in _page.get("CommonPrefixes", []))
+        _records.extend(_page.get(__PAGINATION__[operation]["records"], []))
+    return _shards, _records
+
+
+def iter_objects(client,
+                 bucket_name: str,
+                 prefix: str = "",
+                 search_like: str = "",
+                 start_time: float = 0,
+                 end_time: float = float("inf"),
+                 operation: str = "list_objects_v2",
+                 max_workers: int = __DEFAULT_MAX_WORKERS__,
+                 delimiter: str = "/",
+                 queue_size: int = __DEFAULT_QUEUE_SIZE__,
+                 logger: Log = None) -> Iterator[Dict]:
+    """ stream the records under a prefix, the prefix is split into common prefix shards which are listed
+        concurrently by a bounded thread pool. records are yielded as soon as a page arrives and the bounded
+        queue applies back pressure, so memory stays flat regardless of the number of keys.
+
+        s3 returns keys in lexicographical order, not in modification order, so start_time and end_time filter
+        the records and every key of the prefix is listed.
+
+    Args:
+        client: boto3 s3 client
+        bucket_name: s3 bucket name
+        prefix: s3 prefix
+        search_like: only yield records whose key contains the string
+        start_time: skip records last modified before the epoch timestamp
+        end_time: skip records last modified after the epoch timestamp
+        operation: either list_objects_v2 or list_object_versions
+        max_workers: number of shards listed concurrently, 1 lists serially without sharding
+        delimiter: delimiter used to group keys into shards
+        queue_size: maximum number of records buffered ahead of the consumer
+        logger: logger object
+
+    Returns: yield the raw s3 record of each object (or object version)
+
+    """
+    _backoff = AdaptiveBackoff()
+    _record_name = __PAGINATION__[operation]["records"]
+    _base_parameters = {"Bucket": bucket_name}
+
+    def _accept(record: Dict) -> bool:
+        if not start_time <= record.get("LastModified").timestamp() <= end_time:
+            return False
+        return not search_like or search_like in record.get("Key", "")
+
+    if max_workers <= 1:
+        _parameters = {**_base_parameters, **({"Prefix": prefix} if prefix else {})}
+        for _page in iter_pages(client, operation, _parameters, backoff=_backoff, logger=logger):
+            for _each_record in _page.get(_record_name, []):
+                if _accept(_each_record):
+                    yield _each_record
+        return
+
+    _shards, _top_records = discover_shards(client, bucket_name, prefix,
+                                            operation=operation, delimiter=delimiter, backoff=_backoff, logger=logger)
+    for _each_record in _top_records:
+        if _accept(_each_record):
+            yield _each_record
+    if not _shards:
+        return
+
+    _common_.info_logger(f"listing s3://{bucket_name}/{prefix} across {len(_shards)} shards "
+                         f"with {min(max_workers, len(_shards))} workers", logger=logger)
+
+    _queue = Queue(maxsize=queue_size)
+    _stop_event = threading.Event()
+
+    def _put(item) -> bool:
+        while not _stop_event.is_set():
+            try:
+                _queue.put(item, timeout=0.5)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _list_shard(shard_prefix: str) -> None:
+        try:
+            for _page in iter_pages(client, operation, {**_base_parameters, "Prefix": shard_prefix},
+                                    backoff=_backoff, logger=logger):
+                for _each_record in _page.get(_record_name, []):
+                    if _accept(_each_record) and not _put(_each_record):
+                        return
+                if _stop_event.is_set():
+                    return
+        except BaseException as err:
+            # error_logger exits with SystemExit, which would end this worker thread silently
+            _put(err)
+        finally:
+            _put(_END_OF_SHARD_)
+
+    _executor = ThreadPoolExecutor(max_workers=min(max_workers, len(_shards)))
+    try:
+        for _each_shard in _shards:
+            _executor.submit(_list_shard, _each_shard)
+
+        _remaining = len(_shards)
+        while _remaining:
+            try:
+                _item = _queue.get(timeout=0.5)
+            except Empty:
+                continue
+            if _item is _END_OF_SHARD_:
+                _remaining -= 1
+            elif isinstance(_item, SystemExit):
+                # already reported by error_logger in the worker
+                raise _item
+            elif isinstance(_item, BaseException):
+                _common_.error_logger(currentframe().f_code.co_name,
+                                      _item,
+                                      logger=logger,
+                                      mode="error",
+                                      ignore_flag=False)
+            else:
+                yield _item
+    finally:
+        # the consumer may stop early, release the workers blocked on the queue
+        _stop_event.set()
+        _executor.shutdown(wait=False, cancel_futures=True)
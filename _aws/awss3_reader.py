@@ -0,0 +1,249 @@
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+from logging import Logger as Log
+from _aws import awscommon as _aws_common_
+from _aws import awss3_listing as _s3_listing_
+
+
+__MB__ = 1024 * 1024
+__DEFAULT_BLOCK_SIZE__ = 1 * __MB__
+__DEFAULT_CACHE_BLOCKS__ = 64
+__DEFAULT_READ_AHEAD_BLOCKS__ = 4
+__DEFAULT_MAX_WORKERS__ = 8
+
+
+@dataclass
+class ReaderStats:
+    requests: int = 0
+    bytes_fetched: int = 0
+    bytes_read: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+
+class S3RangeReader(io.RawIOBase):
+    def __init__(self,
+                 client,
+                 s3_filepath: str,
+                 version_id: str = "",
+                 block_size: int = __DEFAULT_BLOCK_SIZE__,
+                 cache_blocks: int = __DEFAULT_CACHE_BLOCKS__,
+                 read_ahead_blocks: int = __DEFAULT_READ_AHEAD_BLOCKS__,
+                 max_workers: int = __DEFAULT_MAX_WORKERS__,
+                 logger: Log = None):
+        """ seekable, read only file object over ranged GETs of one s3 object. the object is read in fixed size
+            blocks kept in a LRU cache, only the blocks touched by a read are fetched so a parquet footer or a
+            subset of columns costs a few requests instead of the whole object. sequential reads prefetch the next
+            blocks in the background. every GET is pinned to the etag (or version) seen when the reader was opened,
+            an object overwritten while it is read fails instead of mixing two versions
+
+            pyarrow.parquet.ParquetFile, pandas.read_parquet and pandas.read_csv accept the reader as a file object
+
+        Args:
+            client: boto3 s3 client
+            s3_filepath: s3 filepath
+            version_id: read a specific version of the object
+            block_size: size of a block in bytes
+            cache_blocks: number of blocks kept in the cache
+            read_ahead_blocks: number of blocks prefetched once the reads are sequential, 0 disables it
+            max_workers: number of concurrent ranged GETs
+            logger: logger object
+        """
+        super().__init__()
+        self._client = client
+        self.s3_filepath = s3_filepath
+        self.bucket_name, self.key = _aws_common_.parse_s3_filepath(s3_filepath)
+        self.block_size = block_size
+        self.cache_blocks = max(cache_blocks, read_ahead_blocks + 1)
+        self.read_ahead_blocks = read_ahead_blocks
+        self.logger = logger
+        self.stats = ReaderStats()
+
+        self._backoff = _s3_listing_.AdaptiveBackoff()
+        self._parameters = {"Bucket": self.bucket_name, "Key": self.key}
+        if version_id:
+            self._parameters["VersionId"] = version_id
+        _response = self._backoff.call(self._client.head_object, logger=logger, **self._parameters)
+        self.size = _response.get("ContentLength")
+        self.etag = _response.get("ETag")
+        if not version_id and self.etag:
+            self._parameters["IfMatch"] = self.etag
+
+        self._position = 0
+        self._last_end = -1
+        self._sequential_reads = 0
+        self._cache: "OrderedDict[int, bytes]" = OrderedDict()
+        self._inflight: Dict[int, Future] = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            _position = offset
+        elif whence == io.SEEK_CUR:
+            _position = self._position + offset
+        elif whence == io.SEEK_END:
+            _position = self.size + offset
+        else:
+            raise ValueError(f"invalid whence {whence}")
+        if _position < 0:
+            raise ValueError(f"negative seek position {_position}")
+        self._position = _position
+        return self._position
+
+    def _fetch(self, block_index: int) -> bytes:
+        _start = block_index * self.block_size
+        _end = min(_start + self.block_size, self.size) - 1
+        _response = self._backoff.call(self._client.get_object, logger=self.logger,
+                                       Range=f"bytes={_start}-{_end}", **self._parameters)
+        _data = _response.get("Body").read()
+        with self._lock:
+            self.stats.requests += 1
+            self.stats.bytes_fetched += len(_data)
+        return _data
+
+    def _submit(self, block_indexes: List[int]) -> None:
+        """ schedule the blocks which are neither cached nor already being fetched, the lock has to be held """
+        for _each_index in block_indexes:
+            if _each_index not in self._cache and _each_index not in self._inflight:
+                self._inflight[_each_index] = _future = self._executor.submit(self._fetch, _each_index)
+                _future.add_done_callback(lambda future, index=_each_index: self._store(index, future))
+
+    def _store(self, block_index: int, future: Future) -> None:
+        """ move a fetched block into the cache, prefetched blocks land there even if they are never read """
+        with self._lock:
+            self._inflight.pop(block_index, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            self._cache[block_index] = future.result()
+            self._cache.move_to_end(block_index)
+            while len(self._cache) > self.cache_blocks:
+                self._cache.popitem(last=False)
+
+    def _block(self, block_index: int) -> bytes:
+        _missed = False
+        while True:
+            with self._lock:
+                if (_data := self._cache.get(block_index)) is not None:
+                    self._cache.move_to_end(block_index)
+                    if not _missed:
+                        self.stats.cache_hits += 1
+                    return _data
+                if not _missed:
+                    self.stats.cache_misses += 1
+                    _missed = True
+                self._submit([block_index])
+                _future = self._inflight.get(block_index)
+            if _future is not None:
+                return _future.result()
+            # stored and evicted again between the cache lookup and the submit, the next pass fetches it
+
+    def prefetch(self, ranges: Iterable[Tuple[int, int]]) -> None:
+        """ fetch the blocks covering the (offset, length) ranges concurrently in the background, readers issuing
+            many small reads one after another (parquet column chunks) then find them in the cache
+
+        Args:
+            ranges: iterable of (offset, length) byte ranges
+
+        """
+        _block_indexes = []
+        for _offset, _length in ranges:
+            if _length > 0 and _offset < self.size:
+                _block_indexes.extend(range(_offset // self.block_size,
+                                            (min(_offset + _length, self.size) - 1) // self.block_size + 1))
+        with self._lock:
+            self._submit(list(dict.fromkeys(_block_indexes))[:self.cache_blocks])
+
+    def readinto(self, buffer) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+        if self._position >= self.size or len(buffer) == 0:
+            return 0
+
+        _end = min(self._position + len(buffer), self.size)
+        _first_block, _last_block = self._position // self.block_size, (_end - 1) // self.block_size
+        _final_block = (self.size - 1) // self.block_size
+        # a read starting where the previous one ended is a stream, once two reads in a row are sequential the next
+        # blocks are prefetched. parquet readers jump between column chunks and never trigger the prefetch
+        self._sequential_reads = self._sequential_reads + 1 if self._position == self._last_end else 0
+
+        # the blocks of the read are fetched concurrently, a stream also prefetches the next blocks. no more blocks
+        # than the cache holds are in flight, the window moves forward as the blocks are copied
+        _read_ahead = self.read_ahead_blocks if self._sequential_reads >= 2 else 0
+        _window_end = min(_last_block + _read_ahead, _final_block)
+        with self._lock:
+            self._submit(list(range(_first_block, min(_window_end, _first_block + self.cache_blocks - 1) + 1)))
+
+        _view = memoryview(buffer)
+        _written = 0
+        for _each_index in range(_first_block, _last_block + 1):
+            _data = self._block(_each_index)
+            _offset = self._position - _each_index * self.block_size
+            _chunk = _data[_offset: _offset + (_end - self._position)]
+            _view[_written: _written + len(_chunk)] = _chunk
+            _written += len(_chunk)
+            self._position += len(_chunk)
+            if _each_index < _last_block:
+                with self._lock:
+                    # a block copied whole is evicted first, not the blocks of the window still to be copied
+                    if _each_index in self._cache:
+                        self._cache.move_to_end(_each_index, last=False)
+                    if (_next_index := _each_index + self.cache_blocks) <= _window_end:
+                        self._submit([_next_index])
+
+        self._last_end = self._position
+        self.stats.bytes_read += _written
+        return _written
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = max(0, self.size - self._position)
+        _buffer = bytearray(min(size, max(0, self.size - self._position)))
+        _read = self.readinto(_buffer)
+        return bytes(_buffer[:_read])
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            with self._lock:
+                self._cache.clear()
+                self._inflight.clear()
+        super().close()
+
+
+def parquet_column_ranges(metadata, columns: List[str] = None) -> List[Tuple[int, int]]:
+    """ byte ranges of the column chunks of a parquet file, to be passed to S3RangeReader.prefetch
+
+    Args:
+        metadata: pyarrow.parquet.FileMetaData of the file
+        columns: column names, all columns if empty
+
+    Returns: list of (offset, length) of the column chunks in every row group
+
+    """
+    _ranges = []
+    for _row_group_index in range(metadata.num_row_groups):
+        _row_group = metadata.row_group(_row_group_index)
+        for _column_index in range(_row_group.num_columns):
+            _column = _row_group.column(_column_index)
+            if columns and _column.path_in_schema.split(".")[0] not in columns:
+                continue
+            _offset = _column.dictionary_page_offset if _column.has_dictionary_page and _column.dictionary_page_offset else _column.data_page_offset
+            _ranges.append((_offset, _column.total_compressed_size))
+    return _ranges
@@ -0,0 +1,373 @@
+import os
+import time
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from inspect import currentframe
+from typing import Dict, Iterable, List, Tuple, Union
+from logging import Logger as Log
+from boto3.s3.transfer import TransferConfig
+from _common import _common as _common_
+from _aws import awscommon as _aws_common_
+from _aws import awss3_listing as _s3_listing_
+
+
+__MB__ = 1024 * 1024
+__DEFAULT_PART_SIZE_MB__ = 64
+__DEFAULT_MAX_CONCURRENCY__ = 10
+__DEFAULT_MAX_WORKERS__ = 8
+
+_transfer_config_lock = threading.Lock()
+_transfer_configs: Dict[Tuple, TransferConfig] = {}
+
+
+def get_transfer_config(part_size_mb: int = __DEFAULT_PART_SIZE_MB__,
+                        max_concurrency: int = __DEFAULT_MAX_CONCURRENCY__,
+                        use_threads: bool = True) -> TransferConfig:
+    """ return the shared TransferConfig for the given tuning, objects larger than one part go multipart
+
+    Args:
+        part_size_mb: multipart threshold and chunk size in MB
+        max_concurrency: number of concurrent part transfers per file
+        use_threads: whether parts are transferred on threads
+
+    Returns: a TransferConfig object shared by every caller with the same tuning
+
+    """
+    _key = (part_size_mb, max_concurrency, use_threads)
+    with _transfer_config_lock:
+        if _key not in _transfer_configs:
+            _transfer_configs[_key] = TransferConfig(multipart_threshold=part_size_mb * __MB__,
+                                                     multipart_chunksize=part_size_mb * __MB__,
+                                                     max_concurrency=max_concurrency,
+                                                     use_threads=use_threads)
+        return _transfer_configs[_key]
+
+
+def get_transfer_config_from_profile(config) -> TransferConfig:
+    """ build the shared TransferConfig from S3_TRANSFER_PART_SIZE_MB / S3_TRANSFER_MAX_CONCURRENCY in the profile
+
+    Args:
+        config: configuration object
+
+    Returns: a TransferConfig object
+
+    """
+    return get_transfer_config(part_size_mb=int(config.config.get("S3_TRANSFER_PART_SIZE_MB") or __DEFAULT_PART_SIZE_MB__),
+                               max_concurrency=int(config.config.get("S3_TRANSFER_MAX_CONCURRENCY") or __DEFAULT_MAX_CONCURRENCY__))
+
+
+@dataclass
+class TransferResult:
+    source: str
+    target: str
+    size: int = 0
+    seconds: float = 0.0
+    skipped: bool = False
+    error: str = ""
+
+
+@dataclass
+class TransferReport:
+    results: List[TransferResult] = field(default_factory=list)
+    seconds: float = 0.0
+    planned: List[TransferResult] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    dry_run: bool = False
+
+    @property
+    def transferred(self) -> List[TransferResult]:
+        return [each_result for each_result in self.results if not each_result.skipped and not each_result.error]
+
+    @property
+    def failed(self) -> List[TransferResult]:
+        return [each_result for each_result in self.results if each_result.error]
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(each_result.size for each_result in self.transferred)
+
+    @property
+    def throughput_mb(self) -> float:
+        return self.total_bytes / __MB__ / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        if self.dry_run:
+            return (f"dry run, {len(self.planned)} to transfer "
+                    f"({sum(each_result.size for each_result in self.planned) / __MB__:.1f} MB), "
+                    f"{len(self.results)} unchanged, {len(self.deleted)} to delete")
+        return (f"{len(self.transferred)} transferred, {len(self.results) - len(self.transferred) - len(self.failed)} skipped, "
+                f"{len(self.failed)} failed, {len(self.deleted)} deleted, {self.total_bytes / __MB__:.1f} MB in "
+                f"{self.seconds:.1f} seconds ({self.throughput_mb:.1f} MB/s)")
+
+
+def directory_prefix(prefix: str) -> str:
+    """ the prefix ending with /, an empty prefix is the whole bucket """
+    return prefix if not prefix or prefix.endswith("/") else f"{prefix}/"
+
+
+class S3BulkTransfer:
+    def __init__(self,
+                 client,
+                 transfer_config: TransferConfig = None,
+                 max_workers: int = __DEFAULT_MAX_WORKERS__,
+                 logger: Log = None):
+        """ runs many file transfers concurrently, each file is itself split into parts by the shared TransferConfig.
+            the client connection pool should hold at least max_workers * max_concurrency connections
+
+        Args:
+            client: boto3 s3 client
+            transfer_config: shared transfer configuration, defaults to get_transfer_config()
+            max_workers: number of files transferred concurrently
+            logger: logger object
+        """
+        self._client = client
+        self.transfer_config = transfer_config if transfer_config else get_transfer_config()
+        self.max_workers = max_workers
+        self.logger = logger
+
+    def _run(self, func, jobs: Iterable[Tuple[str, str, Dict]], report: TransferReport = None) -> TransferReport:
+        _report = report if report else TransferReport()
+        _start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            _futures = [executor.submit(func, *each_job) for each_job in jobs]
+            for _cnt, _each_future in enumerate(as_completed(_futures), 1):
+                _report.results.append(_each_future.result())
+                if _cnt % 100 == 0:
+                    _common_.info_logger(f"transferred {_cnt} of {len(_futures)} files", logger=self.logger)
+        _report.seconds = time.perf_counter() - _start_time
+        _common_.info_logger(_report.summary(), logger=self.logger)
+        return _report
+
+    def _upload(self, source_filepath: str, target_filepath: str, extra_args: Dict = None) -> TransferResult:
+        _start_time = time.perf_counter()
+        try:
+            _bucket_name, _bucket_key = _aws_common_.parse_s3_filepath(target_filepath)
+            if not _bucket_key or _bucket_key.endswith("/"):
+                _bucket_key += os.path.basename(source_filepath)
+            self._client.upload_file(source_filepath, _bucket_name, _bucket_key,
+                                     ExtraArgs=extra_args or None, Config=self.transfer_config)
+            return TransferResult(source_filepath, target_filepath,
+                                  size=os.path.getsize(source_filepath), seconds=time.perf_counter() - _start_time)
+        except Exception as err:
+            return TransferResult(source_filepath, target_filepath, error=str(err))
+
+    def _download(self, source_filepath: str, target_filepath: str, extra_args: Dict = None) -> TransferResult:
+        _start_time = time.perf_counter()
+        try:
+            _bucket_name, _bucket_key = _aws_common_.parse_s3_filepath(source_filepath)
+            if target_filepath.endswith("/"):
+                target_filepath += _bucket_key.split("/")[-1]
+            if _dirpath := os.path.dirname(target_filepath):
+                os.makedirs(_dirpath, exist_ok=True)
+            # download_file writes ranged parts straight to disk, a version id is passed through ExtraArgs
+            self._client.download_file(_bucket_name, _bucket_key, target_filepath,
+                                       ExtraArgs=extra_args or None, Config=self.transfer_config)
+            return TransferResult(source_filepath, target_filepath,
+                                  size=os.path.getsize(target_filepath), seconds=time.perf_counter() - _start_time)
+        except Exception as err:
+            return TransferResult(source_filepath, target_filepath, error=str(err))
+
+    def _copy(self, source_filepath: str, target_filepath: str, size: int = None) -> TransferResult:
+        _start_time = time.perf_counter()
+        try:
+            _source_bucket_name, _source_key = _aws_common_.parse_s3_filepath(source_filepath)
+            _target_bucket_name, _target_key = _aws_common_.parse_s3_filepath(target_filepath)
+            if not _target_key or _target_key.endswith("/"):
+                _target_key += _source_key.split("/")[-1]
+            _copy_source = {"Bucket": _source_bucket_name, "Key": _source_key}
+            if size is not None and size < self.transfer_config.multipart_threshold:
+                # one request, the size is known from the listing so no HEAD is needed
+                self._client.copy_object(CopySource=_copy_source, Bucket=_target_bucket_name, Key=_target_key)
+            else:
+                # upload_part_copy of each part, the data never leaves s3
+                self._client.copy(_copy_source, _target_bucket_name, _target_key, Config=self.transfer_config)
+            return TransferResult(source_filepath, target_filepath,
+                                  size=size or 0, seconds=time.perf_counter() - _start_time)
+        except Exception as err:
+            return TransferResult(source_filepath, target_filepath, error=str(err))
+
+    def copy_many(self, pairs: Iterable[Union[Tuple[str, str], Tuple[str, str, int]]]) -> TransferReport:
+        """ copy (s3 filepath, s3 filepath[, size]) pairs concurrently on the server side, objects smaller than one
+            part are copied with a single copy_object, larger ones with concurrent upload_part_copy
+
+        Args:
+            pairs: iterable of (source s3 filepath, target s3 filepath) or (source, target, size in bytes)
+
+        Returns: transfer report
+
+        """
+        return self._run(self._copy, ((*each_pair, None)[:3] for each_pair in pairs))
+
+    @staticmethod
+    def _is_same_object(source_record: Dict, target_record: Dict) -> bool:
+        """ objects of different sizes differ, an etag is only comparable when neither copy is multipart since the
+            etag of a multipart object depends on its part size. otherwise a target written before the source was
+            last modified is out of date """
+        if source_record.get("Size") != target_record.get("Size"):
+            return False
+        _source_etag, _target_etag = source_record.get("ETag", ""), target_record.get("ETag", "")
+        if "-" in _source_etag or "-" in _target_etag:
+            _source_modified, _target_modified = source_record.get("LastModified"), target_record.get("LastModified")
+            return _source_modified is not None and _target_modified is not None and _target_modified >= _source_modified
+        return _source_etag == _target_etag
+
+    def sync_prefix_to_prefix(self,
+                              source_prefix: str,
+                              target_prefix: str,
+                              search_like: str = "",
+                              delete: bool = False,
+                              dry_run: bool = False) -> TransferReport:
+        """ copy every object under the source prefix to the target prefix on the server side, keeping the relative
+            layout. both prefixes are listed concurrently and objects already present with the same size and etag
+            are skipped, a multipart object with the same size is skipped unless the source is newer than the target
+
+        Args:
+            source_prefix: s3 prefix, for example s3://bucket/unload/table/
+            target_prefix: s3 prefix, for example s3://other-bucket/archive/table/
+            search_like: only objects whose key contains the string are synced
+            delete: delete target objects which do not exist under the source prefix
+            dry_run: only report what would be copied and deleted
+
+        Returns: transfer report
+
+        """
+        _source_bucket_name, _source_prefix = _aws_common_.parse_s3_filepath(source_prefix)
+        _target_bucket_name, _target_prefix = _aws_common_.parse_s3_filepath(target_prefix)
+        # a prefix is a directory, data/x must not match data/x_2/ nor delete under it
+        _source_prefix, _target_prefix = directory_prefix(_source_prefix), directory_prefix(_target_prefix)
+
+        def _list(bucket_name: str, prefix: str) -> Dict[str, Dict]:
+            return {(_each_record.get("Key")[len(prefix):]): _each_record
+                    for _each_record in _s3_listing_.iter_objects(self._client, bucket_name, prefix,
+                                                                  search_like=search_like, logger=self.logger)
+                    if not _each_record.get("Key").endswith("/")}
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            _source_future = executor.submit(_list, _source_bucket_name, _source_prefix)
+            _target_future = executor.submit(_list, _target_bucket_name, _target_prefix)
+            _source_records, _target_records = _source_future.result(), _target_future.result()
+
+        _report = TransferReport()
+        _jobs = []
+        for _relpath, _each_record in _source_records.items():
+            _source_filepath = f"s3://{_source_bucket_name}/{_source_prefix}{_relpath}"
+            _target_filepath = f"s3://{_target_bucket_name}/{_target_prefix}{_relpath}"
+            if _relpath in _target_records and self._is_same_object(_each_record, _target_records[_relpath]):
+                _report.results.append(TransferResult(_source_filepath, _target_filepath,
+                                                      size=_each_record.get("Size"), skipped=True))
+                continue
+            _jobs.append((_source_filepath, _target_filepath, _each_record.get("Size")))
+
+        _to_delete = [f"{_target_prefix}{_relpath}" for _relpath in _target_records if _relpath not in _source_records] \
+            if delete else []
+
+        if dry_run:
+            _report.dry_run = True
+            _report.planned = [TransferResult(*each_job) for each_job in _jobs]
+            _report.deleted = [f"s3://{_target_bucket_name}/{_each_key}" for _each_key in _to_delete]
+            _common_.info_logger(_report.summary(), logger=self.logger)
+            return _report
+
+        _report = self._run(self._copy, _jobs, report=_report)
+        for _index in range(0, len(_to_delete), 1000):
+            _response = self._client.delete_objects(Bucket=_target_bucket_name,
+                                                    Delete={"Objects": [{"Key": _each_key} for _each_key in _to_delete[_index: _index + 1000]],
+                                                            "Quiet": True})
+            _failed = {_each_error.get("Key") for _each_error in _response.get("Errors", [])}
+            _report.deleted.extend(f"s3://{_target_bucket_name}/{_each_key}"
+                                   for _each_key in _to_delete[_index: _index + 1000] if _each_key not in _failed)
+            _report.results.extend(TransferResult("", f"s3://{_target_bucket_name}/{_each_error.get('Key')}",
+                                                  error=f"delete failed: {_each_error.get('Message')}")
+                                   for _each_error in _response.get("Errors", []))
+        if _to_delete:
+            _common_.info_logger(f"{len(_report.deleted)} objects deleted under s3://{_target_bucket_name}/{_target_prefix}",
+                                 logger=self.logger)
+        return _report
+
+    def upload_many(self, pairs: Iterable[Union[Tuple[str, str], Tuple[str, str, Dict]]]) -> TransferReport:
+        """ upload (local filepath, s3 filepath[, extra args]) pairs concurrently
+
+        Args:
+            pairs: iterable of (local filepath, s3 filepath) or (local filepath, s3 filepath, extra args)
+
+        Returns: transfer report
+
+        """
+        return self._run(self._upload, ((*each_pair, None)[:3] for each_pair in pairs))
+
+    def download_many(self, pairs: Iterable[Union[Tuple[str, str], Tuple[str, str, Dict]]]) -> TransferReport:
+        """ download (s3 filepath, local filepath[, extra args]) pairs concurrently, use {"VersionId": ...} as
+            extra args for a specific object version
+
+        Args:
+            pairs: iterable of (s3 filepath, local filepath) or (s3 filepath, local filepath, extra args)
+
+        Returns: transfer report
+
+        """
+        return self._run(self._download, ((*each_pair, None)[:3] for each_pair in pairs))
+
+    def sync_prefix_to_directory(self,
+                                 s3_prefix: str,
+                                 local_dirpath: str,
+                                 search_like: str = "") -> TransferReport:
+        """ download every object under the s3 prefix into the local directory, keeping the relative layout.
+            files already present locally with the same size are skipped
+
+        Args:
+            s3_prefix: s3 prefix, for example s3://bucket/unload/table/
+            local_dirpath: local directory
+            search_like: only objects whose key contains the string are synced
+
+        Returns: transfer report
+
+        """
+        _bucket_name, _prefix = _aws_common_.parse_s3_filepath(s3_prefix)
+        _prefix = directory_prefix(_prefix)
+        _report = TransferReport()
+        _jobs = []
+        for _each_record in _s3_listing_.iter_objects(self._client, _bucket_name, _prefix,
+                                                      search_like=search_like, logger=self.logger):
+            _key = _each_record.get("Key")
+            if _key.endswith("/"):
+                continue
+            _relpath = os.path.normpath(_key[len(_prefix):])
+            if os.path.isabs(_relpath) or _relpath == ".." or _relpath.startswith(f"..{os.sep}"):
+                # a key like a/../../etc/passwd would be written outside the directory
+                _report.results.append(TransferResult(f"s3://{_bucket_name}/{_key}", "",
+                                                      error=f"key resolves outside {local_dirpath}, not downloaded"))
+                continue
+            _local_filepath = os.path.join(local_dirpath, _relpath)
+            if os.path.isfile(_local_filepath) and os.path.getsize(_local_filepath) == _each_record.get("Size"):
+                _report.results.append(TransferResult(f"s3://{_bucket_name}/{_key}", _local_filepath,
+                                                      size=_each_record.get("Size"), skipped=True))
+                continue
+            _jobs.append((f"s3://{_bucket_name}/{_key}", _local_filepath, None))
+
+        return self._run(self._download, _jobs, report=_report)
+
+    def sync_directory_to_prefix(self, local_dirpath: str, s3_prefix: str) -> TransferReport:
+        """ upload every file under the local directory to the s3 prefix, keeping the relative layout
+
+        Args:
+            local_dirpath: local directory
+            s3_prefix: s3 prefix, for example s3://bucket/staging/table/
+
+        Returns: transfer report
+
+        """
+        _s3_prefix = s3_prefix if s3_prefix.endswith("/") else f"{s3_prefix}/"
+        _jobs = []
+        for _dirpath, _, _filenames in os.walk(local_dirpath):
+            for _each_filename in _filenames:
+                _local_filepath = os.path.join(_dirpath, _each_filename)
+                _relpath = os.path.relpath(_local_filepath, local_dirpath).replace(os.sep, "/")
+                _jobs.append((_local_filepath, f"{_s3_prefix}{_relpath}", None))
+        if not _jobs:
+            _common_.error_logger(currentframe().f_code.co_name,
+                                  f"no file found under {local_dirpath}",
+                                  logger=self.logger,
+                                  mode="error",
+                                  ignore_flag=True)
+        return self.upload_many(_jobs)
@@ -17,7 +17,7 @@ class AwsApiSecretManager(metaclass=_meta_.Meta):
     def __init__(self, config: _config_.ConfigSingleton = None, logger: Log = None):
         self._config = config if config else _config_.ConfigSingleton()
         self._session = _aws_config_.setup_session(self._config)
-        self._client = self._session.client("secretsmanager")
+        self._client = _aws_config_.get_client(self._session, "secretsmanager")
 
     @_common_.exception_handler
     def get_secret_value(self, secret_name: str):
@@ -15,7 +15,7 @@ class AwsApiAWSstepfunction(metaclass=_meta_.Meta):
     def __init__(self, config: _config_.ConfigSingleton = None, logger: Log = None):
         self._config = config if config else _config_.ConfigSingleton()
         self._session = _aws_config_.setup_session(self._config)
-        self._client = self._session.client("stepfunctions")
+        self._client = _aws_config_.get_client(self._session, "stepfunctions")
 
     def just_for_test(self):
         print("test")
@@ -49,7 +49,7 @@ class AwsApiTexTract(metaclass=_meta_.Meta):
     def __init__(self, config: _config_.ConfigSingleton = None, logger: Log = None):
         self._config = config if config else _config_.ConfigSingleton()
         self._session = _aws_config_.setup_session(self._config)
-        self._client = self._session.client("textract")
+        self._client = _aws_config_.get_client(self._session, "textract")
 
     @_common_.exception_handler
     def textract(self, s3_filepath: str, logger: Log = None) -> Dict:
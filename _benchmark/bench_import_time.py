@@ -0,0 +1,73 @@
+import re
+import subprocess
+import sys
+import click
+from typing import Dict
+from _common import _common as _common_
+
+"""
+import time regression gate for the _connect registry, run from the repository root
+
+python -m _benchmark.bench_import_time
+python -m _benchmark.bench_import_time --module _connect._connect --max_ms 300
+
+the gate fails (exit code 1) when the cumulative import time of the module exceeds max_ms or when one of the
+heavy packages, which should only be loaded on first use of the class needing it, is imported eagerly
+"""
+
+__HEAVY_MODULES__ = ["pyspark",
+                     "databricks",
+                     "sqlglot",
+                     "sqlfluff",
+                     "github",
+                     "faiss",
+                     "sentence_transformers",
+                     "torch",
+                     "pandas",
+                     "pycarlo",
+                     "boto3"]
+
+
+def measure_import_time(module_name: str, runs: int = 5) -> Dict:
+    """ import the module in a fresh interpreter with -X importtime, the best of several runs is kept
+
+    Args:
+        module_name: module to import
+        runs: number of fresh interpreters
+
+    Returns: a dictionary of the cumulative import time in ms and the set of top level packages imported
+
+    """
+    _pattern = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+    _best_ms, _imported = float("inf"), set()
+    for _ in range(runs):
+        _process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+                                  capture_output=True, text=True, check=True)
+        for _each_line in _process.stderr.splitlines():
+            if _match := _pattern.match(_each_line):
+                _imported.add(_match.group(4).split(".")[0])
+                if _match.group(4) == module_name:
+                    _best_ms = min(_best_ms, int(_match.group(2)) / 1000)
+    return {"cumulative_ms": _best_ms, "imported": _imported}
+
+
+@click.command()
+@click.option("--module", "module_name", required=False, type=str, default="_connect._connect")
+@click.option("--max_ms", required=False, type=float, default=300)
+@click.option("--runs", required=False, type=int, default=5)
+def bench_import_time(module_name: str, max_ms: float, runs: int):
+    result = measure_import_time(module_name, runs=runs)
+    _common_.info_logger(f"import {module_name}: {result['cumulative_ms']:.1f} ms (budget {max_ms:.0f} ms)")
+
+    failed = False
+    if eager_modules := sorted(set(__HEAVY_MODULES__) & result["imported"]):
+        _common_.info_logger(f"FAILED: heavy modules imported eagerly: {', '.join(eager_modules)}")
+        failed = True
+    if result["cumulative_ms"] > max_ms:
+        _common_.info_logger(f"FAILED: import time exceeded the budget of {max_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    bench_import_time()
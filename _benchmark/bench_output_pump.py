@@ -0,0 +1,63 @@
+import os
+import resource
+import subprocess
+import tempfile
+import time
+import click
+from _common import _common as _common_
+from _engine import _output_pump as _output_pump_
+
+"""
+benchmark of the output pump of the shell runner on a command writing a large output, run from the repository root
+
+python -m _benchmark.bench_output_pump --size_mb 1024
+python -m _benchmark.bench_output_pump --size_mb 1024 --baseline_mb 256
+
+peak rss is the high water mark of this process, the pump should stay flat whatever the size of the output while
+capturing the output (the baseline, subprocess.run(capture_output=True)) grows with it, so the baseline runs last
+"""
+
+
+def command(size_mb: int) -> str:
+    # 100 byte lines on stdout and one line out of 1000 on stderr
+    return (f"yes '{'x' * 99}' | head -c {size_mb * 1024 * 1024} && "
+            f"yes 'warning: something on stderr' | head -n {size_mb * 10} >&2")
+
+
+def peak_rss_mb() -> float:
+    # kilobytes on linux, bytes on macos
+    _peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return _peak / 1024 / 1024 if os.uname().sysname == "Darwin" else _peak / 1024
+
+
+def run_pump(size_mb: int, sink) -> _output_pump_.PumpResult:
+    process = subprocess.Popen(command(size_mb), shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               start_new_session=True)
+    return _output_pump_.pump(process, timeout=3600, sink=sink)
+
+
+@click.command()
+@click.option("--size_mb", required=False, type=int, default=1024)
+@click.option("--baseline_mb", required=False, type=int, default=0)
+def bench_output_pump(size_mb: int, baseline_mb: int):
+    with tempfile.TemporaryDirectory() as dirpath:
+        file_sink = _output_pump_.FileSink(os.path.join(dirpath, "output.log"))
+        for name, sink in (("tail only", None), ("file sink", file_sink)):
+            result = run_pump(size_mb, sink)
+            total_mb = (result.stdout_bytes + result.stderr_bytes) / 1024 / 1024
+            _common_.info_logger(f"pump {name:<10} {total_mb:>8.0f} MB in {result.seconds:>6.1f} seconds "
+                                 f"({total_mb / result.seconds:>7.1f} MB/s), peak rss {peak_rss_mb():>7.1f} MB, "
+                                 f"tail {len(result.tail)} lines")
+        file_sink.close()
+
+    if baseline_mb:
+        start_time = time.perf_counter()
+        completed = subprocess.run(command(baseline_mb), shell=True, capture_output=True)
+        seconds = time.perf_counter() - start_time
+        total_mb = (len(completed.stdout) + len(completed.stderr)) / 1024 / 1024
+        _common_.info_logger(f"capture_output   {total_mb:>8.0f} MB in {seconds:>6.1f} seconds "
+                             f"({total_mb / seconds:>7.1f} MB/s), peak rss {peak_rss_mb():>7.1f} MB")
+
+
+if __name__ == "__main__":
+    bench_output_pump()
@@ -0,0 +1,82 @@
+import time
+import logging
+import click
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from _common import _common as _common_
+from _aws import awss3_listing as _s3_listing_
+
+"""
+benchmark of the s3 listing engine against a local s3 stand in, either a moto server started in process or
+an existing minio / moto endpoint
+
+pip install "moto[server]"
+
+python -m _benchmark.bench_s3_listing --num_keys 100000 --num_keys 1000000
+python -m _benchmark.bench_s3_listing --num_keys 100000 --endpoint_url http://localhost:9000
+
+"""
+
+__BUCKET_NAME__ = "bench-s3-listing"
+
+
+def get_client(endpoint_url: str):
+    return boto3.client("s3",
+                        endpoint_url=endpoint_url,
+                        region_name="us-east-1",
+                        aws_access_key_id="testing",
+                        aws_secret_access_key="testing",
+                        config=boto3.session.Config(max_pool_connections=64))
+
+
+def populate(client, prefix: str, num_keys: int, num_shards: int) -> None:
+    """ layout mimics a partitioned redshift unload, num_shards partition prefixes each holding part files """
+    def put(index: int) -> None:
+        client.put_object(Bucket=__BUCKET_NAME__,
+                          Key=f"{prefix}/partition={index % num_shards:04d}/{index:09d}_part_00.parquet",
+                          Body=b"")
+
+    with ThreadPoolExecutor(max_workers=64) as executor:
+        list(executor.map(put, range(num_keys)))
+
+
+def measure(client, prefix: str, max_workers: int) -> float:
+    start_time = time.perf_counter()
+    count = sum(1 for _ in _s3_listing_.iter_objects(client, __BUCKET_NAME__, f"{prefix}/", max_workers=max_workers))
+    return count / (time.perf_counter() - start_time)
+
+
+@click.command()
+@click.option("--num_keys", required=False, type=int, multiple=True, default=[100000, 1000000])
+@click.option("--num_shards", required=False, type=int, default=64)
+@click.option("--max_workers", required=False, type=int, default=16)
+@click.option("--endpoint_url", required=False, type=str)
+def bench_s3_listing(num_keys, num_shards: int, max_workers: int, endpoint_url: str):
+    server = None
+    if not endpoint_url:
+        from moto.server import ThreadedMotoServer
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(port=0)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint_url = f"http://{host}:{port}"
+
+    try:
+        client = get_client(endpoint_url)
+        client.create_bucket(Bucket=__BUCKET_NAME__)
+        for each_num_keys in num_keys:
+            prefix = f"unload_{each_num_keys}"
+            _common_.info_logger(f"populating {each_num_keys} keys under s3://{__BUCKET_NAME__}/{prefix}/ ...")
+            populate(client, prefix, each_num_keys, num_shards)
+            serial = measure(client, prefix, max_workers=1)
+            parallel = measure(client, prefix, max_workers=max_workers)
+            _common_.info_logger(f"keys: {each_num_keys:>9}  serial: {serial:>10.0f} objects/sec  "
+                                 f"parallel ({max_workers} workers): {parallel:>10.0f} objects/sec  "
+                                 f"speedup: {parallel / serial:.2f}x")
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == "__main__":
+    bench_s3_listing()
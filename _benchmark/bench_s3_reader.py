@@ -0,0 +1,103 @@
+import io
+import time
+import logging
+import click
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+from _common import _common as _common_
+from _aws import awss3_reader as _s3_reader_
+
+"""
+benchmark of ranged reads through S3RangeReader against downloading the whole object, for a parquet footer
+(schema / row count) and for a column projected read, against a local s3 stand in
+
+pip install "moto[server]"
+
+python -m _benchmark.bench_s3_reader --num_rows 2000000 --num_columns 40 --columns 3
+python -m _benchmark.bench_s3_reader --endpoint_url http://localhost:9000 --block_size_kb 4096
+
+moto copies the whole object to serve every ranged GET, the bytes transferred are representative with any endpoint
+but the latency of the ranged reader only is against minio or s3
+"""
+
+__BUCKET_NAME__ = "bench-s3-reader"
+__KEY__ = "bench/table.parquet"
+
+
+def get_client(endpoint_url: str):
+    return boto3.client("s3",
+                        endpoint_url=endpoint_url,
+                        region_name="us-east-1",
+                        aws_access_key_id="testing",
+                        aws_secret_access_key="testing")
+
+
+def populate(client, num_rows: int, num_columns: int) -> int:
+    table = pa.table({f"column_{index:03d}": pa.array(range(index, index + num_rows)) for index in range(num_columns)})
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, row_group_size=max(1, num_rows // 8))
+    client.put_object(Bucket=__BUCKET_NAME__, Key=__KEY__, Body=buffer.getvalue())
+    return buffer.tell()
+
+
+def full_download(client, columns):
+    body = client.get_object(Bucket=__BUCKET_NAME__, Key=__KEY__)["Body"].read()
+    parquet_file = pq.ParquetFile(io.BytesIO(body))
+    if columns:
+        parquet_file.read(columns=columns)
+    return len(body), 1
+
+
+def ranged(client, columns, block_size: int):
+    with _s3_reader_.S3RangeReader(client, f"s3://{__BUCKET_NAME__}/{__KEY__}", block_size=block_size) as reader:
+        parquet_file = pq.ParquetFile(reader)
+        if columns:
+            reader.prefetch(_s3_reader_.parquet_column_ranges(parquet_file.metadata, columns))
+            parquet_file.read(columns=columns)
+        return reader.stats.bytes_fetched, reader.stats.requests + 1
+
+
+def measure(func, *args):
+    start_time = time.perf_counter()
+    bytes_fetched, requests = func(*args)
+    return bytes_fetched, requests, time.perf_counter() - start_time
+
+
+@click.command()
+@click.option("--num_rows", required=False, type=int, default=2000000)
+@click.option("--num_columns", required=False, type=int, default=40)
+@click.option("--columns", "num_projected", required=False, type=int, default=3)
+@click.option("--block_size_kb", required=False, type=int, default=_s3_reader_.__DEFAULT_BLOCK_SIZE__ // 1024)
+@click.option("--endpoint_url", required=False, type=str)
+def bench_s3_reader(num_rows: int, num_columns: int, num_projected: int, block_size_kb: int, endpoint_url: str):
+    server = None
+    if not endpoint_url:
+        from moto.server import ThreadedMotoServer
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(port=0)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint_url = f"http://{host}:{port}"
+
+    try:
+        client = get_client(endpoint_url)
+        client.create_bucket(Bucket=__BUCKET_NAME__)
+        object_size = populate(client, num_rows, num_columns)
+        _common_.info_logger(f"s3://{__BUCKET_NAME__}/{__KEY__}: {object_size / 1024 / 1024:.1f} MB, "
+                             f"{num_rows} rows x {num_columns} columns")
+
+        projected = [f"column_{index:03d}" for index in range(0, num_columns, max(1, num_columns // num_projected))][:num_projected]
+        for name, columns in (("footer only", []), (f"{len(projected)} columns", projected)):
+            for mode, func, args in (("full download", full_download, (client, columns)),
+                                     ("ranged reader", ranged, (client, columns, block_size_kb * 1024))):
+                bytes_fetched, requests, seconds = measure(func, *args)
+                _common_.info_logger(f"{name:<12} {mode:<14} {bytes_fetched / 1024 / 1024:>9.2f} MB "
+                                     f"{requests:>5} requests {seconds * 1000:>9.1f} ms")
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == "__main__":
+    bench_s3_reader()
@@ -0,0 +1,140 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import click
+import psutil
+import pyarrow as pa
+import pyarrow.compute as pc
+from _common import _common as _common_
+from _databricks import databricks_statement_result as _statement_result_
+
+"""
+benchmark of reading a large statement result, the JSON_ARRAY chunks fetched one after another and parsed row by
+row against the ARROW_STREAM chunks of StatementResult downloaded concurrently from their external links. a local
+http server stands in for the cloud storage serving the chunks, with a latency added to every request
+
+python -m _benchmark.bench_statement_result --num_rows 10000000 --chunk_rows 500000 --latency_ms 100
+python -m _benchmark.bench_statement_result --num_rows 10000000 --skip_json --max_workers 16
+"""
+
+
+def make_chunks(num_rows: int, chunk_rows: int):
+    _chunks = []
+    for _offset in range(0, num_rows, chunk_rows):
+        _ids = pa.array(range(_offset, min(num_rows, _offset + chunk_rows)), type=pa.int64())
+        _table = pa.table({"id": _ids,
+                           "amount": pc.multiply(_ids.cast(pa.float64()), 0.01),
+                           "name": pc.binary_join_element_wise("model_", _ids.cast(pa.string()), "")})
+        _sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(_sink, _table.schema) as writer:
+            writer.write_table(_table)
+        _chunks.append(_sink.getvalue().to_pybytes())
+    return _chunks
+
+
+def json_chunk(arrow_chunk: bytes) -> bytes:
+    # the statement api returns every value as a string in JSON_ARRAY
+    _table = pa.ipc.open_stream(arrow_chunk).read_all()
+    return json.dumps({"data_array": [[str(each_value) for each_value in each_row.values()]
+                                      for each_row in _table.to_pylist()]}).encode()
+
+
+def serve(chunks, latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            _kind, _index = self.path.strip("/").split("/")
+            _body = chunks[_kind][int(_index)]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(_body)))
+            self.end_headers()
+            self.wfile.write(_body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def statement(url: str, num_chunks: int, num_rows: int):
+    """ statement api stand in, a link per chunk """
+    def link(chunk_index: int):
+        return SimpleNamespace(chunk_index=chunk_index, external_link=f"{url}/arrow/{chunk_index}",
+                               expiration=None, http_headers=None)
+
+    client = SimpleNamespace(statement_execution=SimpleNamespace(
+        get_statement_result_chunk_n=lambda statement_id, chunk_index: SimpleNamespace(external_links=[link(chunk_index)])))
+    response = SimpleNamespace(statement_id="bench",
+                               manifest=SimpleNamespace(total_chunk_count=num_chunks, total_row_count=num_rows, truncated=False),
+                               result=SimpleNamespace(external_links=[link(0)]))
+    return client, response
+
+
+def json_rows(url: str, num_chunks: int):
+    import requests
+    _session = requests.Session()
+    _rows = 0
+    _total = 0
+    for _each_chunk in range(num_chunks):
+        for _each_row in _session.get(f"{url}/json/{_each_chunk}").json()["data_array"]:
+            _rows += 1
+            _total += int(_each_row[0])
+    return _rows, _total
+
+
+def arrow_batches(client, response, max_workers: int, prefetch_chunks: int):
+    result = _statement_result_.StatementResult(client, response, max_workers=max_workers, prefetch_chunks=prefetch_chunks)
+    _rows = 0
+    _total = 0
+    _peak = 0
+    for _each_batch in result.record_batches():
+        _rows += _each_batch.num_rows
+        _total += pc.sum(_each_batch.column("id")).as_py()
+        _peak = max(_peak, psutil.Process().memory_info().rss)
+    return _rows, _total, _peak, result
+
+
+@click.command()
+@click.option("--num_rows", required=False, type=int, default=10_000_000)
+@click.option("--chunk_rows", required=False, type=int, default=500_000)
+@click.option("--latency_ms", required=False, type=int, default=100)
+@click.option("--max_workers", required=False, type=int, default=8)
+@click.option("--prefetch_chunks", required=False, type=int, default=8)
+@click.option("--skip_json", is_flag=True, default=False)
+def bench_statement_result(num_rows: int, chunk_rows: int, latency_ms: int, max_workers: int, prefetch_chunks: int,
+                           skip_json: bool):
+    arrow_chunks = make_chunks(num_rows, chunk_rows)
+    json_chunks = [] if skip_json else [json_chunk(each_chunk) for each_chunk in arrow_chunks]
+    server = serve({"arrow": arrow_chunks, "json": json_chunks}, latency_ms / 1000)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    _common_.info_logger(f"{num_rows} rows in {len(arrow_chunks)} chunks, "
+                         f"arrow {sum(map(len, arrow_chunks)) / 1024 / 1024:.0f} MB"
+                         + ("" if skip_json else f", json {sum(map(len, json_chunks)) / 1024 / 1024:.0f} MB"))
+    # the chunks served by the stand in are in memory already, the peak is above them
+    _baseline = psutil.Process().memory_info().rss
+    arrow_chunks_size = sum(map(len, arrow_chunks))
+
+    if not skip_json:
+        start_time = time.perf_counter()
+        rows, total = json_rows(url, len(json_chunks))
+        seconds = time.perf_counter() - start_time
+        _common_.info_logger(f"{'json row by row':<22} {seconds:>8.2f} seconds, {rows / seconds:>12,.0f} rows per second")
+
+    for workers in sorted({1, max_workers}):
+        client, response = statement(url, len(arrow_chunks), num_rows)
+        start_time = time.perf_counter()
+        rows, total, peak, result = arrow_batches(client, response, workers, prefetch_chunks)
+        seconds = time.perf_counter() - start_time
+        _common_.info_logger(f"{f'arrow {workers} workers':<22} {seconds:>8.2f} seconds, {rows / seconds:>12,.0f} rows per second, "
+                             f"peak memory {(peak - _baseline) / 1024 / 1024:.0f} MB "
+                             f"(result {arrow_chunks_size / 1024 / 1024:.0f} MB)")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    bench_statement_result()
@@ -0,0 +1,58 @@
+import os
+import json
+import time
+import click
+from jinja2 import Template
+from _common import _common as _common_
+from _util import _util_file as _util_file_
+from _template import _get_template
+
+"""
+benchmark of generating the rendered steps of a pattern template for many models, parsing the yaml and building a
+jinja template for every step of every model against the compiled template, run from the repository root
+
+python -m _benchmark.bench_template_render --num_models 500
+python -m _benchmark.bench_template_render --template _pattern_template/tubibricks_history_load_template.yaml
+"""
+
+__DEFAULT_TEMPLATE__ = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                    "_pattern_template", "tubibricks_history_load_template.yaml")
+
+
+def parameters(template_content, index: int):
+    # every variable of the template gets a value, the model name changes for each model
+    _names = set(_get_template._variables(json.dumps(template_content)))
+    return {**{each_name: f"{each_name.lower()}_value" for each_name in _names}, "MODEL_NAME": f"model_{index:04d}"}
+
+
+def parse_every_time(template_filepath: str, variables):
+    template_content = _util_file_.yaml_load(template_filepath)
+    return {each_name: json.loads(Template(json.dumps(each_step)).render(variables).strip())
+            for each_name, each_step in template_content.items()}
+
+
+def compiled(template_filepath: str, variables):
+    return _get_template.compile_template(template_filepath).render(variables)
+
+
+@click.command()
+@click.option("--template", "template_filepath", required=False, type=str, default=__DEFAULT_TEMPLATE__)
+@click.option("--num_models", required=False, type=int, default=500)
+def bench_template_render(template_filepath: str, num_models: int):
+    template_content = _util_file_.yaml_load(template_filepath)
+    all_parameters = [parameters(template_content, index) for index in range(num_models)]
+    _common_.info_logger(f"{template_filepath}: {len(template_content)} steps, {num_models} models")
+
+    results = {}
+    for name, func in (("parse every time", parse_every_time), ("compiled", compiled)):
+        start_time = time.perf_counter()
+        results[name] = [func(template_filepath, each_parameters) for each_parameters in all_parameters]
+        seconds = time.perf_counter() - start_time
+        _common_.info_logger(f"{name:<18} {seconds:>8.2f} seconds, {seconds / num_models * 1000:>8.2f} ms per model")
+
+    if results["parse every time"] != results["compiled"]:
+        _common_.info_logger("rendered steps differ")
+
+
+if __name__ == "__main__":
+    bench_template_render()
@@ -1,57 +1,147 @@
+import os
+import time
+import hashlib
+import threading
 from os import path
 from collections import defaultdict
 from inspect import currentframe
+from types import MappingProxyType
 from _common import _common as _common_
-from typing import Dict
+from typing import Dict, Mapping, Tuple
 from _util import _util_file as _util_file_
 from _util import _util_directory as _util_directory_
 
 
-class ConfigSingleton:
+__STAT_INTERVAL__ = 1.0
 
-    def __new__(cls, profile_name: str = "config_dev"):
-        """ storing the profile name under ~/.deat directory, although user can switch profile, use of singleton
-            to ensure only one profile instance is used during the execution. defaults to default.yaml
 
-        Args:
-            config_loc:
+class ProfileConfig(defaultdict):
+    def __init__(self, *args, **kwargs):
+        """ configuration of one profile, the parsed profile file overlaid with the values set by the caller.
+            values set by the caller survive a reload of the profile file
         """
+        super().__init__(str, *args, **kwargs)
+        self.overrides = {}
+        self._lock = threading.RLock()
 
-        if not hasattr(cls, "instance"):
-            _profile_name = profile_name
-            home_dir = path.expanduser("~/.deat")
-            config_loc = path.join(home_dir, profile_name) + ".yaml"
-
-            if is_dir_exist := _util_directory_.create_directory(home_dir):
-                if not _util_file_.is_file_exist(config_loc):
-                    if _profile_name == "default":
-                        _util_file_.yaml_dump2(config_loc, {})
-                    else:
-                        _common_.error_logger(currentframe().f_code.co_name,
-                                              f"can't find {profile_name}, all valid profile name is under {home_dir}, "
-                                              f"there are {(valid_profile := [each_profile.split('/')[-1].split('.')[0] for each_profile in _util_file_.files_in_dir(home_dir) if each_profile.endswith('.yaml')]) or (valid_profile if len(valid_profile) > 0 else 'no profile found')}",
-                                              logger=None,
-                                              mode="error",
-                                              ignore_flag=False)
-            else:
-                _common_.error_logger(currentframe().f_code.co_name,
-                                      f"error in creating {home_dir}",
-                                      logger=None,
-                                      mode="error",
-                                      ignore_flag=False)
+    def __missing__(self, key):
+        # a missing key reads as empty without being stored, a stored default would be kept as an override and
+        # hide the key once it is added to the profile file
+        return self.default_factory()
 
-            cls.config = defaultdict(str)
-            cls.instance = super(ConfigSingleton, cls).__new__(cls)
-            """
+    def __setitem__(self, key, value):
+        with self._lock:
+            self.overrides[key] = value
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            self.overrides.pop(key, None)
+            super().__delitem__(key)
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            if key not in self:
+                self[key] = default
+            return dict.__getitem__(self, key)
+
+    def pop(self, key, *default):
+        with self._lock:
+            self.overrides.pop(key, None)
+            return super().pop(key, *default)
+
+    def update(self, *args, **kwargs):
+        with self._lock:
+            for _name, _val in dict(*args, **kwargs).items():
+                self[_name] = _val
+
+    def apply_snapshot(self, snapshot: Mapping) -> None:
+        """ replace the values read from the profile file in place, worker threads keep reading the same object:
+            a key present before and after the reload is never missing, only the removed keys are dropped
+        """
+        with self._lock:
+            _merged = {**snapshot, **self.overrides}
+            for _each_key in [each_key for each_key in self if each_key not in _merged]:
+                dict.pop(self, _each_key, None)
+            dict.update(self, _merged)
+
+
+class ConfigStore:
+    """ keeps one parsed snapshot per profile under ~/.deat, a profile file is only re-read when its mtime or size
+        changed and only re-parsed when its content hash changed. snapshots are handed out as read only views
+    """
+    _lock = threading.RLock()
+    _snapshots: Dict[str, Dict] = {}
+
+    @staticmethod
+    def get_config_loc(profile_name: str) -> str:
+        return path.join(path.expanduser("~/.deat"), profile_name) + ".yaml"
+
+    @classmethod
+    def _validate_profile(cls, profile_name: str) -> str:
+        home_dir = path.expanduser("~/.deat")
+        config_loc = cls.get_config_loc(profile_name)
+
+        if is_dir_exist := _util_directory_.create_directory(home_dir):
+            if not _util_file_.is_file_exist(config_loc):
+                if profile_name == "default":
+                    _util_file_.yaml_dump2(config_loc, {})
+                else:
+                    _common_.error_logger(currentframe().f_code.co_name,
+                                          f"can't find {profile_name}, all valid profile name is under {home_dir}, "
+                                          f"there are {(valid_profile := [each_profile.split('/')[-1].split('.')[0] for each_profile in _util_file_.files_in_dir(home_dir) if each_profile.endswith('.yaml')]) or (valid_profile if len(valid_profile) > 0 else 'no profile found')}",
+                                          logger=None,
+                                          mode="error",
+                                          ignore_flag=False)
+        else:
+            _common_.error_logger(currentframe().f_code.co_name,
+                                  f"error in creating {home_dir}",
+                                  logger=None,
+                                  mode="error",
+                                  ignore_flag=False)
+        return config_loc
+
+    @classmethod
+    def load(cls, profile_name: str, force: bool = False) -> Tuple[Mapping, bool]:
+        """ return the snapshot of the profile, reloading it if the file changed on disk
+
+        Args:
+            profile_name: profile name, for example config_dev
+            force: check the file even if it was checked less than __STAT_INTERVAL__ seconds ago
+
+        Returns: a tuple of (read only view of the parsed profile, whether the snapshot changed)
+
+        """
+        with cls._lock:
+            if (_snapshot := cls._snapshots.get(profile_name)) is None:
+                _snapshot = {"config_loc": cls._validate_profile(profile_name),
+                             "stat": None,
+                             "digest": None,
+                             "data": MappingProxyType({}),
+                             "checked": 0.0}
+                cls._snapshots[profile_name] = _snapshot
+                force = True
+
+            _now = time.monotonic()
+            if not force and _now - _snapshot["checked"] < __STAT_INTERVAL__:
+                return _snapshot["data"], False
+            _snapshot["checked"] = _now
 
-            Args:
-                config_loc: default configuration file location
-            """
             try:
-                _common_.info_logger(f"loading variables from profile name {_profile_name}...")
-                for _name, _val in _util_file_.yaml_load(config_loc).items():
-                    if _name not in cls.config:
-                        cls.config[_name] = _val
+                _stat = os.stat(_snapshot["config_loc"])
+                if (_stat.st_mtime_ns, _stat.st_size) == _snapshot["stat"]:
+                    return _snapshot["data"], False
+                _snapshot["stat"] = (_stat.st_mtime_ns, _stat.st_size)
+
+                with open(_snapshot["config_loc"], "rb") as file:
+                    _content = file.read()
+                if (_digest := hashlib.sha256(_content).hexdigest()) == _snapshot["digest"]:
+                    return _snapshot["data"], False
+
+                _snapshot["data"] = MappingProxyType(dict(_util_file_.yaml_loads(_content) or {}))
+                _snapshot["digest"] = _digest
+                return _snapshot["data"], True
+
             except Exception as err:
                 _common_.error_logger(currentframe().f_code.co_name,
                                       err,
@@ -59,7 +149,59 @@ class ConfigSingleton:
                                       mode="error",
                                       ignore_flag=False)
 
-        return cls.instance
+
+class ConfigSingleton:
+    _instances: Dict[str, "ConfigSingleton"] = {}
+    _default_profile_name: str = ""
+
+    def __new__(cls, profile_name: str = None):
+        """ one instance per profile under ~/.deat, so config_dev and config_prod can be served side by side in one
+            process. without a profile name the first profile loaded in the process is returned, defaults to
+            config_dev. the profile file is re-read when it changes on disk, values set by the caller are kept
+
+        Args:
+            profile_name: profile name, for example config_dev
+        """
+        if isinstance(profile_name, ConfigSingleton):
+            return profile_name
+
+        with ConfigStore._lock:
+            _profile_name = profile_name or cls._default_profile_name or "config_dev"
+            if (instance := cls._instances.get(_profile_name)) is None:
+                instance = super(ConfigSingleton, cls).__new__(cls)
+                instance.profile_name = _profile_name
+                instance.config = ProfileConfig()
+                _common_.info_logger(f"loading variables from profile name {_profile_name}...")
+                instance.refresh(force=True)
+                cls._instances[_profile_name] = instance
+                if not cls._default_profile_name:
+                    cls._default_profile_name = _profile_name
+                    cls.instance = instance
+            else:
+                instance.refresh()
+            return instance
+
+    def refresh(self, force: bool = False) -> bool:
+        """ reload the profile file if it changed on disk, long running processes call it in their loop
+
+        Args:
+            force: check the file even if it was checked less than __STAT_INTERVAL__ seconds ago
+
+        Returns: True if the configuration changed
+
+        """
+        _snapshot, _changed = ConfigStore.load(self.profile_name, force=force)
+        if _changed:
+            self.config.apply_snapshot(_snapshot)
+        return _changed
+
+    def view(self) -> Mapping:
+        """ read only view of the configuration, no copy is made
+
+        Returns: a read only mapping
+
+        """
+        return MappingProxyType(self.config)
 
 
 
@@ -1,72 +1,227 @@
 import contextlib
 import functools
+import threading
+from importlib import import_module
 from types import SimpleNamespace
 from inspect import currentframe
-from typing import Callable, TypeVar
+from typing import Callable, Dict, Tuple, TypeVar
 from logging import Logger as Log
 from _config import config as _config_
 from _common import _common as _common_
 from _meta import _meta as _meta_
-from _igithub import _github
-from _aws import awss3
-from _aws import awsroute53
-from _aws import awsec2
-from _aws import awsstepfunction
-from _aws import awsdynamodb
-from _aws import awscloudformation
-from _aws import awsiam
-from _aws import awslambda
-from _aws import awscloudwatch
-from _aws import awscloudwatchlog
-from _aws import awsasg
-from _aws import awstextract
-from _aws import awskms
-from _aws import awsrds
-from _aws import awssecretmanager
-from _aws import _awsredshift
-from _aws import _awsredshift_data
-from _directive import process_task
-from _directive import image_to_text
-from _directive import databricks_sdk
-from _directive import sqlparse
-from _directive import buik_load
-from _api import _databrickscluster
-from _directive import redshift
-from _api import _pycarlo
 
 
 RT = TypeVar("RT")
 
+# every factory resolves names against one of the metaclass registries
+_registration_by_kind = {
+    "object": lambda: _meta_.MetaSingleton().object_registration,
+    "directive": lambda: _meta_.MetaDirectiveSingleton().object_registration,
+    "api": lambda: _meta_.MetaAPISingleton().object_registration,
+}
+
+# static manifest of lower cased registration name to "module:Class", a module is only imported the first time
+# one of its classes is requested, so a caller needing s3 does not pay for pyspark, sqlglot or the databricks sdk.
+# classes keep registering themselves through the Meta / MetaDirective / MetaAPI prefix conventions on import
+_lazy_registration = {
+    "object": {
+        "awss3": "_aws.awss3:AwsApiAWSS3",
+        "awsroute53": "_aws.awsroute53:AwsApiAWSRoute53",
+        "awsec2": "_aws.awsec2:AwsApiAWSEC2",
+        "awsstepfunction": "_aws.awsstepfunction:AwsApiAWSstepfunction",
+        "dynamodb": "_aws.awsdynamodb:AwsApiDynamoDB",
+        "awscf": "_aws.awscloudformation:AwsApiAWSCF",
+        "awsiam": "_aws.awsiam:AwsApiAWSIAM",
+        "awslambda": "_aws.awslambda:AwsApiAWSLambda",
+        "awscloudwatch": "_aws.awscloudwatch:AwsApiAWSCloudWatch",
+        "awscloudwatchlog": "_aws.awscloudwatchlog:AwsApiAWSCloudWatchLog",
+        "awsasg": "_aws.awsasg:AwsApiAWSASG",
+        "textract": "_aws.awstextract:AwsApiTexTract",
+        "awskms": "_aws.awskms:AwsApiAWSKMS",
+        "awsrds": "_aws.awsrds:AwsApiAWSRDS",
+        "secretmanager": "_aws.awssecretmanager:AwsApiSecretManager",
+        "redshift": "_aws._awsredshift:AwsApiRedshift",
+        "redshiftdata": "_aws._awsredshift_data:AwsApiRedshiftData",
+        "github": "_igithub._github:AwsApiGithub",
+    },
+    "directive": {
+        "process_task": "_directive.process_task:DirectiveProcess_Task",
+        "image_to_text": "_directive.image_to_text:DirectiveImage_to_text",
+        "databricks_sdk": "_directive.databricks_sdk:DirectiveDatabricks_SDK",
+        "sqlparse": "_directive.sqlparse:DirectiveSQLParse",
+        "bulkload": "_directive.buik_load:DirectiveBulkLoad",
+        "redshift": "_directive.redshift:DirectiveRedshift",
+    },
+    "api": {
+        "databrickscluster": "_api._databrickscluster:APIDatabricksCluster",
+        "pycarlo": "_api._pycarlo:APIPyCarlo",
+    },
+}
+
+_factory_lock = threading.RLock()
+_registry_index_cache: Dict[str, Tuple[int, Dict]] = {}
+_instance_cache: Dict[Tuple[str, str, str], object] = {}
+# one lock per cached instance, a slow construction (auth, network) only blocks the callers of the same instance
+_instance_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+
+
+def supported_names(kind: str) -> list:
+    """return every name a factory of the kind can resolve, registered or not imported yet
+
+    Args:
+        kind: object, directive or api
+
+    Returns: a sorted list of lower cased names
+
+    """
+    return sorted(set(_lazy_registration[kind]) | set(registry_index(kind)))
+
+
+def registry_index(kind: str, object_type: str = "") -> Dict:
+    """return the lower cased name index of a registry, the index is rebuilt only when new classes get registered.
+       if object_type is not registered yet, the module declaring it in the manifest is imported first
+
+    Args:
+        kind: object, directive or api
+        object_type: optional name which is going to be looked up
+
+    Returns: a dictionary of lower cased name to registration entry
+
+    """
+    _registration = _registration_by_kind[kind]()
+    if object_type and (_target := _lazy_registration[kind].get(object_type.lower())) and \
+            object_type.lower() not in {_name.lower() for _name in _registration}:
+        # importing the module registers the class through its metaclass
+        import_module(_target.split(":")[0])
+    with _factory_lock:
+        _cached = _registry_index_cache.get(kind)
+        if _cached is None or _cached[0] != len(_registration):
+            _cached = (len(_registration), {_object_name.lower(): _object_val for _object_name, _object_val in
+                                            _registration.items()})
+            _registry_index_cache[kind] = _cached
+        return _cached[1]
+
+
+def _get_instance(kind: str,
+                  object_type: str,
+                  profile_name: str,
+                  construct: Callable,
+                  reuse: bool = True):
+    """return the cached instance for (kind, object_type, profile_name), construct it on first use.
+       with reuse turned off a fresh instance is constructed and never cached. a class setting __reusable__ to
+       False (it switches its own account or session in place) is never shared and always constructed fresh
+    """
+    _key = (kind, object_type.lower(), str(profile_name))
+    _object_ptr = registry_index(kind).get(object_type.lower()).get("object_ptr")
+    if not reuse or not getattr(_object_ptr, "__reusable__", True):
+        return construct(_object_ptr)
+    with _factory_lock:
+        if (_instance := _instance_cache.get(_key)) is not None:
+            return _instance
+        _instance_lock = _instance_locks.setdefault(_key, threading.Lock())
+    with _instance_lock:
+        with _factory_lock:
+            if (_instance := _instance_cache.get(_key)) is not None:
+                return _instance
+        _instance = construct(_object_ptr)
+        with _factory_lock:
+            _instance_cache[_key] = _instance
+        return _instance
+
+
+def _close_instance(instance, logger: Log = None) -> None:
+    for _method_name in ("close", "stop"):
+        if callable(_close_method := getattr(instance, _method_name, None)):
+            try:
+                _close_method()
+            except Exception as err:
+                _common_.error_logger(currentframe().f_code.co_name,
+                                      err,
+                                      logger=logger,
+                                      mode="error",
+                                      ignore_flag=True)
+            return
+
+
+def close_object(object_name: str = "",
+                 profile_name: str = "",
+                 kind: str = "",
+                 logger: Log = None) -> int:
+    """evict cached instances and release their resources, an empty argument matches everything,
+       for example close_object() closes every cached instance
+
+    Args:
+        object_name: name of the object, for example awss3, databricks_sdk
+        profile_name: profile name
+        kind: object, directive or api
+        logger: logger object
+
+    Returns: number of instances closed
+
+    """
+    with _factory_lock:
+        _matched = [_key for _key in _instance_cache if (not kind or _key[0] == kind) and
+                    (not object_name or _key[1] == object_name.lower()) and
+                    (not profile_name or _key[2] == str(profile_name))]
+        _instances = [_instance_cache.pop(_key) for _key in _matched]
+    for _each_instance in _instances:
+        _close_instance(_each_instance, logger=logger)
+    return len(_instances)
+
+
+@contextlib.contextmanager
+def object_scope(object_name: str,
+                 profile_name: str,
+                 kind: str = "object",
+                 logger: Log = None):
+    """yield a fresh, uncached instance which is closed when the block exits
+
+    Args:
+        object_name: name of the object, for example awss3, databricks_sdk
+        profile_name: profile name
+        kind: object, directive or api
+        logger: logger object
+
+    Returns: instance of class object
+
+    """
+    _get_func = {"object": get_object, "directive": get_directive, "api": get_api}[kind]
+    _instance = _get_func(object_name, profile_name, logger=logger, reuse=False)
+    try:
+        yield _instance
+    finally:
+        if _instance is not None:
+            _close_instance(_instance, logger=logger)
+
 
 @contextlib.contextmanager
 def create_session(object_type: str,
                    profile_name: str,
-                   logger: Log = None) -> Callable:
+                   logger: Log = None,
+                   reuse: bool = True) -> Callable:
     """create an instance of reference object based on input object_type
 
     Args:
         object_type: type of the object, for example, slack, pagerduty
         profile_name: profile name
         logger: whether error msg should be persisted in a log file
+        reuse: return the instance cached for (object_type, profile_name) instead of constructing a new one
 
     Returns: instance of class object
 
     """
-    _config = _config_.ConfigSingleton(profile_name=profile_name)
-
-    _object_dict = {_object_name.lower(): _object_val for _object_name, _object_val in
-                    _meta_.MetaSingleton().object_registration.items()}
+    _object_dict = registry_index("object", object_type)
 
     if object_type.lower() not in _object_dict.keys():
         _common_.error_logger(currentframe().f_code.co_name,
-                              f"{object_type} is not found, currently {' '.join(_object_dict.keys())} are supported",
+                              f"{object_type} is not found, currently {' '.join(supported_names('object'))} are supported",
                               logger=logger,
                               mode="error",
                               ignore_flag=False)
     try:
-        # print(_object_dict[object_type.lower()])["object_ptr"]
-        # exit(0)
-        yield _object_dict.get(object_type.lower(), None).get("object_ptr")(_config)
+        yield _get_instance("object", object_type, profile_name,
+                            lambda object_ptr: object_ptr(_config_.ConfigSingleton(profile_name=profile_name)),
+                            reuse=reuse)
 
     except Exception as err:
         _common_.error_logger(currentframe().f_code.co_name,
@@ -79,7 +234,8 @@ def create_session(object_type: str,
 def object_binding(object_type: str,
                    profile_name: str,
                    object_name: str = "",
-                   variable_name: str = "identity_action") -> Callable[[Callable[..., RT]], Callable[..., RT]]:
+                   variable_name: str = "identity_action",
+                   reuse: bool = True) -> Callable[[Callable[..., RT]], Callable[..., RT]]:
     """this decorator provides the functionality to bind an instance of object to variable_name
        if variable_name is not associated to an object yet
 
@@ -88,24 +244,27 @@ def object_binding(object_type: str,
         profile_name: profile name
         object_name: name of an object
         variable_name: the binding variable name
+        reuse: bind the cached instance for (object_type, profile_name), set to False for a fresh instance
 
     Returns: a function
 
     """
     def decorator(func):
+        # resolved once per decorated function rather than on every call
+        arg_session = variable_name
+        func_params = func.__code__.co_varnames
+        arg_session_index = func_params.index(arg_session) if arg_session in func_params else -1
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            arg_session = variable_name
-            func_params = func.__code__.co_varnames
-
-            session_in_args = arg_session in func_params and func_params.index(arg_session) < len(args)
+            session_in_args = -1 < arg_session_index < len(args)
             session_in_kwargs = arg_session in kwargs
 
             if (session_in_args or session_in_kwargs) and variable_name in kwargs and object_type in kwargs.get(variable_name).__dict__:
                 if object_name is None or object_name in kwargs.get(variable_name).__dict__.get(object_type).__dict__:
                     return func(*args, **kwargs)
             else:
-                with create_session(object_type, profile_name) as session:
+                with create_session(object_type, profile_name, reuse=reuse) as session:
                     if session:
                         if object_name:
                             object_name_namespace = SimpleNamespace(**{object_name: session})
@@ -119,9 +278,10 @@ def object_binding(object_type: str,
 
 def get_object(object_name: str,
                profile_name: str,
-               logger: Log = None):
+               logger: Log = None,
+               reuse: bool = True):
     try:
-        return object_binding(object_name, profile_name)(lambda identity_action: identity_action)()
+        return object_binding(object_name, profile_name, reuse=reuse)(lambda identity_action: identity_action)()
     except Exception as err:
         _common_.error_logger(currentframe().f_code.co_name,
                               err,
@@ -131,30 +291,30 @@ def get_object(object_name: str,
 
 @_common_.exception_handler
 @contextlib.contextmanager
-def create_session_directive(object_type: str, profile_name: str, logger: Log = None) -> Callable:
+def create_session_directive(object_type: str, profile_name: str, logger: Log = None, reuse: bool = True) -> Callable:
     """create an instance of reference object based on input object_type
 
     Args:
         object_type: type of the object, for example, slack, pagerduty
         profile_name: profile name
         logger: whether error msg should be persisted in a log file
+        reuse: return the instance cached for (object_type, profile_name) instead of constructing a new one
 
     Returns: instance of class object
 
     """
-    _config = _config_.ConfigSingleton(profile_name=profile_name)
-
-    _object_dict = {_object_name.lower(): _object_val for _object_name, _object_val in
-                    _meta_.MetaDirectiveSingleton().object_registration.items()}
+    _object_dict = registry_index("directive", object_type)
 
     if object_type.lower() not in _object_dict.keys():
         _common_.error_logger(currentframe().f_code.co_name,
-                              f"{object_type} is not found, currently {' '.join(_object_dict.keys())} are supported",
+                              f"{object_type} is not found, currently {' '.join(supported_names('directive'))} are supported",
                               logger=logger,
                               mode="error",
                               ignore_flag=False)
     try:
-        yield _object_dict.get(object_type.lower(), None).get("object_ptr")(profile_name, _config)
+        yield _get_instance("directive", object_type, profile_name,
+                            lambda object_ptr: object_ptr(profile_name, _config_.ConfigSingleton(profile_name=profile_name)),
+                            reuse=reuse)
 
     except Exception as err:
         _common_.error_logger(currentframe().f_code.co_name,
@@ -167,7 +327,8 @@ def create_session_directive(object_type: str, profile_name: str, logger: Log =
 def object_binding_directive(object_type: str,
                              profile_name: str,
                              object_name: str = "",
-                             variable_name: str = "directive") -> Callable[[Callable[..., RT]], Callable[..., RT]]:
+                             variable_name: str = "directive",
+                             reuse: bool = True) -> Callable[[Callable[..., RT]], Callable[..., RT]]:
 
     """this decorator provides the functionality to bind an instance of object to variable_name
        if variable_name is not associated to an object yet
@@ -177,25 +338,28 @@ def object_binding_directive(object_type: str,
         profile_name: profile name
         object_name: name of an object
         variable_name: the binding variable name
+        reuse: bind the cached instance for (object_type, profile_name), set to False for a fresh instance
 
     Returns: a function
 
     """
 
     def decorator(func):
+        # resolved once per decorated function rather than on every call
+        arg_session = variable_name
+        func_params = func.__code__.co_varnames
+        arg_session_index = func_params.index(arg_session) if arg_session in func_params else -1
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            arg_session = variable_name
-            func_params = func.__code__.co_varnames
-
-            session_in_args = arg_session in func_params and func_params.index(arg_session) < len(args)
+            session_in_args = -1 < arg_session_index < len(args)
             session_in_kwargs = arg_session in kwargs
 
             if (session_in_args or session_in_kwargs) and variable_name in kwargs and object_type in kwargs.get(variable_name).__dict__:
                 if object_name is None or object_name in kwargs.get(variable_name).__dict__.get(object_type).__dict__:
                     return func(*args, **kwargs)
             else:
-                with create_session_directive(object_type, profile_name) as session:
+                with create_session_directive(object_type, profile_name, reuse=reuse) as session:
                     if session:
                         if object_name:
                             object_name_namespace = SimpleNamespace(**{object_name: session})
@@ -209,9 +373,10 @@ def object_binding_directive(object_type: str,
 
 def get_directive(object_name: str,
                   profile_name: str,
-                  logger: Log = None):
+                  logger: Log = None,
+                  reuse: bool = True):
     try:
-        return object_binding_directive(object_name, profile_name)(lambda directive: directive)()
+        return object_binding_directive(object_name, profile_name, reuse=reuse)(lambda directive: directive)()
     except Exception as err:
         _common_.error_logger(currentframe().f_code.co_name,
                               err,
@@ -233,30 +398,30 @@ def get_directive(object_name: str,
 
 
 @contextlib.contextmanager
-def create_session_api(object_type: str, profile_name: str, logger: Log = None) -> Callable:
+def create_session_api(object_type: str, profile_name: str, logger: Log = None, reuse: bool = True) -> Callable:
     """create an instance of reference object based on input object_type
 
     Args:
         object_type: type of the object, for example, slack, pagerduty
         profile_name: profile name
         logger: whether error msg should be persisted in a log file
+        reuse: return the instance cached for (object_type, profile_name) instead of constructing a new one
 
     Returns: instance of class object
 
     """
-    _config = _config_.ConfigSingleton(profile_name=profile_name)
-
-    _object_dict = {_object_name.lower(): _object_val for _object_name, _object_val in
-                    _meta_.MetaAPISingleton().object_registration.items()}
+    _object_dict = registry_index("api", object_type)
 
     if object_type.lower() not in _object_dict.keys():
         _common_.error_logger(currentframe().f_code.co_name,
-                              f"{object_type} is not found, currently {' '.join(_object_dict.keys())} are supported",
+                              f"{object_type} is not found, currently {' '.join(supported_names('api'))} are supported",
                               logger=logger,
                               mode="error",
                               ignore_flag=False)
     try:
-        yield _object_dict.get(object_type.lower(), None).get("object_ptr")(profile_name, _config)
+        yield _get_instance("api", object_type, profile_name,
+                            lambda object_ptr: object_ptr(profile_name, _config_.ConfigSingleton(profile_name=profile_name)),
+                            reuse=reuse)
 
     except Exception as err:
         _common_.error_logger(currentframe().f_code.co_name,
@@ -272,7 +437,8 @@ def create_session_api(object_type: str, profile_name: str, logger: Log = None)
 def object_binding_api(object_type: str,
                        profile_name: str,
                        object_name: str = "",
-                       variable_name: str = "api") -> Callable[[Callable[..., RT]], Callable[..., RT]]:
+                       variable_name: str = "api",
+                       reuse: bool = True) -> Callable[[Callable[..., RT]], Callable[..., RT]]:
 
     """this decorator provides the functionality to bind an instance of object to variable_name
        if variable_name is not associated to an object yet
@@ -282,25 +448,28 @@ def object_binding_api(object_type: str,
         profile_name: profile name
         object_name: name of an object
         variable_name: the binding variable name
+        reuse: bind the cached instance for (object_type, profile_name), set to False for a fresh instance
 
     Returns: a function
 
     """
 
     def decorator(func):
+        # resolved once per decorated function rather than on every call
+        arg_session = variable_name
+        func_params = func.__code__.co_varnames
+        arg_session_index = func_params.index(arg_session) if arg_session in func_params else -1
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            arg_session = variable_name
-            func_params = func.__code__.co_varnames
-
-            session_in_args = arg_session in func_params and func_params.index(arg_session) < len(args)
+            session_in_args = -1 < arg_session_index < len(args)
             session_in_kwargs = arg_session in kwargs
 
             if (session_in_args or session_in_kwargs) and variable_name in kwargs and object_type in kwargs.get(variable_name).__dict__:
                 if object_name is None or object_name in kwargs.get(variable_name).__dict__.get(object_type).__dict__:
                     return func(*args, **kwargs)
             else:
-                with create_session_api(object_type, profile_name) as session:
+                with create_session_api(object_type, profile_name, reuse=reuse) as session:
                     if session:
                         if object_name:
                             object_name_namespace = SimpleNamespace(**{object_name: session})
@@ -314,9 +483,10 @@ def object_binding_api(object_type: str,
 
 def get_api(object_name: str,
             profile_name: str,
-            logger: Log = None):
+            logger: Log = None,
+            reuse: bool = True):
     try:
-        return object_binding_api(object_name, profile_name)(lambda api: api)()
+        return object_binding_api(object_name, profile_name, reuse=reuse)(lambda api: api)()
     except Exception as err:
         _common_.error_logger(currentframe().f_code.co_name,
                               err,
@@ -0,0 +1,206 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Union
+from logging import Logger as Log
+
+from _common import _common as _common_
+
+
+__DEFAULT_POLL_SECONDS__ = 60
+__DEFAULT_MAX_REPAIRS__ = 3
+
+# phases of a monitored job
+__WAITING__ = "waiting"
+__RUNNING__ = "running"
+__REPAIRING__ = "repairing"
+__SUCCEEDED__ = "succeeded"
+__FAILED__ = "failed"
+__NOT_FOUND__ = "not_found"
+__FINAL_PHASES__ = (__SUCCEEDED__, __FAILED__, __NOT_FOUND__)
+
+
+@dataclass
+class MonitoredJob:
+    name: str
+    job_id: int = None
+    run_id: int = None
+    phase: str = __WAITING__
+    state: str = ""
+    result_state: str = ""
+    repairs: int = 0
+    changed_at: float = 0.0
+    message: str = ""
+
+
+def _value(enum_value) -> str:
+    return "" if enum_value is None else getattr(enum_value, "value", str(enum_value))
+
+
+class FleetMonitor:
+    def __init__(self,
+                 directive,
+                 jobs: Iterable[Union[str, int]],
+                 max_repairs: int = __DEFAULT_MAX_REPAIRS__,
+                 start_missing: bool = False,
+                 logger: Log = None):
+        """ watches many databricks workflow jobs from one loop. job names are resolved to ids once, every poll tick
+            lists the active runs of the workspace in one paged call and only a run which left the active list is
+            fetched on its own. a run ending in INTERNAL_ERROR is repaired up to max_repairs times
+
+        Args:
+            directive: DirectiveDatabricks_SDK object
+            jobs: job names or job ids
+            max_repairs: repairs of a job before it is reported as failed
+            start_missing: run a job which has no run yet
+            logger: logger object
+        """
+        self._directive = directive
+        self._client = directive.client
+        self.max_repairs = max_repairs
+        self.start_missing = start_missing
+        self.logger = logger
+        self.api_calls = 0
+        self.ticks = 0
+        self.jobs: Dict[int, MonitoredJob] = {}
+        self.unresolved: List[MonitoredJob] = []
+        self._resolve(list(jobs))
+
+    def _resolve(self, jobs: List[Union[str, int]]) -> None:
+        """ one pass over the jobs of the workspace resolves every name """
+        _names = {str(each_job) for each_job in jobs if not str(each_job).isdigit()}
+        _job_ids: Dict[str, List[int]] = {}
+        if _names:
+            self.api_calls += 1
+            for _each_job in self._client.jobs.list():
+                if (_name := getattr(_each_job.settings, "name", None)) in _names:
+                    _job_ids.setdefault(_name, []).append(_each_job.job_id)
+
+        for _each_job in jobs:
+            if str(_each_job).isdigit():
+                self.jobs[int(_each_job)] = MonitoredJob(name=str(_each_job), job_id=int(_each_job))
+            elif len(_ids := _job_ids.get(str(_each_job), [])) == 1:
+                self.jobs[_ids[0]] = MonitoredJob(name=str(_each_job), job_id=_ids[0])
+            else:
+                self.unresolved.append(MonitoredJob(name=str(_each_job), phase=__NOT_FOUND__,
+                                                    message=f"{len(_ids)} jobs with this name"))
+
+    def _change(self, job: MonitoredJob, phase: str, message: str = "") -> None:
+        if job.phase != phase:
+            _common_.info_logger(f"{job.name} ({job.job_id}): {job.phase} -> {phase} {message}", logger=self.logger)
+            job.changed_at = time.time()
+        job.phase = phase
+        job.message = message
+
+    def _active_runs(self) -> Dict[int, object]:
+        """ latest active run of every job, one paged call for the whole workspace """
+        self.api_calls += 1
+        _runs = {}
+        for _each_run in self._client.jobs.list_runs(active_only=True):
+            if _each_run.job_id in self.jobs and (_each_run.job_id not in _runs or
+                                                  (_each_run.start_time or 0) > (_runs[_each_run.job_id].start_time or 0)):
+                _runs[_each_run.job_id] = _each_run
+        return _runs
+
+    def _latest_run(self, job_id: int):
+        self.api_calls += 1
+        return next(iter(self._client.jobs.list_runs(job_id=job_id, limit=1)), None)
+
+    def _finished(self, job: MonitoredJob, run) -> None:
+        """ a run which is not active anymore: repaired on an internal error, otherwise final """
+        job.state = _value(run.state.life_cycle_state)
+        job.result_state = _value(run.state.result_state)
+        if job.phase == __REPAIRING__ and (getattr(run, "end_time", None) or 0) / 1000 <= job.changed_at:
+            # the state of the run before the repair, the repair has not started yet
+            return
+        if job.state == "INTERNAL_ERROR":
+            self._repair(job)
+        elif job.state in ("TERMINATED", "SKIPPED"):
+            self._change(job, __SUCCEEDED__ if job.result_state == "SUCCESS" else __FAILED__, job.result_state)
+        else:
+            # repaired or started, not in the active runs yet
+            self._change(job, __RUNNING__)
+
+    def _repair(self, job: MonitoredJob) -> None:
+        if job.repairs >= self.max_repairs:
+            self._change(job, __FAILED__, f"internal error after {job.repairs} repairs")
+            return
+        job.repairs += 1
+        self.api_calls += 1
+        _return_code, _error_message = self._directive.job_repair_now_job_id(job_run_id=job.run_id)
+        if _return_code:
+            self._change(job, __REPAIRING__, f"repair {job.repairs} of run {job.run_id}")
+        elif "Number of tasks changed" in str(_error_message):
+            self._start(job)
+        else:
+            self._change(job, __FAILED__, f"repair failed: {_error_message}")
+
+    def _start(self, job: MonitoredJob) -> None:
+        self.api_calls += 1
+        _run = self._directive.job_run_now_job_id(job_id=job.job_id)
+        job.run_id = getattr(_run, "run_id", None) or job.run_id
+        self._change(job, __REPAIRING__ if job.repairs else __WAITING__, f"started run {job.run_id}")
+
+    def start(self) -> None:
+        """ state of each job before the first tick from its latest run, the only calls made for each job """
+        _active = self._active_runs()
+        for _job_id, _job in self.jobs.items():
+            if _run := _active.get(_job_id):
+                _job.run_id = _run.run_id
+                _job.state = _value(_run.state.life_cycle_state)
+                self._change(_job, __RUNNING__)
+            elif _run := self._latest_run(_job_id):
+                _job.run_id = _run.run_id
+                self._finished(_job, _run)
+            elif self.start_missing:
+                self._start(_job)
+            else:
+                self._change(_job, __NOT_FOUND__, "no run")
+
+    def tick(self) -> None:
+        self.ticks += 1
+        _active = self._active_runs()
+        for _job_id, _job in self.jobs.items():
+            if _job.phase in __FINAL_PHASES__:
+                continue
+            if _run := _active.get(_job_id):
+                _job.run_id = _run.run_id
+                _job.state = _value(_run.state.life_cycle_state)
+                self._change(_job, __RUNNING__)
+            elif _job.run_id is not None:
+                self.api_calls += 1
+                self._finished(_job, self._client.jobs.get_run(run_id=_job.run_id))
+
+    @property
+    def done(self) -> bool:
+        return all(each_job.phase in __FINAL_PHASES__ for each_job in self.jobs.values())
+
+    def run(self, poll_seconds: float = __DEFAULT_POLL_SECONDS__, max_seconds: float = None) -> Dict[str, MonitoredJob]:
+        """ poll until every job succeeded or failed, returns the final state of each job by name """
+        _start = time.monotonic()
+        self.start()
+        _common_.info_logger(self.status_table(), logger=self.logger)
+        while not self.done:
+            if max_seconds is not None and time.monotonic() - _start > max_seconds:
+                _common_.info_logger(f"stop monitoring after {max_seconds} seconds", logger=self.logger)
+                break
+            time.sleep(poll_seconds)
+            _phases = [each_job.phase for each_job in self.jobs.values()]
+            self.tick()
+            if _phases != [each_job.phase for each_job in self.jobs.values()]:
+                _common_.info_logger(self.status_table(), logger=self.logger)
+        _common_.info_logger(self.status_table(), logger=self.logger)
+        return {each_job.name: each_job for each_job in list(self.jobs.values()) + self.unresolved}
+
+    def status_table(self) -> str:
+        _jobs = list(self.jobs.values()) + self.unresolved
+        _counts = {}
+        for _each_job in _jobs:
+            _counts[_each_job.phase] = _counts.get(_each_job.phase, 0) + 1
+        _lines = [f"{len(_jobs)} jobs: " + ", ".join(f"{each_count} {each_phase}" for each_phase, each_count in sorted(_counts.items()))
+                  + f" ({self.ticks} ticks, {self.api_calls} api calls)",
+                  f"  {'phase':<10} {'state':<15} {'repairs':>7} {'run id':>18}  job"]
+        for _each_job in sorted(_jobs, key=lambda job: (job.phase in __FINAL_PHASES__, job.phase, job.name)):
+            _lines.append(f"  {_each_job.phase:<10} {_each_job.state:<15} {_each_job.repairs:>7} "
+                          f"{'' if _each_job.run_id is None else _each_job.run_id:>18}  {_each_job.name}"
+                          f"{'  ' + _each_job.message if _each_job.message else ''}")
+        return "\n".join(_lines)
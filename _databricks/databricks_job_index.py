@@ -0,0 +1,270 @@
+import os
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from logging import Logger as Log
+
+from _common import _common as _common_
+
+
+__DEFAULT_JOB_INDEX_LOC__ = "~/.deat/databricks_job_index.sqlite"
+# the job list is read again once the index is older than this
+__DEFAULT_TTL_SECONDS__ = 60 * 60
+__DEFAULT_MAX_WORKERS__ = 8
+
+_SCHEMA_ = """
+CREATE TABLE IF NOT EXISTS jobs (
+    host TEXT NOT NULL,
+    job_id INTEGER NOT NULL,
+    name TEXT,
+    creator TEXT,
+    created_time INTEGER,
+    effective_budget_policy_id TEXT,
+    tasks_indexed_at REAL,
+    PRIMARY KEY (host, job_id)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    host TEXT NOT NULL,
+    job_id INTEGER NOT NULL,
+    task_key TEXT NOT NULL,
+    notebook_path TEXT,
+    python_file TEXT,
+    PRIMARY KEY (host, job_id, task_key)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    host TEXT PRIMARY KEY,
+    created_time INTEGER,
+    refreshed_at REAL,
+    full_refreshed_at REAL
+);
+"""
+
+
+class JobIndex:
+    def __init__(self,
+                 client,
+                 host: str,
+                 db_filepath: str = __DEFAULT_JOB_INDEX_LOC__,
+                 ttl_seconds: float = __DEFAULT_TTL_SECONDS__,
+                 max_workers: int = __DEFAULT_MAX_WORKERS__,
+                 logger: Log = None):
+        """ local index of the jobs of a workspace: name, creator, tasks and their notebook paths. lookups are
+            answered from memory, the index is refreshed once it is older than ttl_seconds. a refresh is one paged
+            pass over the jobs with their tasks, only a job with more tasks than the listing returns is read on its
+            own. a job missing from the index is looked up on its own
+
+        Args:
+            client: databricks WorkspaceClient
+            host: workspace host, one file holds the index of many workspaces
+            db_filepath: sqlite file, :memory: keeps the index in process
+            ttl_seconds: age of the index before the next lookup refreshes it
+            max_workers: number of jobs whose tasks are read concurrently
+            logger: logger object
+        """
+        self._client = client
+        self.host = host or ""
+        self.ttl_seconds = ttl_seconds
+        self.max_workers = max_workers
+        self.logger = logger
+        self.api_calls = 0
+        self.db_filepath = db_filepath if db_filepath == ":memory:" else os.path.expanduser(db_filepath)
+        if self.db_filepath != ":memory:" and (_dirpath := os.path.dirname(self.db_filepath)):
+            os.makedirs(_dirpath, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_filepath, check_same_thread=False, isolation_level=None)
+        if self.db_filepath != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA_)
+        self._maps = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _watermark(self):
+        return self._conn.execute("SELECT created_time, refreshed_at, full_refreshed_at FROM watermarks WHERE host = ?",
+                                  (self.host,)).fetchone() or (None, None, None)
+
+    @property
+    def refreshed_at(self) -> Optional[float]:
+        with self._lock:
+            return self._watermark()[1]
+
+    @staticmethod
+    def _job_row(job) -> tuple:
+        return (job.job_id,
+                getattr(job.settings, "name", None) if job.settings else None,
+                job.creator_user_name,
+                job.created_time,
+                getattr(job, "effective_budget_policy_id", None))
+
+    @staticmethod
+    def _task_rows(job) -> List[tuple]:
+        return [(each_task.task_key,
+                 each_task.notebook_task.notebook_path if getattr(each_task, "notebook_task", None) else None,
+                 each_task.spark_python_task.python_file if getattr(each_task, "spark_python_task", None) else None)
+                for each_task in ((job.settings.tasks if job.settings else None) or [])]
+
+    def _write(self, jobs: Iterable, with_tasks: bool) -> None:
+        _now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for _each_job in jobs:
+                    _row = self._job_row(_each_job)
+                    self._conn.execute("INSERT INTO jobs (host, job_id, name, creator, created_time, effective_budget_policy_id) "
+                                       "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (host, job_id) DO UPDATE SET name = excluded.name, "
+                                       "creator = excluded.creator, created_time = excluded.created_time, "
+                                       "effective_budget_policy_id = excluded.effective_budget_policy_id",
+                                       (self.host, *_row))
+                    if with_tasks:
+                        self._conn.execute("DELETE FROM tasks WHERE host = ? AND job_id = ?", (self.host, _each_job.job_id))
+                        self._conn.executemany("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?, ?, ?)",
+                                               [(self.host, _each_job.job_id, *each_task) for each_task in self._task_rows(_each_job)])
+                        self._conn.execute("UPDATE jobs SET tasks_indexed_at = ? WHERE host = ? AND job_id = ?",
+                                           (_now, self.host, _each_job.job_id))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._maps = None
+
+    def refresh(self, full: bool = False) -> int:
+        """ bring the index up to date with the workspace, the tasks of every job are read again so a changed
+            notebook task is not served from the index past ttl_seconds. full only records the refresh as a full one
+
+        Returns: number of jobs whose tasks were read
+
+        """
+        _start = time.time()
+        with self._lock:
+            _watermark, _, _ = self._watermark()
+            _indexed = dict(self._conn.execute("SELECT job_id, tasks_indexed_at FROM jobs WHERE host = ?", (self.host,)).fetchall())
+        full = full or not _indexed
+
+        # one paged pass over the job list with the tasks of every job, the listing returns the first 100 tasks of a
+        # job and the jobs with more are read on their own
+        self.api_calls += 1
+        _jobs = list(self._client.jobs.list(expand_tasks=True))
+        _stale = [each_job for each_job in _jobs if getattr(each_job, "has_more", False)]
+        if _stale:
+            self.api_calls += len(_stale)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                _complete = {each_job.job_id: each_job for each_job in executor.map(lambda job: self._client.jobs.get(job.job_id), _stale)}
+            _jobs = [_complete.get(each_job.job_id, each_job) for each_job in _jobs]
+        self._write(_jobs, with_tasks=True)
+
+        _seen = {each_job.job_id for each_job in _jobs}
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for _each_job_id in set(_indexed) - _seen:
+                    # deleted from the workspace
+                    self._conn.execute("DELETE FROM jobs WHERE host = ? AND job_id = ?", (self.host, _each_job_id))
+                    self._conn.execute("DELETE FROM tasks WHERE host = ? AND job_id = ?", (self.host, _each_job_id))
+                _created_time = max([each_job.created_time or 0 for each_job in _jobs] + [_watermark or 0])
+                self._conn.execute("INSERT INTO watermarks VALUES (?, ?, ?, ?) ON CONFLICT (host) DO UPDATE SET "
+                                   "created_time = excluded.created_time, refreshed_at = excluded.refreshed_at, "
+                                   "full_refreshed_at = COALESCE(excluded.full_refreshed_at, watermarks.full_refreshed_at)",
+                                   (self.host, _created_time, _start, _start if full else None))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._maps = None
+
+        _common_.info_logger(f"job index of {self.host} refreshed{' in full' if full else ''}: {len(_jobs)} jobs, "
+                             f"{len(_stale)} read on their own, {len(set(_indexed) - _seen)} deleted in "
+                             f"{time.time() - _start:.1f} seconds", logger=self.logger)
+        return len(_jobs)
+
+    def invalidate(self) -> None:
+        """ the next lookup refreshes the index """
+        with self._lock:
+            self._conn.execute("UPDATE watermarks SET refreshed_at = NULL WHERE host = ?", (self.host,))
+
+    def ensure_fresh(self) -> None:
+        _refreshed_at = self.refreshed_at
+        if _refreshed_at is None or time.time() - _refreshed_at > self.ttl_seconds:
+            self.refresh()
+
+    def _load(self) -> Dict[str, Dict]:
+        """ lookup maps of the index, built once after each change """
+        with self._lock:
+            if self._maps is not None:
+                return self._maps
+            _maps = {"jobs": {}, "by_name": {}, "by_creator": {}, "tasks": {}, "by_notebook_path": {}}
+            for _job_id, _name, _creator, _created_time, _policy_id in self._conn.execute(
+                    "SELECT job_id, name, creator, created_time, effective_budget_policy_id FROM jobs WHERE host = ? "
+                    "ORDER BY job_id", (self.host,)):
+                _maps["jobs"][_job_id] = {"job_id": _job_id, "name": _name, "username": _creator,
+                                          "created_time": _created_time, "effective_budget_policy_id": _policy_id}
+                _maps["by_name"].setdefault(_name, []).append(_job_id)
+                _maps["by_creator"].setdefault(_creator, []).append(_job_id)
+            for _job_id, _task_key, _notebook_path, _python_file in self._conn.execute(
+                    "SELECT job_id, task_key, notebook_path, python_file FROM tasks WHERE host = ? ORDER BY job_id, task_key",
+                    (self.host,)):
+                _maps["tasks"].setdefault(_job_id, []).append({"task_key": _task_key, "notebook_path": _notebook_path,
+                                                               "python_file": _python_file})
+                if _notebook_path:
+                    _maps["by_notebook_path"].setdefault(_notebook_path, []).append(_job_id)
+            self._maps = _maps
+            return _maps
+
+    def job_ids(self, name: str) -> List[int]:
+        """ ids of the jobs with this name, a name not in the index is looked up in the workspace """
+        self.ensure_fresh()
+        if (_job_ids := self._load()["by_name"].get(name)) is None:
+            self.api_calls += 1
+            self._write(list(self._client.jobs.list(name=name, expand_tasks=True)), with_tasks=True)
+            _job_ids = self._load()["by_name"].get(name)
+        return list(_job_ids or [])
+
+    def job(self, job_id: int) -> Optional[Dict]:
+        self.ensure_fresh()
+        return self._load()["jobs"].get(int(job_id))
+
+    def jobs_by_creator(self, username: str) -> List[Dict]:
+        self.ensure_fresh()
+        _maps = self._load()
+        return [_maps["jobs"][each_job_id] for each_job_id in _maps["by_creator"].get(username, [])]
+
+    def tasks(self, job_id: int) -> List[Dict]:
+        """ tasks of a job, a job not in the index is read from the workspace """
+        self.ensure_fresh()
+        if (_tasks := self._load()["tasks"].get(int(job_id))) is None and int(job_id) not in self._load()["jobs"]:
+            self.api_calls += 1
+            self._write([self._client.jobs.get(int(job_id))], with_tasks=True)
+            _tasks = self._load()["tasks"].get(int(job_id))
+        return list(_tasks or [])
+
+    def notebook_path(self, job_id: int, fresh: bool = False) -> Optional[str]:
+        """ notebook of the first notebook task of a job, fresh reads the job from the workspace first: a notebook
+            about to be edited is never resolved from an index older than the job """
+        if fresh:
+            self.api_calls += 1
+            self._write([self._client.jobs.get(int(job_id))], with_tasks=True)
+        return next((each_task["notebook_path"] for each_task in self.tasks(job_id) if each_task["notebook_path"]), None)
+
+    def jobs_by_notebook_path(self, notebook_path: str) -> List[int]:
+        self.ensure_fresh()
+        return list(self._load()["by_notebook_path"].get(notebook_path, []))
+
+    def summary(self) -> str:
+        with self._lock:
+            _created_time, _refreshed_at, _full_refreshed_at = self._watermark()
+        _maps = self._load()
+        _format = lambda value: "never" if value is None else time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value))
+        return (f"job index of {self.host}: {len(_maps['jobs'])} jobs, {sum(map(len, _maps['tasks'].values()))} tasks, "
+                f"{len(_maps['by_notebook_path'])} notebooks, refreshed {_format(_refreshed_at)}, "
+                f"full refresh {_format(_full_refreshed_at)}")
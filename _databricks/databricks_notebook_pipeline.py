@@ -0,0 +1,164 @@
+import re
+import time
+import hashlib
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Tuple
+from logging import Logger as Log
+
+from _common import _common as _common_
+from _engine import _admission as _admission_
+
+
+__DEFAULT_MAX_WORKERS__ = 8
+# workspace api calls allowed per period, export and upload both count
+__DEFAULT_RATE__ = (30.0, 1.0)
+__WORKSPACE_API__ = "workspace_api"
+
+__UPDATED__ = "updated"
+__UNCHANGED__ = "unchanged"
+__WOULD_UPDATE__ = "would_update"
+__FAILED__ = "failed"
+
+
+@dataclass
+class Transform:
+    """ a search and replace applied to the content of every notebook, search is a regular expression when regex is
+        on. a notebook with more than max_distinct_matches different matches is left unchanged and reported as failed,
+        max_distinct_matches=1 replaces the date of a notebook only if it has one date
+    """
+    search: str
+    replace: str
+    regex: bool = False
+    max_distinct_matches: int = None
+
+    def apply(self, content: str) -> Tuple[str, int]:
+        _pattern = re.compile(self.search if self.regex else re.escape(self.search))
+        if self.max_distinct_matches is not None and \
+                len(_matches := set(_pattern.findall(content))) > self.max_distinct_matches:
+            raise ValueError(f"{len(_matches)} different matches of {self.search}, expecting at most "
+                             f"{self.max_distinct_matches}: {', '.join(sorted(map(str, _matches))[:5])}")
+        if self.regex:
+            return _pattern.subn(self.replace, content)
+        return content.replace(self.search, self.replace), content.count(self.search)
+
+
+@dataclass
+class NotebookResult:
+    path: str
+    status: str = ""
+    replacements: int = 0
+    old_hash: str = ""
+    new_hash: str = ""
+    error: str = ""
+    seconds: float = 0.0
+
+
+@dataclass
+class PipelineReport:
+    results: List[NotebookResult] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def by_status(self, status: str) -> List[NotebookResult]:
+        return [each_result for each_result in self.results if each_result.status == status]
+
+    def summary(self) -> str:
+        _counts = {}
+        for _each_result in self.results:
+            _counts[_each_result.status] = _counts.get(_each_result.status, 0) + 1
+        return (f"{len(self.results)} notebooks in {self.seconds:.1f} seconds: "
+                + ", ".join(f"{each_count} {each_status}" for each_status, each_count in sorted(_counts.items())))
+
+    def table(self) -> str:
+        _lines = [f"  {'status':<13} {'changes':>7} {'seconds':>7}  notebook"]
+        for _each_result in sorted(self.results, key=lambda result: (result.status, result.path)):
+            _lines.append(f"  {_each_result.status:<13} {_each_result.replacements:>7} {_each_result.seconds:>7.1f}  "
+                          f"{_each_result.path}{'  ' + _each_result.error if _each_result.error else ''}")
+        return "\n".join(_lines)
+
+    def to_dict(self) -> Dict:
+        return {"seconds": self.seconds, "results": [asdict(each_result) for each_result in self.results]}
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+class NotebookPipeline:
+    def __init__(self,
+                 client,
+                 transforms: List[Transform],
+                 max_workers: int = __DEFAULT_MAX_WORKERS__,
+                 rate: Tuple[float, float] = __DEFAULT_RATE__,
+                 dry_run: bool = False,
+                 logger: Log = None):
+        """ edits many workspace notebooks concurrently: each notebook is exported, the transforms are applied in
+            memory and the notebook is uploaded again only when its content hash changed. the workspace api calls of
+            all workers share one rate limit
+
+        Args:
+            client: databricks WorkspaceClient
+            transforms: search and replace applied in order
+            max_workers: number of notebooks processed concurrently
+            rate: (calls, seconds) allowed against the workspace api
+            dry_run: report the notebooks which would change without uploading them
+            logger: logger object
+        """
+        self._client = client
+        self.transforms = transforms
+        self.max_workers = max(1, max_workers)
+        self.dry_run = dry_run
+        self.logger = logger
+        self._admission = _admission_.AdmissionController(rates={__WORKSPACE_API__: rate}, logger=logger)
+
+    def _throttle(self) -> None:
+        while (_delay := self._admission.try_acquire({__WORKSPACE_API__: 1})) > 0:
+            time.sleep(_delay)
+
+    def export(self, path: str) -> bytes:
+        self._throttle()
+        return b64decode(self._client.workspace.export(path=path).content)
+
+    def upload(self, path: str, content: bytes) -> None:
+        self._throttle()
+        self._client.workspace.upload(path, content=content, overwrite=True)
+
+    def transform(self, content: str) -> Tuple[str, int]:
+        _replacements = 0
+        for _each_transform in self.transforms:
+            content, _count = _each_transform.apply(content)
+            _replacements += _count
+        return content, _replacements
+
+    def process(self, path: str) -> NotebookResult:
+        result = NotebookResult(path=path)
+        _start = time.perf_counter()
+        try:
+            _content = self.export(path)
+            result.old_hash = content_hash(_content)
+            _text, result.replacements = self.transform(_content.decode("utf-8"))
+            _new_content = _text.encode("utf-8")
+            result.new_hash = content_hash(_new_content)
+            if result.new_hash == result.old_hash:
+                result.status = __UNCHANGED__
+            elif self.dry_run:
+                result.status = __WOULD_UPDATE__
+            else:
+                self.upload(path, _new_content)
+                result.status = __UPDATED__
+        except Exception as err:
+            result.status = __FAILED__
+            result.error = str(err).splitlines()[0] if str(err) else type(err).__name__
+        result.seconds = time.perf_counter() - _start
+        _common_.info_logger(f"{path}: {result.status} {result.error}", logger=self.logger)
+        return result
+
+    def run(self, paths: List[str]) -> PipelineReport:
+        report = PipelineReport()
+        _start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            report.results = list(executor.map(self.process, list(dict.fromkeys(paths))))
+        report.seconds = time.perf_counter() - _start
+        _common_.info_logger(report.summary(), logger=self.logger)
+        return report
@@ -0,0 +1,185 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterator, Tuple
+from logging import Logger as Log
+
+import pyarrow as pa
+import requests
+from _common import _common as _common_
+
+
+__DEFAULT_MAX_WORKERS__ = 4
+__DEFAULT_PREFETCH_CHUNKS__ = 8
+__DOWNLOAD_RETRIES__ = 3
+# (connect, read) seconds of a chunk download, a stalled download is retried instead of holding a worker
+__DOWNLOAD_TIMEOUT__ = (10, 300)
+# a link expiring sooner than this is requested again before the download
+__LINK_EXPIRY_MARGIN_SECONDS__ = 30
+
+
+@dataclass
+class ResultStats:
+    chunks: int = 0
+    rows: int = 0
+    bytes_downloaded: int = 0
+    link_requests: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+
+def _expires_soon(link) -> bool:
+    if not (_expiration := getattr(link, "expiration", None)):
+        return False
+    try:
+        _expires_at = datetime.fromisoformat(_expiration.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    return (_expires_at - datetime.now(timezone.utc)).total_seconds() < __LINK_EXPIRY_MARGIN_SECONDS__
+
+
+class StatementResult:
+    def __init__(self,
+                 client,
+                 response,
+                 max_workers: int = __DEFAULT_MAX_WORKERS__,
+                 prefetch_chunks: int = __DEFAULT_PREFETCH_CHUNKS__,
+                 session: requests.Session = None,
+                 timeout: Tuple[float, float] = __DOWNLOAD_TIMEOUT__,
+                 logger: Log = None):
+        """ result of a statement executed with the ARROW_STREAM format and the EXTERNAL_LINKS disposition. the
+            chunks are downloaded concurrently from their presigned links and handed out in order as arrow record
+            batches, at most prefetch_chunks chunks are held in memory whatever the size of the result
+
+        Args:
+            client: databricks WorkspaceClient
+            response: StatementResponse of the succeeded statement
+            max_workers: number of concurrent chunk downloads
+            prefetch_chunks: number of chunks downloaded ahead of the one being read
+            session: requests session used for the downloads, used as is. by default a session with a connection
+                     pool of max_workers connections is created
+            timeout: (connect, read) timeout in seconds of each chunk download
+            logger: logger object
+        """
+        self._client = client
+        self.statement_id = response.statement_id
+        self.manifest = response.manifest
+        self.max_workers = max(1, max_workers)
+        self.prefetch_chunks = max(self.max_workers, prefetch_chunks)
+        self.logger = logger
+        self.stats = ResultStats()
+
+        self.timeout = timeout
+        if (_session := session) is None:
+            _session = requests.Session()
+            _adapter = requests.adapters.HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+            _session.mount("https://", _adapter)
+            _session.mount("http://", _adapter)
+        self._session = _session
+        self._links: Dict[int, object] = {}
+        self._lock = threading.Lock()
+        self._cache_links(getattr(response, "result", None))
+
+    @property
+    def total_chunk_count(self) -> int:
+        return int(getattr(self.manifest, "total_chunk_count", None) or 0)
+
+    @property
+    def total_row_count(self) -> int:
+        return int(getattr(self.manifest, "total_row_count", None) or 0)
+
+    @property
+    def truncated(self) -> bool:
+        return bool(getattr(self.manifest, "truncated", False))
+
+    def _cache_links(self, result_data) -> None:
+        with self._lock:
+            for _each_link in (getattr(result_data, "external_links", None) or []):
+                self._links[_each_link.chunk_index] = _each_link
+
+    def _link(self, chunk_index: int, refresh: bool = False):
+        """ presigned link of a chunk, requested from the statement api when not known yet or about to expire """
+        with self._lock:
+            _link = None if refresh else self._links.pop(chunk_index, None)
+        if _link is None or _expires_soon(_link):
+            self._cache_links(self._client.statement_execution.get_statement_result_chunk_n(self.statement_id, chunk_index))
+            with self._lock:
+                self.stats.link_requests += 1
+                _link = self._links.pop(chunk_index)
+        return _link
+
+    def _download(self, chunk_index: int) -> pa.Table:
+        _refresh = False
+        _response, _error = None, None
+        for _each_attempt in range(__DOWNLOAD_RETRIES__):
+            _link = self._link(chunk_index, refresh=_refresh)
+            try:
+                # presigned cloud storage url, the databricks credentials must not be sent along
+                _response = self._session.get(_link.external_link, headers=getattr(_link, "http_headers", None) or {},
+                                              timeout=self.timeout)
+                if _response.status_code == 200:
+                    with self._lock:
+                        self.stats.bytes_downloaded += len(_response.content)
+                    return pa.ipc.open_stream(_response.content).read_all()
+                _error = f"http {_response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as err:
+                _response, _error = None, err
+            # 403 once the link expired, any failure gets a new link
+            _common_.info_logger(f"chunk {chunk_index} of statement {self.statement_id}: {_error}, retrying", logger=self.logger)
+            with self._lock:
+                self.stats.retries += 1
+            _refresh = True
+            time.sleep(2 ** _each_attempt)
+        if _response is not None:
+            _response.raise_for_status()
+        raise requests.HTTPError(f"chunk {chunk_index} of statement {self.statement_id}: {_error}")
+
+    def record_batches(self) -> Iterator[pa.RecordBatch]:
+        """ record batches of the whole result in order """
+        _start = time.perf_counter()
+        _pending: Deque[Tuple[int, Future]] = deque()
+        _next_chunk = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                while _next_chunk < self.total_chunk_count or _pending:
+                    while _next_chunk < self.total_chunk_count and len(_pending) < self.prefetch_chunks:
+                        _pending.append((_next_chunk, executor.submit(self._download, _next_chunk)))
+                        _next_chunk += 1
+                    _chunk_index, _future = _pending.popleft()
+                    _table = _future.result()
+                    self.stats.chunks += 1
+                    self.stats.rows += _table.num_rows
+                    yield from _table.to_batches()
+                    del _table
+            finally:
+                # a reader which stops early does not wait for the chunks it will not read
+                for _, _each_future in _pending:
+                    _each_future.cancel()
+                self.stats.seconds = time.perf_counter() - _start
+
+    def __iter__(self) -> Iterator[pa.RecordBatch]:
+        return self.record_batches()
+
+    def to_arrow(self) -> pa.Table:
+        _batches = list(self.record_batches())
+        return pa.Table.from_batches(_batches) if _batches else pa.table({})
+
+    def to_pandas(self):
+        return self.to_arrow().to_pandas()
+
+    def to_polars(self):
+        import polars
+        return polars.from_arrow(self.to_arrow())
+
+    def pandas_batches(self) -> Iterator:
+        """ the result as a sequence of pandas dataframes, one per record batch, to process it in bounded memory """
+        for _each_batch in self.record_batches():
+            yield _each_batch.to_pandas()
+
+    def summary(self) -> str:
+        return (f"statement {self.statement_id}: {self.stats.rows} rows in {self.stats.chunks} chunks, "
+                f"{self.stats.bytes_downloaded / 1024 / 1024:.1f} MB in {self.stats.seconds:.2f} seconds, "
+                f"{self.stats.link_requests} link requests, {self.stats.retries} retries")
@@ -0,0 +1,246 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import Any, Dict, List, Tuple
+from logging import Logger as Log
+
+from _common import _common as _common_
+
+
+__DEFAULT_INITIAL_SECONDS__ = 1.0
+__DEFAULT_FACTOR__ = 2.0
+__DEFAULT_MAXIMUM_SECONDS__ = 60.0
+# once the duration of an operation is known it is polled about ten times while it runs
+__DEFAULT_FRACTION__ = 0.1
+__DEFAULT_MAX_ERRORS__ = 3
+# the poller thread ends after being idle for this long and starts again with the next handle
+__IDLE_SECONDS__ = 30.0
+
+__STATEMENT_DONE_STATES__ = ("SUCCEEDED", "FAILED", "CANCELED", "CLOSED")
+__RUN_DONE_STATES__ = ("TERMINATED", "SKIPPED", "INTERNAL_ERROR")
+
+
+class BackoffPolicy:
+    def __init__(self,
+                 initial: float = __DEFAULT_INITIAL_SECONDS__,
+                 factor: float = __DEFAULT_FACTOR__,
+                 maximum: float = __DEFAULT_MAXIMUM_SECONDS__,
+                 fraction: float = __DEFAULT_FRACTION__):
+        """ seconds between two polls of an operation, growing exponentially from initial up to a cap. the cap is
+            maximum until operations of the same kind have completed, then a fraction of their average duration:
+            a query of a few seconds is polled every second or two, a run of two hours every minute
+
+        Args:
+            initial: seconds before the first poll
+            factor: growth of the interval after each poll
+            maximum: largest interval
+            fraction: cap as a fraction of the observed duration
+        """
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.fraction = fraction
+        self._durations: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float) -> None:
+        with self._lock:
+            _average = self._durations.get(key)
+            self._durations[key] = seconds if _average is None else 0.7 * _average + 0.3 * seconds
+
+    def expected(self, key: str) -> float:
+        with self._lock:
+            return self._durations.get(key)
+
+    def delay(self, key: str, polls: int) -> float:
+        _cap = self.maximum
+        if (_expected := self.expected(key)) is not None:
+            _cap = min(self.maximum, max(self.initial, _expected * self.fraction))
+        # the exponent is bounded, a long operation polled many times would overflow the float
+        return min(_cap, self.initial * self.factor ** min(polls, 64))
+
+
+class CompletionHandle:
+    key = "operation"
+
+    def __init__(self, timeout: float = None, max_errors: int = __DEFAULT_MAX_ERRORS__):
+        """ an operation running remotely which completes some time later, polled by a CompletionPoller. future
+            is a concurrent.futures.Future, use future.result() or concurrent.futures.wait / as_completed on the
+            futures of many handles
+
+        Args:
+            timeout: seconds before the future fails with TimeoutError, no limit by default
+            max_errors: consecutive failed polls before the future fails with the last error
+        """
+        self.future = Future()
+        self.timeout = timeout
+        self.max_errors = max_errors
+        self.submitted_at = time.monotonic()
+        self.polls = 0
+        self.errors = 0
+
+    def check(self) -> Tuple[bool, Any]:
+        """ one status request, (True, result) once the operation completed """
+        raise NotImplementedError
+
+    def duration(self, result) -> float:
+        """ how long the operation ran, for the backoff policy """
+        return time.monotonic() - self.submitted_at
+
+    def result(self, timeout: float = None):
+        return self.future.result(timeout)
+
+
+class StatementHandle(CompletionHandle):
+    key = "statement"
+
+    def __init__(self, client, statement_id: str, **kwargs):
+        """ sql statement of the statement execution api, the result is the StatementResponse """
+        super().__init__(**kwargs)
+        self._client = client
+        self.statement_id = statement_id
+
+    def check(self) -> Tuple[bool, Any]:
+        _response = self._client.statement_execution.get_statement(self.statement_id)
+        return _response.status.state.value in __STATEMENT_DONE_STATES__, _response
+
+
+class RunHandle(CompletionHandle):
+    def __init__(self, client, run_id: int, job_id: int = None, **kwargs):
+        """ job run, the result is the Run once its life cycle state is final. runs of the same job share their
+            observed duration
+        """
+        super().__init__(**kwargs)
+        self._client = client
+        self.run_id = run_id
+        self.key = f"job:{job_id}" if job_id else "run"
+
+    def check(self) -> Tuple[bool, Any]:
+        _run = self._client.jobs.get_run(run_id=self.run_id)
+        if getattr(_run, "job_id", None):
+            self.key = f"job:{_run.job_id}"
+        return _run.state.life_cycle_state.value in __RUN_DONE_STATES__, _run
+
+    def duration(self, result) -> float:
+        if getattr(result, "start_time", None) and getattr(result, "end_time", None):
+            return (result.end_time - result.start_time) / 1000
+        return super().duration(result)
+
+
+class CompletionPoller:
+    def __init__(self, policy: BackoffPolicy = None, logger: Log = None):
+        """ polls every submitted handle from one background thread, each when its next poll is due, and completes
+            its future. the number of status requests depends on the durations, not on how many callers wait
+
+        Args:
+            policy: interval between two polls of a handle
+            logger: logger object
+        """
+        self.policy = policy or BackoffPolicy()
+        self.logger = logger
+        self._heap: List[Tuple[float, int, CompletionHandle]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, handle: CompletionHandle) -> Future:
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + self.policy.delay(handle.key, 0), next(self._sequence), handle))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="completion-poller", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return handle.future
+
+    def _schedule(self, handle: CompletionHandle) -> None:
+        _delay = self.policy.delay(handle.key, handle.polls)
+        if handle.timeout is not None:
+            _delay = min(_delay, max(0.0, handle.submitted_at + handle.timeout - time.monotonic()))
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + _delay, next(self._sequence), handle))
+
+    @staticmethod
+    def _complete(future: Future, result=None, error: BaseException = None) -> None:
+        # a caller may have cancelled the future in the meantime
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _next(self) -> CompletionHandle:
+        with self._condition:
+            while True:
+                if not self._heap:
+                    self._condition.wait(__IDLE_SECONDS__)
+                    if not self._heap:
+                        self._thread = None
+                        return None
+                    continue
+                _due, _, _handle = self._heap[0]
+                if (_wait := _due - time.monotonic()) > 0:
+                    self._condition.wait(_wait)
+                    continue
+                heapq.heappop(self._heap)
+                return _handle
+
+    def _poll(self, handle: CompletionHandle) -> None:
+        if handle.future.cancelled():
+            return
+        if handle.timeout is not None and time.monotonic() - handle.submitted_at >= handle.timeout:
+            self._complete(handle.future, error=TimeoutError(f"{handle.key} not completed after {handle.timeout} seconds"))
+            return
+        try:
+            _done, _result = handle.check()
+            handle.errors = 0
+        except Exception as err:
+            handle.errors += 1
+            _common_.info_logger(f"polling {handle.key} failed ({handle.errors} of {handle.max_errors}): {err}",
+                                 logger=self.logger)
+            if handle.errors >= handle.max_errors:
+                self._complete(handle.future, error=err)
+            else:
+                handle.polls += 1
+                self._schedule(handle)
+            return
+
+        handle.polls += 1
+        if _done:
+            self.policy.observe(handle.key, handle.duration(_result))
+            self._complete(handle.future, _result)
+        else:
+            self._schedule(handle)
+
+    def _run(self) -> None:
+        try:
+            while (handle := self._next()) is not None:
+                try:
+                    self._poll(handle)
+                except Exception as err:
+                    # an unexpected error fails the handle it came from, the other handles keep being polled
+                    _common_.info_logger(f"polling {handle.key} stopped: {err}", logger=self.logger)
+                    self._complete(handle.future, error=err)
+        finally:
+            with self._condition:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+                    # a handle submitted while the thread was ending gets a new thread
+                    if self._heap:
+                        self._thread = threading.Thread(target=self._run, name="completion-poller", daemon=True)
+                        self._thread.start()
+
+_POLLER = None
+_POLLER_LOCK = threading.Lock()
+
+
+def default_poller() -> CompletionPoller:
+    """ the poller shared in the process, the durations observed by one caller tune the polling of the others """
+    global _POLLER
+    with _POLLER_LOCK:
+        if _POLLER is None:
+            _POLLER = CompletionPoller()
+        return _POLLER
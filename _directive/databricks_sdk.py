@@ -329,8 +329,8 @@ class DirectiveDatabricks_SDK(metaclass=_meta_.MetaDirective):
 
 
     @_common_.exception_handler
-    def get_job_id_by_name(self, job_name: str, logger: Log = None, *arg, **kwargs) -> Iterator[BaseJob]:
-        """ list the databricks jobs by job_id
+    def get_job_id_by_name(self, job_name: str, logger: Log = None, *arg, **kwargs) -> List[int]:
+        """ list the databricks job ids by job name, from the job index
 
         Args:
              job_name: databricks workflow job name
@@ -339,11 +339,10 @@ class DirectiveDatabricks_SDK(metaclass=_meta_.MetaDirective):
              **kwargs:
 
         Returns:
-            yield a list catalogs
+            a list of job ids
 
         """
-        print([each_job.job_id for each_job in self.client.jobs.list(name=job_name)])
-        return [each_job.job_id for each_job in self.client.jobs.list(name=job_name)]
+        return self.job_index().job_ids(job_name)
 
     @_common_.exception_handler
     def job_run_now_job_id(self, job_id: int, logger: Log = None, *arg, **kwargs) -> Wait:
@@ -452,7 +451,7 @@ class DirectiveDatabricks_SDK(metaclass=_meta_.MetaDirective):
                 print(job_run_id, job_status)
                 if job_status == "RUNNING":
                     _common_.info_logger(f"job_id {job_id} is running, please wait...", logger=logger)
-                    sleep(_WAIT_TIME_INTERVAL_)
+                    self.run_future(job_run_id, job_id=job_id).result()
                 elif job_status == "INTERNAL_ERROR":
                     _common_.info_logger(f"job_id {job_id} is encountered internal error, starting retry...", logger=logger)
                     return_code, error_msg = self.job_repair_now_job_id(job_run_id=job_run_id)
@@ -484,8 +483,12 @@ class DirectiveDatabricks_SDK(metaclass=_meta_.MetaDirective):
             job_id, job_run_id, job_orginal_id, status, start_time = get_last_running_id(jobs[0])[0]
 
         if job_run_id == -1:
-            self.job_run_now_job_id(job_id=jobs[0])
-            sleep(_WAIT_TIME_INTERVAL_)
+            run_now = self.job_run_now_job_id(job_id=jobs[0])
+            if new_run_id := getattr(run_now, "run_id", None):
+                # the run shows up in the runs of the job once it started
+                self.run_future(new_run_id, job_id=jobs[0]).result()
+            else:
+                sleep(_WAIT_TIME_INTERVAL_)
         elif status == "INTERNAL_ERROR":
             try:
                 _common_.info_logger(f"job_id {jobs[0]} is encountered internal error, starting retry...",
@@ -506,6 +509,31 @@ class DirectiveDatabricks_SDK(metaclass=_meta_.MetaDirective):
         monitoring_job(f"{user_name}@tubi.tv", jobs[0])
         return True
 
+    def monitor_jobs(self,
+                     jobs: List[Union[str, int]],
+                     poll_seconds: float = 60,
+                     max_repairs: int = 3,
+                     start_missing: bool = False,
+                     max_seconds: float = None,
+                     logger: Log = None) -> Dict:
+        """ monitor many jobs by name or id from one loop and repair the runs hitting an internal error, the api
+            calls of each poll do not grow with the number of jobs
+
+        Args:
+            jobs: databricks workflow job names or job ids
+            poll_seconds: seconds between two polls
+            max_repairs: repairs of a job before giving up on it
+            start_missing: run a job which has no run yet
+            max_seconds: stop monitoring after this long
+            logger: logger object
+
+        Returns: the final MonitoredJob of each job by name
+
+        """
+        from _databricks import databricks_fleet_monitor as _fleet_monitor_
+        monitor = _fleet_monitor_.FleetMonitor(self, jobs, max_repairs=max_repairs, start_missing=start_missing, logger=logger)
+        return monitor.run(poll_seconds=poll_seconds, max_seconds=max_seconds)
+
     @_common_.exception_handler
     def list_runs(self,
                  user_name: str = "",
@@ -515,17 +543,26 @@ class DirectiveDatabricks_SDK(metaclass=_meta_.MetaDirective):
         return [(each_job.cluster_instance, each_job.job_id, each_job.run_id, each_job.status.state.value) for each_job in
                 self.client.jobs.list_runs() if user_name == "" or each_job.creator_user_name == user_name]
 
+    def job_index(self):
+        """ local index of the jobs of the workspace, DATABRICKS_JOB_INDEX_LOC (~/.deat/databricks_job_index.sqlite by
+            default), refreshed once older than DATABRICKS_JOB_INDEX_TTL seconds. databricks_job_index.py refreshes it
+        """
+        if getattr(self, "_job_index", None) is None:
+            from _databricks import databricks_job_index as _job_index_
+            self._job_index = _job_index_.JobIndex(self.client,
+                                                   self._config.config.get("DATABRICKS_HOST"),
+                                                   db_filepath=self._config.config.get("DATABRICKS_JOB_INDEX_LOC") or _job_index_.__DEFAULT_JOB_INDEX_LOC__,
+                                                   ttl_seconds=float(self._config.config.get("DATABRICKS_JOB_INDEX_TTL") or _job_index_.__DEFAULT_TTL_SECONDS__))
+        return self._job_index
+
     @_common_.exception_handler
-    def get_notebook_path_from_job_id(self, job_id: str) -> str:
-        job_details = self.client.jobs.get(job_id)
-        for each_task in job_details.settings.tasks:
-            if hasattr(each_task, "notebook_task"):
-                return each_task.notebook_task.notebook_path
+    def get_notebook_path_from_job_id(self, job_id: str, fresh: bool = False) -> str:
+        return self.job_index().notebook_path(job_id, fresh=fresh)
 
     @_common_.exception_handler
     def get_job_id_from_workflow_name(self, workflow_name: str) -> str:
-        workflow_list = list(self.client.jobs.list(name=workflow_name))
-        return workflow_list[0].job_id if len(workflow_list) > 0 else ""
+        job_ids = self.job_index().job_ids(workflow_name)
+        return job_ids[0] if len(job_ids) > 0 else ""
 
     @_common_.exception_handler
     def get_notebook_content_from_path(self, notebook_path: str) -> str:
@@ -568,47 +605,27 @@ class DirectiveDatabricks_SDK(metaclass=_meta_.MetaDirective):
                        max_timeout: int = 86400,
                        max_retries: int = 3) -> bool:
 
-        """ edit the notebook content by search and replace
+        """ wait for a job run to finish, polled with an interval adapted to the duration of the runs of its job
 
         Args:
-            notebook_path: notebook path
-            search_string: the string we are looking for
-            replace_string: the string we are replacing
+            run_id: databricks workflow job run id
+            max_timeout: seconds to wait at most
+            max_retries: consecutive failed status requests before giving up
 
-        # make sure there is an file extension for the notebook_path, w/o it, it would treat this as a directory
-        Returns: return true if successful
+        Returns: the result state of the run, None on time out
 
         """
-        start_time = datetime.timestamp(datetime.now())
-        retries = 0
-        from time import sleep
-        sleep(3)
-        print("AAAA")
-        print(datetime.timestamp(datetime.now()) - start_time)
-
-        while datetime.timestamp(datetime.now()) - start_time < max_timeout:
-            try:
-                run_status = self.client.jobs.get_run(run_id=run_id)
-
-                # print(run_status)
-                # exit(0)
-                job_state = run_status.state
-                _common_.info_logger(f"current status of job {run_id} is {job_state} ", logger=logger)
+        from concurrent.futures import TimeoutError as FutureTimeoutError
 
-                if job_state.life_cycle_state in ("TERMINATED", "SKIPPED", "INTERNAL_ERROR"):
-                    _common_.info_logger(f"run completed with final state: {job_state.result_state}", logger=logger)
-                    return job_state.result_state
-
-
-                sleep(__TIME_WAIT__)
-            except Exception as err:
-                retries += 1
-                if retries > max_retries:
-                    logger.error(f"Max retries exceeded: {max_retries}")
-                    raise err
-                sleep(__TIME_WAIT__)
-                _common_.info_logger(f"encounter {err}, retrying...", logger=logger)
-        _common_.info_logger(f"job run time out after {max_timeout}", logger=logger)
+        _common_.info_logger(f"waiting for job run {run_id}", logger=logger)
+        try:
+            run_status = self.run_future(run_id, timeout=max_timeout, max_errors=max_retries + 1).result()
+        except (TimeoutError, FutureTimeoutError):
+            _common_.info_logger(f"job run time out after {max_timeout}", logger=logger)
+            return None
+        job_state = run_status.state
+        _common_.info_logger(f"run completed with final state: {job_state.result_state}", logger=logger)
+        return job_state.result_state
 
     @_common_.exception_handler
     def update_note_book(self,
@@ -617,7 +634,7 @@ class DirectiveDatabricks_SDK(metaclass=_meta_.MetaDirective):
                          logger: Log = None):
 
         job_id = self.get_job_id_from_workflow_name(workflow_name)
-        notebook_path = self.get_notebook_path_from_job_id(job_id)
+        notebook_path = self.get_notebook_path_from_job_id(job_id, fresh=True)
         resource_content = self.get_notebook_content_from_path(notebook_path)
         regex_pattern = r"\d{4}-\d{2}-\d{2}"
         matches = re.findall(regex_pattern, resource_content)
@@ -632,59 +649,187 @@ class DirectiveDatabricks_SDK(metaclass=_meta_.MetaDirective):
                                           search_string=matches[0],
                                           replace_string=replace_string)
 
-    @_common_.exception_handler
-    @_common_.cache_result("my_job_id.json")
-    def get_jobs_by_username(self,
-                             username: str = "",
-                             logger: Log = None):
-        jobs = self.client.jobs.list()
-        user_jobs = []
-        for job in jobs:
-            if job.creator_user_name == username:
-                user_jobs.append({"username": job.creator_user_name,
-                                  "job_id": job.job_id,
-                                  "effective_budget_policy_id": job.effective_budget_policy_id})
-        return user_jobs
-
-    @_common_.exception_handler
-    def query(self, query_string: str, ignore_error_flg: bool=False, logger: Log = None):
-        """ execute sql in the databricks compute class and return the query result
+    def bulk_edit_notebooks(self,
+                            transforms: List,
+                            notebook_paths: List[str] = None,
+                            workflow_names: List[str] = None,
+                            max_workers: int = 8,
+                            rate: Tuple[float, float] = (30.0, 1.0),
+                            dry_run: bool = False,
+                            logger: Log = None):
+        """ apply search and replace transforms to many notebooks concurrently, only the notebooks whose content
+            changed are uploaded
 
         Args:
-            query_string: query string
-            ignore_error_flg: ignore error if it is on otherwise raise
+            transforms: databricks_notebook_pipeline.Transform applied in order
+            notebook_paths: workspace notebook paths
+            workflow_names: workflows whose notebook is edited, resolved through the job index
+            max_workers: number of notebooks processed concurrently
+            rate: (calls, seconds) allowed against the workspace api
+            dry_run: report the notebooks which would change without uploading them
             logger: logger object
 
-        Returns: query result in the pandas dataframe
+        Returns: PipelineReport with the result of each notebook
+
+        """
+        from _databricks import databricks_notebook_pipeline as _notebook_pipeline_
+
+        paths = list(notebook_paths or [])
+        unresolved = []
+        for each_workflow_name in workflow_names or []:
+            job_ids = self.job_index().job_ids(each_workflow_name)
+            if len(job_ids) == 1 and (notebook_path := self.job_index().notebook_path(job_ids[0], fresh=True)):
+                paths.append(notebook_path)
+            else:
+                unresolved.append(_notebook_pipeline_.NotebookResult(path=each_workflow_name,
+                                                                     status=_notebook_pipeline_.__FAILED__,
+                                                                     error=f"{len(job_ids)} jobs with this name"
+                                                                           if len(job_ids) != 1 else "no notebook task"))
+
+        pipeline = _notebook_pipeline_.NotebookPipeline(self.client, transforms, max_workers=max_workers, rate=rate,
+                                                        dry_run=dry_run, logger=logger)
+        report = pipeline.run(paths)
+        report.results += unresolved
+        return report
+
+    def update_note_books(self,
+                          workflow_names: List[str],
+                          replace_string: str,
+                          max_workers: int = 8,
+                          dry_run: bool = False,
+                          logger: Log = None):
+        """ update_note_book for many workflows, the date of the notebook of each workflow is replaced with
+            replace_string. a notebook with more than one date is left unchanged and reported as failed
+        """
+        from _databricks import databricks_notebook_pipeline as _notebook_pipeline_
+        return self.bulk_edit_notebooks([_notebook_pipeline_.Transform(search=r"\d{4}-\d{2}-\d{2}",
+                                                                       replace=replace_string,
+                                                                       regex=True,
+                                                                       max_distinct_matches=1)],
+                                        workflow_names=workflow_names,
+                                        max_workers=max_workers,
+                                        dry_run=dry_run,
+                                        logger=logger)
+
+    @_common_.exception_handler
+    def get_jobs_by_username(self,
+                             username: str = "",
+                             logger: Log = None):
+        return [{"username": each_job["username"],
+                 "job_id": each_job["job_id"],
+                 "effective_budget_policy_id": each_job["effective_budget_policy_id"]}
+                for each_job in self.job_index().jobs_by_creator(username)]
+
+    def statement_future(self, statement_id: str, timeout: float = None):
+        """ future of a submitted statement, completed with the StatementResponse once the statement finished.
+            concurrent.futures.wait / as_completed wait for many statements and runs together
+        """
+        from _databricks import databricks_wait as _wait_
+        return _wait_.default_poller().submit(_wait_.StatementHandle(self.client, statement_id, timeout=timeout))
+
+    def run_future(self, run_id: int, job_id: int = None, timeout: float = None, max_errors: int = 3):
+        """ future of a job run, completed with the Run once it terminated, was skipped or hit an internal error """
+        from _databricks import databricks_wait as _wait_
+        return _wait_.default_poller().submit(_wait_.RunHandle(self.client, run_id, job_id=job_id, timeout=timeout,
+                                                               max_errors=max_errors))
+
+    def _execute_statement(self, query_string: str, logger: Log = None, **kwargs):
+        """ execute sql in the sql warehouse and wait for the statement to finish, returns the statement response.
+            the warehouse holds the request until the statement finished or wait_timeout passed (50 seconds at
+            most), a statement still running is then polled with an adaptive interval
         """
         from datetime import datetime
-        srcs = self.client.data_sources.list()
+        from databricks.sdk.service.sql import ExecuteStatementRequestOnWaitTimeout
         warehouse_id = self._config.config.get("DATABRICKS_WAREHOUSE_ID")
 
         if not warehouse_id:
-            for src in srcs:
+            for src in self.client.data_sources.list():
                 if src.name == "jhuang-history-1":
                     warehouse_id = src.warehouse_id
 
-        statement_response = self.client.statement_execution.execute_statement(query_string, warehouse_id)
+        kwargs.setdefault("wait_timeout", "50s")
+        kwargs.setdefault("on_wait_timeout", ExecuteStatementRequestOnWaitTimeout.CONTINUE)
+        statement_response = self.client.statement_execution.execute_statement(query_string, warehouse_id, **kwargs)
 
         start_time = datetime.now()
         sql_reformat = query_string[:20].replace("\n", "")
         _common_.info_logger(f"starting query {sql_reformat} at {start_time}", logger=logger)
 
-        from time import sleep
+        if statement_response.status.state.value in ("SUCCEEDED", "FAILED", "CANCELED", "CLOSED"):
+            return statement_response
+        _common_.info_logger(f"statement id {statement_response.statement_id} is {statement_response.status.state.value}, please wait...", logger=logger)
+        return self.statement_future(statement_response.statement_id).result()
+
+    @_common_.exception_handler
+    def query(self, query_string: str, ignore_error_flg: bool=False, logger: Log = None):
+        """ execute sql in the databricks compute class and return the query result
+
+        Args:
+            query_string: query string
+            ignore_error_flg: ignore error if it is on otherwise raise
+            logger: logger object
 
-        while True:
-
-            response = self.client.statement_execution.get_statement(statement_response.statement_id)
-            if response.status.state.value == "FAILED":
-                _common_.info_logger(response, logger=logger)
-                exit(0)
-            if response.status.state.value in ("SUCCEEDED", "CANCELED", "CLOSED"):
-                break
-            _common_.info_logger(f"statement id {statement_response.statement_id} is {response.status.state.value}, please wait...", logger=logger)
-            sleep(__TIME_WAIT__)
-        return response.result
+        Returns: query result, data_array holds the rows of every chunk
+        """
+        response = self._execute_statement(query_string, logger=logger)
+        if response.status.state.value == "FAILED":
+            _common_.info_logger(response, logger=logger)
+            exit(0)
+
+        # a result larger than one chunk continues in the next chunks, they are appended to the first one
+        result = response.result
+        while result and result.next_chunk_index is not None and result.data_array is not None:
+            chunk = self.client.statement_execution.get_statement_result_chunk_n(response.statement_id, result.next_chunk_index)
+            result.data_array += chunk.data_array or []
+            result.next_chunk_index = chunk.next_chunk_index
+        return result
+
+    @_common_.exception_handler
+    def query_arrow(self,
+                    query_string: str,
+                    max_workers: int = 4,
+                    prefetch_chunks: int = 8,
+                    ignore_error_flg: bool = False,
+                    logger: Log = None):
+        """ execute sql in the databricks compute class and return the result in the arrow format, the chunks of the
+            result are downloaded concurrently from cloud storage while they are read
+
+            result = databricks_obj.query_arrow("select * from ...")
+            for each_batch in result.record_batches(): ...
+            df = result.to_pandas()
+
+        Args:
+            query_string: query string
+            max_workers: number of concurrent chunk downloads
+            prefetch_chunks: number of chunks held in memory ahead of the reader
+            ignore_error_flg: ignore error if it is on otherwise raise
+            logger: logger object
+
+        Returns: StatementResult, the record batches of the result or the result as a pandas / polars dataframe
+        """
+        from databricks.sdk.service.sql import Disposition, Format
+        from _databricks import databricks_statement_result as _statement_result_
+
+        response = self._execute_statement(query_string,
+                                           logger=logger,
+                                           disposition=Disposition.EXTERNAL_LINKS,
+                                           format=Format.ARROW_STREAM)
+        if response.status.state.value != "SUCCEEDED":
+            _common_.error_logger(currentframe().f_code.co_name,
+                                  f"statement {response.statement_id} is {response.status.state.value}: {response.status.error}",
+                                  logger=logger,
+                                  mode="error",
+                                  ignore_flag=ignore_error_flg)
+            return None
+
+        result = _statement_result_.StatementResult(self.client,
+                                                    response,
+                                                    max_workers=max_workers,
+                                                    prefetch_chunks=prefetch_chunks,
+                                                    logger=logger)
+        if result.truncated:
+            _common_.info_logger(f"result of statement {response.statement_id} is truncated", logger=logger)
+        return result
 
         # return self.client.statement_execution.get_statement_result_chunk_n(statement_id=statement_response.statement_id, chunk_index=1)
         #
@@ -29,7 +29,7 @@ class DirectiveRedshift(metaclass=_meta_.MetaDirective):
         self._session = _aws_config_.setup_session_by_profile(self._config.config.get("AWS_PROFILE_NAME"), self._config.config.get("AWS_REGION_NAME")) if \
             self._config.config.get("AWS_PROFILE_NAME") and self._config.config.get("AWS_REGION_NAME") else _aws_config_.setup_session(self._config)
 
-        self._client = self._session.client("redshift")
+        self._client = _aws_config_.get_client(self._session, "redshift")
 
 
     @_common_.exception_handler
@@ -0,0 +1,141 @@
+import os
+import math
+import time
+import threading
+from logging import Logger as Log
+from typing import Dict, Tuple, Union
+
+
+# resources of the machine running the commands, steps declare how much of them they use
+__CPU__ = "cpu"
+__MEMORY_MB__ = "memory_mb"
+
+
+def parse_resources(value: Union[str, Dict, None]) -> Dict[str, float]:
+    """ resources of a step or limits of a profile, "redshift_unload=1, databricks_api" or a mapping, a resource
+        without an amount counts as 1
+    """
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {str(each_name).strip().lower(): float(each_amount) for each_name, each_amount in value.items()}
+    _resources = {}
+    for _each_item in str(value).split(","):
+        if not (_each_item := _each_item.strip()):
+            continue
+        _name, _, _amount = _each_item.partition("=")
+        _resources[_name.strip().lower()] = float(_amount) if _amount.strip() else 1.0
+    return _resources
+
+
+def parse_rates(value: Union[str, Dict, None]) -> Dict[str, Tuple[float, float]]:
+    """ rate limits of a profile, "databricks_api=30/60" allows 30 units every 60 seconds, the period defaults to
+        one second
+    """
+    _rates = {}
+    for _name, _rate in ((value or {}).items() if isinstance(value, dict) else
+                         (each_item.split("=", 1) for each_item in str(value or "").split(",") if "=" in each_item)):
+        _amount, _, _seconds = str(_rate).partition("/")
+        _rates[_name.strip().lower()] = (float(_amount), float(_seconds) if _seconds.strip() else 1.0)
+    return _rates
+
+
+def machine_capacity() -> Dict[str, float]:
+    _capacity = {__CPU__: float(os.cpu_count() or 1)}
+    try:
+        _capacity[__MEMORY_MB__] = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 / 1024
+    except (ValueError, OSError, AttributeError):
+        pass
+    return _capacity
+
+
+class _TokenBucket:
+    def __init__(self, amount: float, seconds: float):
+        self.capacity = amount
+        self.rate = amount / seconds
+        self.tokens = amount
+        self.updated_at = time.monotonic()
+
+    def delay(self, amount: float) -> float:
+        """ seconds before amount tokens are available """
+        _now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (_now - self.updated_at) * self.rate)
+        self.updated_at = _now
+        return max(0.0, (min(amount, self.capacity) - self.tokens) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class AdmissionController:
+    def __init__(self,
+                 limits: Dict[str, float] = None,
+                 rates: Dict[str, Tuple[float, float]] = None,
+                 logger: Log = None):
+        """ decides which ready step may start, a step starts once every resource it declares is available. limits
+            are named semaphores (amount in use at the same time), rates are token buckets (amount started per
+            period). a resource without limit or rate is not constrained, cpu and memory_mb default to the machine
+
+        Args:
+            limits: capacity of each resource
+            rates: (amount, seconds) of each rate limited resource
+            logger: logger object
+        """
+        self.logger = logger
+        self.limits = {**machine_capacity(), **(limits or {})}
+        self._buckets = {each_name: _TokenBucket(*each_rate) for each_name, each_rate in (rates or {}).items()}
+        self._in_use: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, logger: Log = None) -> "AdmissionController":
+        """ RESOURCE_LIMITS ("redshift_unload=2, databricks_api=4, cpu=6") and RESOURCE_RATES
+            ("databricks_api=30/60") of the profile
+        """
+        return cls(parse_resources(config.config.get("RESOURCE_LIMITS")),
+                   parse_rates(config.config.get("RESOURCE_RATES")),
+                   logger=logger)
+
+    def _demand(self, resources: Dict[str, float]) -> Dict[str, float]:
+        # a step asking for more than the capacity would never start, it gets the whole resource instead
+        return {each_name: min(each_amount, self.limits.get(each_name, each_amount))
+                for each_name, each_amount in resources.items()}
+
+    def try_acquire(self, resources: Dict[str, float]) -> float:
+        """ take the resources of a step if they are all available
+
+        Args:
+            resources: amount of each resource the step uses
+
+        Returns: 0 when taken, otherwise the seconds before a rate limit allows it or inf when it waits for a
+                 running step to release a resource
+
+        """
+        if not resources:
+            return 0.0
+        _demand = self._demand(resources)
+        with self._lock:
+            if any(self._in_use.get(each_name, 0.0) + each_amount > self.limits[each_name]
+                   for each_name, each_amount in _demand.items() if each_name in self.limits):
+                return math.inf
+            if _delay := max((self._buckets[each_name].delay(each_amount) for each_name, each_amount in _demand.items()
+                              if each_name in self._buckets), default=0.0):
+                return _delay
+            for _each_name, _each_amount in _demand.items():
+                if _each_name in self._buckets:
+                    self._buckets[_each_name].take(_each_amount)
+                if _each_name in self.limits:
+                    self._in_use[_each_name] = self._in_use.get(_each_name, 0.0) + _each_amount
+        return 0.0
+
+    def release(self, resources: Dict[str, float]) -> None:
+        if not resources:
+            return
+        with self._lock:
+            for _each_name, _each_amount in self._demand(resources).items():
+                if _each_name in self.limits:
+                    self._in_use[_each_name] = max(0.0, self._in_use.get(_each_name, 0.0) - _each_amount)
+
+    def in_use(self) -> Dict[str, float]:
+        with self._lock:
+            return {each_name: each_amount for each_name, each_amount in self._in_use.items() if each_amount}
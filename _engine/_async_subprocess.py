@@ -0,0 +1,321 @@
+import os
+import asyncio
+import shlex
+import signal
+import time
+from collections import Counter, deque
+from logging import Logger as Log
+from typing import Callable, Dict, Hashable, List, Tuple
+
+import networkx as nx
+import psutil
+from _common import _common as _common_
+from _config import config as _config_
+from _engine import _subprocess
+from _engine import _dag_executor as _dag_executor_
+from _engine import _output_pump as _output_pump_
+from _error_handling import _error_handling
+from _engine import _run_history as _run_history_
+
+
+__SAMPLE_SECONDS__ = 0.5
+
+
+class _StepExit(Exception):
+    """ a step exited (error_logger exits on a failed command), raised as a plain exception inside the event loop
+        since SystemExit escaping a task stops the loop before the running steps are awaited
+    """
+
+
+class AsyncShellRunner(_subprocess.ShellRunner):
+    def __init__(self, profile_name: str, max_concurrency: int = None):
+        """ shell runner on asyncio subprocesses, one event loop drives every running command and its output
+            instead of a thread per step. it follows the CommandRunner protocol, run_command and
+            run_command_from_dag block until done while their _async variants can be awaited from a running loop
+
+        Args:
+            profile_name: profile name
+            max_concurrency: number of commands running at the same time, defaults to DAG_MAX_WORKERS in the profile
+        """
+        super().__init__(profile_name)
+        self.max_concurrency = int(max_concurrency or self._config.config.get("DAG_MAX_WORKERS") or _dag_executor_.__DEFAULT_MAX_WORKERS__)
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        """ the semaphore bounding the running commands, one per event loop since a semaphore is bound to its loop """
+        _loop = asyncio.get_running_loop()
+        if _loop not in self._semaphores:
+            self._semaphores = {_loop: asyncio.Semaphore(self.max_concurrency)}
+        return self._semaphores[_loop]
+
+    @staticmethod
+    def _argv(command, shell_mode: bool) -> List[str]:
+        if shell_mode:
+            return ["/bin/sh", "-c", command if isinstance(command, str) else " ".join(command)]
+        return shlex.split(command) if isinstance(command, str) else list(command)
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process,
+                    grace_seconds: float = _output_pump_.__KILL_GRACE_SECONDS__) -> None:
+        """ terminate the process group of the command, killed if still alive after the grace period """
+        def _signal(sig) -> None:
+            try:
+                if (_group_id := os.getpgid(process.pid)) != os.getpgid(0):
+                    os.killpg(_group_id, sig)
+                else:
+                    process.send_signal(sig)
+            except ProcessLookupError:
+                pass
+
+        if process.returncode is not None:
+            return
+        _signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), grace_seconds)
+        except asyncio.TimeoutError:
+            _signal(signal.SIGKILL)
+            await process.wait()
+
+    @staticmethod
+    async def _sample_usage(process: asyncio.subprocess.Process, result: _output_pump_.PumpResult) -> None:
+        """ peak memory and cpu time of the command and the processes it started, sampled with psutil since the
+            event loop reaps the process itself and its rusage is not available. a command shorter than the
+            sampling interval may not be measured
+        """
+        try:
+            _process = psutil.Process(process.pid)
+        except psutil.Error:
+            return
+        while process.returncode is None:
+            try:
+                _children = _process.children(recursive=True)
+                _cpu_times = _process.cpu_times()
+                # children which ended are in the children times of the process which waited for them
+                _cpu_seconds = sum(_cpu_times[:4]) + sum(sum(each_child.cpu_times()[:2]) for each_child in _children)
+                _rss = _process.memory_info().rss + sum(each_child.memory_info().rss for each_child in _children)
+            except psutil.Error:
+                break
+            result.cpu_seconds = max(result.cpu_seconds or 0.0, _cpu_seconds)
+            result.max_rss_mb = max(result.max_rss_mb or 0.0, _rss / 1024 / 1024)
+            await asyncio.sleep(__SAMPLE_SECONDS__)
+
+    async def _run_command_async(self,
+                                 profile_name: str,
+                                 command_parameter: Dict,
+                                 timeout,
+                                 error_handle,
+                                 ignore_errors: bool = False,
+                                 logger: Log = None,
+                                 on_result: Callable[[_output_pump_.PumpResult], None] = None,
+                                 on_line: Callable[[str], None] = None) -> Tuple[asyncio.subprocess.Process, str]:
+        _begin = time.perf_counter()
+        output_sink = self._output_sink(logger=logger)
+        sink = _output_pump_.tee_sink(output_sink, on_line) if on_line else output_sink
+        tail_lines = int(self._config.config.get("SHELL_OUTPUT_TAIL_LINES") or _output_pump_.__DEFAULT_TAIL_LINES__)
+        combined_tail = deque(maxlen=tail_lines)
+        streams = [_output_pump_.OutputStream(each_name, tail_lines, sink=sink, combined_tail=combined_tail)
+                   for each_name in ("stdout", "stderr")]
+
+        process = await asyncio.create_subprocess_exec(*self._argv(command_parameter.get("args"), command_parameter.get("shell")),
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE,
+                                                       env=command_parameter.get("env"),
+                                                       cwd=command_parameter.get("cwd"),
+                                                       start_new_session=True)
+
+        async def drain(reader: asyncio.StreamReader, stream: _output_pump_.OutputStream) -> None:
+            while data := await reader.read(_output_pump_.__READ_SIZE__):
+                stream.feed(data)
+
+        result = _output_pump_.PumpResult()
+        sampler = asyncio.ensure_future(self._sample_usage(process, result))
+        io = asyncio.gather(drain(process.stdout, streams[0]), drain(process.stderr, streams[1]), process.wait())
+        try:
+            await asyncio.wait_for(io, timeout=timeout or None)
+        except asyncio.TimeoutError:
+            result.timed_out = True
+            _common_.info_logger(f"timeout is set to {timeout} and process {process.pid} exceeded {timeout} seconds.  "
+                                 f"killing the process...", logger=logger)
+            await self._kill(process)
+        except asyncio.CancelledError:
+            # the step was cancelled, the command must not outlive it
+            await asyncio.shield(self._kill(process))
+            raise
+        finally:
+            sampler.cancel()
+            if io.done() and not io.cancelled():
+                io.exception()
+            # a killed or cancelled command leaves its last line unterminated, it is part of the output and the tail
+            for each_stream in streams:
+                each_stream.flush()
+            if isinstance(output_sink, _output_pump_.FileSink):
+                output_sink.close()
+
+        result.return_code = process.returncode
+        result.seconds = time.perf_counter() - _begin
+        result = _output_pump_.collect_result(result, streams, combined_tail)
+        if on_result:
+            on_result(result)
+        error_message = self._check_result(command_parameter, result, timeout, error_handle,
+                                           ignore_errors=ignore_errors, logger=logger)
+        return process, error_message
+
+    async def run_command_async(self,
+                                profile_name: str,
+                                command,
+                                *args,
+                                **kwargs):
+        """ run a command on the event loop, see ShellRunner.run_command
+
+        Args:
+            profile_name: profile name
+            command: command to run
+
+        Returns: a tuple of (process, error message), None in dry run
+
+        """
+        timeout: int = kwargs.get('timeout', 120)
+        shell_mode: bool = kwargs.get('shell_mode', True)
+        env_vars: Dict = kwargs.get("env_vars", {})
+        directive: Dict = kwargs.get("directive", {})
+        logger: Log = kwargs.get("logger")
+
+        error_handle = _error_handling.ErrorHandlingSingleton(profile_name=profile_name,
+                                                              error_handler="subprocess").error_handle
+        _command_parameter, dry_run_flag, ignore_errors = self._prepare_command(profile_name,
+                                                                                command,
+                                                                                shell_mode=shell_mode,
+                                                                                env_vars=env_vars,
+                                                                                directive=directive)
+        if dry_run_flag:
+            if directive.get("_RUN_DIRECTIVE_"):
+                _common_.info_logger(f"dry run: directive {directive.get('_RUN_DIRECTIVE_')} {directive.get('PROCESSTASK')}")
+            if (cmd := _command_parameter.get('args')) and cmd != "ECHO1":
+                _common_.info_logger(f"dry run: {_command_parameter.get('args')}")
+            return
+
+        result = None
+        async with self._semaphore():
+            if directive.get("_RUN_DIRECTIVE_"):
+                _common_.info_logger(f"running: {directive.get('_RUN_DIRECTIVE_')}")
+                result = await asyncio.to_thread(self._run_command_directive,
+                                                 profile_name=profile_name,
+                                                 command_parameter={**_command_parameter, **{"__directive__": directive}},
+                                                 timeout=timeout,
+                                                 error_handle=error_handle,
+                                                 ignore_errors=ignore_errors)
+
+            if (cmd := _command_parameter.get('args')) and cmd != "ECHO1":
+                _common_.info_logger(f"running: {_command_parameter.get('args')}")
+                result = await self._run_command_async(profile_name,
+                                                       _command_parameter,
+                                                       timeout,
+                                                       error_handle,
+                                                       ignore_errors=ignore_errors,
+                                                       logger=logger,
+                                                       on_result=kwargs.get("on_result"),
+                                                       on_line=kwargs.get("on_line"))
+        return result
+
+    @_common_.exception_handler
+    def run_command(self,
+                    profile_name: str,
+                    command,
+                    *args,
+                    **kwargs):
+        return asyncio.run(self.run_command_async(profile_name, command, *args, **kwargs))
+
+    async def run_command_from_dag_async(self,
+                                         profile_name: str,
+                                         dag: nx.DiGraph,
+                                         logger: Log = None,
+                                         **kwargs) -> _dag_executor_.DagReport:
+        """ run the steps of the dag on the event loop, every step whose upstream steps are done starts right away,
+            by priority first then by the number of steps waiting behind it. after a failure no new step starts and
+            the running ones are awaited, cancelling the run kills every running command. max_workers in kwargs
+            bounds this dag, max_concurrency of the runner bounds every command of the runner, dags included
+
+        Args:
+            profile_name: profile name
+            dag: directed acyclic graph of steps
+            logger: logger object
+
+        Returns: the run report with the timing of each step and the critical path
+
+        """
+        timeout: int = kwargs.get('timeout', 120)
+        shell_mode: bool = kwargs.get('shell_mode', True)
+        env_vars: Dict = kwargs.get("env_vars", {})
+        _config = _config_.ConfigSingleton()
+
+        max_workers, throttle = self._dag_settings(_config, env_vars, max_workers=kwargs.get("max_workers") or self.max_concurrency)
+        remaining_commands = Counter(self._step_progress_key(_config, each_command) for each_command in dag.nodes)
+        report = _dag_executor_.DagReport.for_dag(dag, self._step_name)
+        schedule = _dag_executor_.DagSchedule(dag,
+                                              max_workers=max_workers,
+                                              throttle=throttle,
+                                              admission=self._admission_controller(logger=logger),
+                                              priority=self._step_priority,
+                                              describe=self._step_name,
+                                              resources=self._step_resources,
+                                              report=report,
+                                              logger=logger)
+
+        async def run_step(node: Hashable):
+            report.timings[node].start = schedule.elapsed()
+            step_parameters = self._step_parameters(profile_name, node, timeout, shell_mode, env_vars)
+            try:
+                # the step cache is a sqlite file, its lookups stay off the event loop
+                if (cache_key := self._step_cache_key(node, step_parameters)) and \
+                        await asyncio.to_thread(self._replay_step, cache_key, logger=logger):
+                    return ""
+                results, output = [], self._step_output(cache_key)
+                try:
+                    outcome = await self.run_command_async(**step_parameters, logger=logger, on_result=results.append,
+                                                           on_line=output.append if output is not None else None)
+                finally:
+                    if results:
+                        report.timings[node].record_usage(results[-1])
+                await asyncio.to_thread(self._record_step, cache_key, node, results, output,
+                                        schedule.elapsed() - report.timings[node].start, logger=logger)
+                return outcome
+            except SystemExit as err:
+                raise _StepExit(str(err)) from err
+            finally:
+                report.timings[node].end = schedule.elapsed()
+
+        running: Dict[asyncio.Task, Hashable] = {}
+        try:
+            while not schedule.finished:
+                launched, wait_timeout = schedule.launch()
+                for each_node in launched:
+                    running[asyncio.ensure_future(run_step(each_node))] = each_node
+                if not running:
+                    await asyncio.sleep(wait_timeout or 0)
+                    continue
+
+                done, _ = await asyncio.wait(list(running), timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+                for each_task in done:
+                    node = running.pop(each_task)
+                    if (err := each_task.exception()) is not None:
+                        schedule.complete(node, err.__cause__ if isinstance(err, _StepExit) else err)
+                        continue
+                    if schedule.complete(node):
+                        # the job progress file is written and fsynced, off the event loop
+                        await asyncio.to_thread(self._mark_step_complete, _config, remaining_commands, node, logger=logger)
+        finally:
+            # cancelled or exiting on a failed step, running commands are killed by their own cancellation
+            for each_task in running:
+                each_task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            schedule.abandon()
+            schedule.close()
+            self._save_run(report, _config, profile_name, logger=logger)
+        if schedule.failure is not None:
+            raise schedule.failure
+        return report
+
+    @_common_.exception_handler
+    def run_command_from_dag(self, profile_name: str, dag, logger: Log = None, *args, **kwargs) -> _dag_executor_.DagReport:
+        return asyncio.run(self.run_command_from_dag_async(profile_name, dag, logger=logger, **kwargs))
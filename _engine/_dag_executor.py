@@ -0,0 +1,338 @@
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, Future
+from inspect import currentframe
+from logging import Logger as Log
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import networkx as nx
+from _common import _common as _common_
+from _engine import _admission as _admission_
+
+
+__DEFAULT_MAX_WORKERS__ = 4
+
+
+@dataclass
+class StepTiming:
+    description: str
+    start: float = 0.0
+    end: float = 0.0
+    status: str = "pending"
+    error: str = ""
+    # seconds since the start of the run the step became ready, it then waits for a worker or a resource
+    queued: float = 0.0
+    exit_code: int = None
+    cpu_seconds: float = None
+    max_rss_mb: float = None
+    output_bytes: int = None
+
+    @property
+    def seconds(self) -> float:
+        return self.end - self.start if self.end else 0.0
+
+    @property
+    def queue_wait(self) -> float:
+        return max(0.0, self.start - self.queued) if self.start else 0.0
+
+    def record_usage(self, result) -> None:
+        """ exit code, resource usage and output size of the command of the step, from its PumpResult """
+        self.exit_code = result.return_code
+        self.cpu_seconds = result.cpu_seconds
+        self.max_rss_mb = result.max_rss_mb
+        self.output_bytes = result.stdout_bytes + result.stderr_bytes
+
+
+@dataclass
+class DagReport:
+    timings: Dict[Hashable, StepTiming] = field(default_factory=dict)
+    seconds: float = 0.0
+    critical_path: List[Hashable] = field(default_factory=list)
+    critical_path_seconds: float = 0.0
+    # epoch the run started, the times of the steps are relative to it
+    started_at: float = 0.0
+
+    @classmethod
+    def for_dag(cls, dag: nx.DiGraph, describe: Callable[[Hashable], str] = str) -> "DagReport":
+        return cls(timings={each_node: StepTiming(describe(each_node)) for each_node in dag.nodes})
+
+    @property
+    def step_seconds(self) -> float:
+        return sum(each_timing.seconds for each_timing in self.timings.values())
+
+    def summary(self) -> str:
+        _critical_path = " -> ".join(self.timings[each_node].description for each_node in self.critical_path)
+        return (f"{sum(1 for each_timing in self.timings.values() if each_timing.status == 'done')} of "
+                f"{len(self.timings)} steps done in {self.seconds:.1f} seconds, sum of steps {self.step_seconds:.1f} "
+                f"seconds, critical path {self.critical_path_seconds:.1f} seconds: {_critical_path}")
+
+
+def critical_path(dag: nx.DiGraph, durations: Dict[Hashable, float]) -> List[Hashable]:
+    """ the chain of dependent steps with the largest total duration, no schedule can finish faster than it
+
+    Args:
+        dag: directed acyclic graph of steps
+        durations: duration in seconds of each step
+
+    Returns: the steps on the critical path in execution order
+
+    """
+    _finish, _previous = {}, {}
+    for _each_node in nx.topological_sort(dag):
+        _upstream = max(dag.predecessors(_each_node), key=lambda node: _finish[node], default=None)
+        _previous[_each_node] = _upstream
+        _finish[_each_node] = durations.get(_each_node, 0.0) + (_finish[_upstream] if _upstream is not None else 0.0)
+    if not _finish:
+        return []
+    _node, _path = max(_finish, key=_finish.get), []
+    while _node is not None:
+        _path.append(_node)
+        _node = _previous[_node]
+    return _path[::-1]
+
+
+class DagSchedule:
+    def __init__(self,
+                 dag: nx.DiGraph,
+                 max_workers: int = __DEFAULT_MAX_WORKERS__,
+                 throttle: float = 0.0,
+                 admission: _admission_.AdmissionController = None,
+                 priority: Callable[[Hashable], float] = None,
+                 describe: Callable[[Hashable], str] = str,
+                 resources: Callable[[Hashable], Dict[str, float]] = None,
+                 report: DagReport = None,
+                 logger: Log = None):
+        """ the order the steps of a dag start in, shared by the thread pool and the event loop runners. a step is
+            ready once its upstream steps are done, ready steps start by priority first then by the number of steps
+            waiting behind them, so the longest chain is never left idle. after a failure no new step starts
+
+        Args:
+            dag: directed acyclic graph of steps
+            max_workers: number of steps running at the same time
+            throttle: minimum seconds between two step launches, 0 launches ready steps immediately
+            admission: resources a step waits for before it starts, a step which can not start yet lets the next
+                       ready step start in its place
+            priority: function returning the priority of a step, higher runs first
+            describe: function returning the name of a step used in the report
+            resources: function returning the resources a step uses, see AdmissionController
+            report: report of the run, filled in as the steps run
+            logger: logger object
+        """
+        if not nx.is_directed_acyclic_graph(dag):
+            _common_.error_logger(currentframe().f_code.co_name,
+                                  f"circular dependency detected: {nx.find_cycle(dag)}",
+                                  logger=logger,
+                                  mode="error",
+                                  ignore_flag=False)
+        self.dag = dag
+        self.max_workers = max(1, max_workers)
+        self.throttle = throttle
+        self.admission = admission if resources else None
+        self.priority = priority
+        self.resources = resources
+        self.logger = logger
+        self.report = report or DagReport.for_dag(dag, describe)
+        self.report.started_at = time.time()
+        self.failure = None
+        self.running = set()
+        self._begin = time.perf_counter()
+        self._depth = self._downstream_depth(dag)
+        self._pending = {each_node: dag.in_degree(each_node) for each_node in dag.nodes}
+        self._sequence = itertools.count()
+        self._ready = []
+        self._last_launch = float("-inf")
+        for _each_node, _count in self._pending.items():
+            if _count == 0:
+                self._push(_each_node)
+
+    @staticmethod
+    def _downstream_depth(dag: nx.DiGraph) -> Dict[Hashable, int]:
+        _depth = {}
+        for _each_node in reversed(list(nx.topological_sort(dag))):
+            _depth[_each_node] = 1 + max((_depth[each_successor] for each_successor in dag.successors(_each_node)), default=0)
+        return _depth
+
+    def _push(self, node: Hashable) -> None:
+        self.report.timings[node].queued = self.elapsed()
+        heapq.heappush(self._ready, (-(self.priority(node) if self.priority else 0), -self._depth[node], next(self._sequence), node))
+
+    def elapsed(self) -> float:
+        """ seconds since the start of the run, the clock of the step timings """
+        return time.perf_counter() - self._begin
+
+    @property
+    def finished(self) -> bool:
+        """ every step ran, or a step failed and the running ones are done """
+        return not self.running and (not self._ready or self.failure is not None)
+
+    def launch(self) -> Tuple[List[Hashable], Optional[float]]:
+        """ the ready steps to start now, within max_workers, the throttle and the resources of the admission
+            controller
+
+        Returns: the steps to start and the seconds to wait at most before calling launch again, None to wait for
+                 a running step
+
+        """
+        _launched, _waiting, _wait_timeout = [], [], None
+        while self._ready and self.failure is None and len(self.running) < self.max_workers:
+            if (_delay := self._last_launch + self.throttle - time.perf_counter()) > 0:
+                _wait_timeout = _delay
+                break
+            _item = heapq.heappop(self._ready)
+            if self.admission and (_delay := self.admission.try_acquire(self.resources(_item[-1]))):
+                # waits for a resource, released by a running step or refilled by its rate limit
+                _waiting.append(_item)
+                if _delay != float("inf"):
+                    _wait_timeout = min(_wait_timeout or _delay, _delay)
+                continue
+            _node = _item[-1]
+            self.report.timings[_node].status = "running"
+            self.running.add(_node)
+            _launched.append(_node)
+            self._last_launch = time.perf_counter()
+        for _item in _waiting:
+            heapq.heappush(self._ready, _item)
+        if not _launched and not self.running and _waiting and _wait_timeout is None:
+            # nothing to wait for, a resource is held by a run sharing the admission controller
+            _wait_timeout = 0.1
+        return _launched, _wait_timeout
+
+    def complete(self, node: Hashable, error: BaseException = None) -> bool:
+        """ a started step ended, its successors become ready once it succeeded
+
+        Returns: True if the step succeeded
+
+        """
+        self.running.discard(node)
+        _timing = self.report.timings[node]
+        if self.admission:
+            self.admission.release(self.resources(node))
+        if error is not None:
+            _timing.status, _timing.error = "failed", str(error)
+            self.failure = self.failure or error
+            return False
+        _timing.status = "done"
+        for _each_successor in self.dag.successors(node):
+            self._pending[_each_successor] -= 1
+            if self._pending[_each_successor] == 0:
+                self._push(_each_successor)
+        return True
+
+    def abandon(self) -> None:
+        """ the run was stopped, the steps still running are cancelled and their resources released """
+        for _each_node in list(self.running):
+            self.running.discard(_each_node)
+            self.report.timings[_each_node].status = "cancelled"
+            if self.admission:
+                self.admission.release(self.resources(_each_node))
+
+    def close(self) -> DagReport:
+        """ complete the report with the duration of the run and its critical path """
+        self.report.seconds = self.elapsed()
+        self.report.critical_path = critical_path(self.dag, {each_node: each_timing.seconds for each_node, each_timing in self.report.timings.items()})
+        self.report.critical_path_seconds = sum(self.report.timings[each_node].seconds for each_node in self.report.critical_path)
+        _common_.info_logger(self.report.summary(), logger=self.logger)
+        return self.report
+
+
+class DagExecutor:
+    def __init__(self,
+                 max_workers: int = __DEFAULT_MAX_WORKERS__,
+                 throttle: float = 0.0,
+                 admission: _admission_.AdmissionController = None,
+                 logger: Log = None):
+        """ runs the steps of a dag on a bounded thread pool in the order of a DagSchedule, every step whose
+            upstream steps are done is started right away
+
+        Args:
+            max_workers: number of steps running at the same time
+            throttle: minimum seconds between two step launches, 0 launches ready steps immediately
+            admission: resources a step waits for before it starts, a step which can not start yet lets the next
+                       ready step start in its place
+            logger: logger object
+        """
+        self.max_workers = max(1, max_workers)
+        self.throttle = throttle
+        self.admission = admission
+        self.logger = logger
+
+    def run(self,
+            dag: nx.DiGraph,
+            run_step: Callable[[Hashable], Any],
+            on_complete: Callable[[Hashable], None] = None,
+            priority: Callable[[Hashable], float] = None,
+            describe: Callable[[Hashable], str] = str,
+            resources: Callable[[Hashable], Dict[str, float]] = None,
+            report: DagReport = None,
+            on_abort: Callable[[], None] = None) -> DagReport:
+        """ run every step of the dag, on_complete is called on the calling thread once a step succeeded. after a
+            step fails no new step is started, the running ones are awaited and the error is raised
+
+        Args:
+            dag: directed acyclic graph of steps
+            run_step: function running one step
+            on_complete: function called with the step once it succeeded
+            priority: function returning the priority of a step, higher runs first
+            describe: function returning the name of a step used in the report
+            resources: function returning the resources a step uses, see AdmissionController
+            report: report of the run, filled in as the steps run, run_step can record the usage of its step in it
+            on_abort: function stopping the running steps when the run is interrupted (Ctrl-C), the thread pool
+                      waits for them before the error is raised
+
+        Returns: the run report with the timing of each step and the critical path
+
+        """
+        schedule = DagSchedule(dag,
+                               max_workers=self.max_workers,
+                               throttle=self.throttle,
+                               admission=self.admission,
+                               priority=priority,
+                               describe=describe,
+                               resources=resources,
+                               report=report,
+                               logger=self.logger)
+        _running: Dict[Future, Hashable] = {}
+
+        def _timed(node: Hashable) -> Any:
+            schedule.report.timings[node].start = schedule.elapsed()
+            try:
+                return run_step(node)
+            finally:
+                schedule.report.timings[node].end = schedule.elapsed()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                try:
+                    while not schedule.finished:
+                        _launched, _wait_timeout = schedule.launch()
+                        for _each_node in _launched:
+                            _running[executor.submit(_timed, _each_node)] = _each_node
+                        if not _running:
+                            time.sleep(_wait_timeout or 0)
+                            continue
+
+                        _done, _ = wait(list(_running), timeout=_wait_timeout, return_when=FIRST_COMPLETED)
+                        for _each_future in _done:
+                            _node = _running.pop(_each_future)
+                            try:
+                                _each_future.result()
+                            except BaseException as err:
+                                # exception_handler of the runner exits on error, SystemExit is a failure of the step too
+                                schedule.complete(_node, err)
+                                continue
+                            if schedule.complete(_node) and on_complete:
+                                on_complete(_node)
+                except BaseException:
+                    # interrupted, the running steps would otherwise be awaited until they end on their own
+                    if on_abort:
+                        on_abort()
+                    raise
+        finally:
+            schedule.abandon()
+            schedule.close()
+
+        if schedule.failure is not None:
+            raise schedule.failure
+        return schedule.report
@@ -0,0 +1,250 @@
+import os
+import signal
+import selectors
+import subprocess
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from logging import Logger as Log
+from typing import BinaryIO, Callable, Deque, Dict, List, Union
+
+from _common import _common as _common_
+
+
+__READ_SIZE__ = 64 * 1024
+__DEFAULT_TAIL_LINES__ = 200
+__MAX_LINE_BYTES__ = 64 * 1024
+__KILL_GRACE_SECONDS__ = 5
+
+
+@dataclass
+class PumpResult:
+    return_code: int = None
+    timed_out: bool = False
+    seconds: float = 0.0
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
+    stdout_tail: List[str] = field(default_factory=list)
+    stderr_tail: List[str] = field(default_factory=list)
+    tail: List[str] = field(default_factory=list)
+    # resource usage of the process and the children it waited for, None when not measured
+    cpu_seconds: float = None
+    max_rss_mb: float = None
+
+
+class OutputStream:
+    def __init__(self,
+                 name: str,
+                 tail_lines: int = __DEFAULT_TAIL_LINES__,
+                 sink: Union[Callable[[str, str], None], None] = None,
+                 max_line_bytes: int = __MAX_LINE_BYTES__,
+                 combined_tail: Deque[str] = None):
+        """ splits the raw output of one stream into lines handed to the sink, only the last tail_lines lines are
+            kept. lines longer than max_line_bytes are split so a stream without newline can not grow the buffer
+
+        Args:
+            name: stream name, stdout or stderr
+            tail_lines: number of lines kept
+            sink: function receiving (stream name, line) for each line, None discards the lines
+            max_line_bytes: maximum length of a line
+            combined_tail: tail shared by the streams of a process, lines of both streams interleaved
+        """
+        self.name = name
+        self.sink = sink
+        self.max_line_bytes = max_line_bytes
+        self.partial = bytearray()
+        self.bytes = 0
+        self.tail: Deque[str] = deque(maxlen=tail_lines)
+        self.combined_tail = combined_tail
+
+    def _emit(self, raw_line: bytes) -> None:
+        _line = raw_line.decode("utf-8", errors="replace").rstrip("\r")
+        self.tail.append(_line)
+        if self.combined_tail is not None:
+            self.combined_tail.append(_line)
+        if self.sink:
+            self.sink(self.name, _line)
+
+    def feed(self, data: bytes) -> None:
+        self.bytes += len(data)
+        self.partial += data
+        if (_last_newline := self.partial.rfind(b"\n")) != -1:
+            _lines = self.partial[:_last_newline].split(b"\n")
+            # without a sink only the tail is kept, the lines before it are never decoded
+            for _each_line in (_lines if self.sink else _lines[-self.tail.maxlen:]):
+                self._emit(_each_line)
+            del self.partial[:_last_newline + 1]
+        while len(self.partial) >= self.max_line_bytes:
+            self._emit(self.partial[:self.max_line_bytes])
+            del self.partial[:self.max_line_bytes]
+
+    def flush(self) -> None:
+        if self.partial:
+            self._emit(bytes(self.partial))
+            self.partial.clear()
+
+
+def log_sink(prefix: bool = True, logger: Log = None) -> Callable[[str, str], None]:
+    """ sink echoing every line through info_logger, the way the runner always displayed the output """
+    def sink(stream_name: str, line: str) -> None:
+        _common_.info_logger(f"{stream_name.upper()}: {line}" if prefix else line, logger=logger)
+    return sink
+
+
+def tee_sink(sink: Union[Callable[[str, str], None], None], on_line: Callable[[str], None]) -> Callable[[str, str], None]:
+    """ sink handing every line to on_line as well, for the full output of a step recorded in the step cache """
+    def tee(stream_name: str, line: str) -> None:
+        on_line(line)
+        if sink:
+            sink(stream_name, line)
+    return tee
+
+
+class FileSink:
+    def __init__(self, filepath: str):
+        """ sink appending every line to a file, for commands whose full output has to be kept """
+        self.filepath = filepath
+        self._file = open(filepath, "a", buffering=1024 * 1024)
+
+    def __call__(self, stream_name: str, line: str) -> None:
+        self._file.write(f"{line}\n" if stream_name == "stdout" else f"[{stream_name}] {line}\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def kill_process(process: subprocess.Popen, grace_seconds: float = __KILL_GRACE_SECONDS__) -> None:
+    """ terminate the process and everything it started, killed if still alive after the grace period """
+    def _signal(sig) -> None:
+        try:
+            # the whole group only when the process leads its own session, otherwise it is our group too
+            if hasattr(os, "killpg") and (_group_id := os.getpgid(process.pid)) != os.getpgid(0):
+                os.killpg(_group_id, sig)
+            else:
+                process.send_signal(sig)
+        except (ProcessLookupError, PermissionError):
+            process.send_signal(sig)
+
+    if process.poll() is not None:
+        return
+    _signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=grace_seconds)
+    except subprocess.TimeoutExpired:
+        _signal(signal.SIGKILL)
+        process.wait()
+
+
+def rusage_max_rss_mb(max_rss: int) -> float:
+    # kilobytes on linux, bytes on macos
+    return max_rss / 1024 / 1024 if os.uname().sysname == "Darwin" else max_rss / 1024
+
+
+def wait_with_usage(process: subprocess.Popen, result: PumpResult, timeout: float = None) -> int:
+    """ wait for the process and record the cpu time and peak memory of the process and the children it waited
+        for (os.wait4), the usage stays None where wait4 is not available
+
+    Raises:
+        subprocess.TimeoutExpired: the process is still running after timeout seconds
+    """
+    if not hasattr(os, "wait4") or process.returncode is not None:
+        return process.wait(timeout=timeout)
+    _deadline = time.perf_counter() + timeout if timeout is not None else None
+    _delay = 0.001
+    while True:
+        try:
+            _pid, _status, _usage = os.wait4(process.pid, 0 if _deadline is None else os.WNOHANG)
+        except ChildProcessError:
+            # reaped somewhere else
+            return process.wait(timeout=timeout)
+        if _pid:
+            process.returncode = os.waitstatus_to_exitcode(_status)
+            result.cpu_seconds = _usage.ru_utime + _usage.ru_stime
+            result.max_rss_mb = rusage_max_rss_mb(_usage.ru_maxrss)
+            return process.returncode
+        if time.perf_counter() >= _deadline:
+            raise subprocess.TimeoutExpired(process.args, timeout)
+        time.sleep(_delay)
+        _delay = min(_delay * 2, 0.1)
+
+
+def pump(process: subprocess.Popen,
+         timeout: float = None,
+         sink: Union[Callable[[str, str], None], None] = None,
+         tail_lines: int = __DEFAULT_TAIL_LINES__,
+         max_line_bytes: int = __MAX_LINE_BYTES__,
+         logger: Log = None) -> PumpResult:
+    """ drain stdout and stderr of a process started with binary pipes without blocking on either of them, every
+        line is handed to the sink as it arrives and only the last tail_lines lines are kept, so memory stays
+        bounded whatever the size of the output. the process (and its process group) is killed once the timeout
+        is reached
+
+    Args:
+        process: process started with stdout=PIPE and stderr=PIPE in binary mode
+        timeout: seconds before the process is killed, None waits forever
+        sink: function receiving (stream name, line) for each line, None discards the lines
+        tail_lines: number of lines kept per stream for the error message
+        max_line_bytes: longer lines are split, a binary stream without newline can not grow the buffer
+        logger: logger object
+
+    Returns: the return code, whether the process timed out, the byte counts and the last lines of each stream
+
+    """
+    _begin = time.perf_counter()
+    _deadline = _begin + timeout if timeout else None
+    _streams: Dict[BinaryIO, OutputStream] = {}
+    _tail: Deque[str] = deque(maxlen=tail_lines)
+    _selector = selectors.DefaultSelector()
+    for _name, _pipe in (("stdout", process.stdout), ("stderr", process.stderr)):
+        if _pipe is not None:
+            os.set_blocking(_pipe.fileno(), False)
+            _streams[_pipe] = OutputStream(_name, tail_lines, sink=sink, max_line_bytes=max_line_bytes, combined_tail=_tail)
+            _selector.register(_pipe, selectors.EVENT_READ)
+
+    _result = PumpResult()
+    try:
+        while _selector.get_map():
+            _remaining = _deadline - time.perf_counter() if _deadline else None
+            if _remaining is not None and _remaining <= 0:
+                _result.timed_out = True
+                _common_.info_logger(f"timeout is set to {timeout} and process {process.pid} exceeded {timeout} "
+                                     f"seconds.  killing the process...", logger=logger)
+                kill_process(process)
+                break
+            for _key, _ in _selector.select(timeout=_remaining):
+                try:
+                    _data = os.read(_key.fd, __READ_SIZE__)
+                except BlockingIOError:
+                    continue
+                if _data:
+                    _streams[_key.fileobj].feed(_data)
+                else:
+                    _selector.unregister(_key.fileobj)
+    finally:
+        _selector.close()
+
+    for _pipe, _stream in _streams.items():
+        _stream.flush()
+        _pipe.close()
+
+    _remaining = _deadline - time.perf_counter() if _deadline else None
+    try:
+        _result.return_code = wait_with_usage(process, _result, timeout=max(_remaining, 0) if _remaining is not None else None)
+    except subprocess.TimeoutExpired:
+        # the output is closed but the process lingers, for instance it closed its pipes and kept running
+        _result.timed_out = True
+        kill_process(process)
+        _result.return_code = process.returncode
+
+    _result.seconds = time.perf_counter() - _begin
+    return collect_result(_result, list(_streams.values()), _tail)
+
+
+def collect_result(result: PumpResult, streams: List[OutputStream], combined_tail: Deque[str]) -> PumpResult:
+    for _each_stream in streams:
+        if _each_stream.name == "stdout":
+            result.stdout_bytes, result.stdout_tail = _each_stream.bytes, list(_each_stream.tail)
+        else:
+            result.stderr_bytes, result.stderr_tail = _each_stream.bytes, list(_each_stream.tail)
+    result.tail = list(combined_tail)
+    return result
@@ -164,6 +164,7 @@ def process_template(template_name: object,
 
     t_task = _task.Task(description="tubi_history_load_flow")
 
+    _environment = _task.environment(_config.config)
     if commands := _inspect_module.get_local_variable(template_name):
         for command_num, command in commands.items():
             print(command, _config.config)
@@ -178,7 +179,7 @@ def process_template(template_name: object,
             _command = get_instruction(_commands)
 
             _curr_step = _task.Step(command=_command,
-                                    environment_variables=_config.config,
+                                    environment_variables=_environment,
                                     metadata=_directives,
                                     description=command_num
                                     )
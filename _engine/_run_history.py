@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import fcntl
+from uuid import uuid4
+from logging import Logger as Log
+from typing import Dict, List, Optional
+
+from _engine import _dag_executor as _dag_executor_
+
+
+__DEFAULT_RUN_HISTORY_LOC__ = "~/.deat/run_history.jsonl"
+
+
+def run_record(report: _dag_executor_.DagReport,
+               job_identifier: str = "",
+               profile_name: str = "",
+               template_step=lambda node: getattr(node, "description", "")) -> Dict:
+    """ json record of a dag run, one entry per step with its timing and resource usage """
+    _ids = {each_node: index for index, each_node in enumerate(report.timings)}
+    return {
+        "run_id": uuid4().hex[:12],
+        "job_identifier": job_identifier,
+        "profile_name": profile_name,
+        "started_at": report.started_at,
+        "seconds": report.seconds,
+        "critical_path": [_ids[each_node] for each_node in report.critical_path],
+        "critical_path_seconds": report.critical_path_seconds,
+        "steps": [{"id": _ids[each_node],
+                   "step_id": getattr(each_node, "step_id", None),
+                   "name": each_timing.description,
+                   "template_step": template_step(each_node),
+                   "status": each_timing.status,
+                   "queued": each_timing.queued,
+                   "start": each_timing.start,
+                   "end": each_timing.end,
+                   "seconds": each_timing.seconds,
+                   "queue_wait": each_timing.queue_wait,
+                   "exit_code": each_timing.exit_code,
+                   "cpu_seconds": each_timing.cpu_seconds,
+                   "max_rss_mb": each_timing.max_rss_mb,
+                   "output_bytes": each_timing.output_bytes,
+                   "error": each_timing.error[-1000:]}
+                  for each_node, each_timing in report.timings.items()],
+    }
+
+
+class RunHistory:
+    def __init__(self, filepath: str = __DEFAULT_RUN_HISTORY_LOC__, logger: Log = None):
+        """ history of the dag runs, one json line per run appended to the file """
+        self.filepath = os.path.expanduser(filepath)
+        self.logger = logger
+
+    def append(self, record: Dict) -> None:
+        if _dirpath := os.path.dirname(self.filepath):
+            os.makedirs(_dirpath, exist_ok=True)
+        with open(self.filepath, "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.write(json.dumps(record, default=str) + "\n")
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def runs(self, job_identifier: str = None) -> List[Dict]:
+        if not os.path.isfile(self.filepath):
+            return []
+        _runs = []
+        with open(self.filepath, "r") as file:
+            for each_line in file:
+                try:
+                    _record = json.loads(each_line)
+                except ValueError:
+                    continue
+                if job_identifier is None or _record.get("job_identifier") == job_identifier:
+                    _runs.append(_record)
+        return _runs
+
+    def get(self, run_id: str = None, job_identifier: str = None) -> Optional[Dict]:
+        """ a run by id, the latest run (of the job) by default """
+        _runs = self.runs(job_identifier)
+        if run_id:
+            return next((each_run for each_run in _runs if each_run["run_id"] == run_id), None)
+        return _runs[-1] if _runs else None
+
+
+def _format(value, suffix: str = "", precision: int = 1) -> str:
+    return "-" if value is None else f"{value:.{precision}f}{suffix}"
+
+
+def report_text(record: Dict, top: int = 10) -> str:
+    """ critical path and slowest steps of a run """
+    _steps = {each_step["id"]: each_step for each_step in record["steps"]}
+    _lines = [f"run {record['run_id']} job {record['job_identifier']} started "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record['started_at']))}: "
+              f"{record['seconds']:.1f} seconds, {len(_steps)} steps, "
+              f"sum of steps {sum(each_step['seconds'] for each_step in _steps.values()):.1f} seconds, "
+              f"queue wait {sum(each_step['queue_wait'] for each_step in _steps.values()):.1f} seconds",
+              "",
+              f"critical path {record['critical_path_seconds']:.1f} seconds:"]
+    for _each_id in record["critical_path"]:
+        _step = _steps[_each_id]
+        _lines.append(f"  {_step['seconds']:>8.1f}s  {_step['name']}")
+
+    _lines += ["", f"slowest steps:",
+               f"  {'seconds':>8} {'wait':>7} {'cpu':>7} {'rss MB':>8} {'output':>9} {'exit':>5}  step"]
+    for _step in sorted(_steps.values(), key=lambda step: step["seconds"], reverse=True)[:top]:
+        _lines.append(f"  {_step['seconds']:>8.1f} {_step['queue_wait']:>7.1f} {_format(_step['cpu_seconds']):>7} "
+                      f"{_format(_step['max_rss_mb']):>8} "
+                      f"{_format(None if _step['output_bytes'] is None else _step['output_bytes'] / 1024, 'K', 0):>9} "
+                      f"{'-' if _step['exit_code'] is None else _step['exit_code']:>5}  {_step['name']}"
+                      f"{'' if _step['status'] == 'done' else ' (' + _step['status'] + ')'}")
+    return "\n".join(_lines)
+
+
+def chrome_trace(record: Dict) -> Dict:
+    """ the run in the chrome trace event format (chrome://tracing, perfetto), one row per concurrently running
+        step and the time each step waited before it started
+    """
+    _lanes: List[float] = []
+    _events = []
+    for _step in sorted(record["steps"], key=lambda step: step["start"]):
+        if not _step["end"]:
+            continue
+        # the first row free at the start of the step
+        _lane = next((index for index, each_end in enumerate(_lanes) if each_end <= _step["start"]), len(_lanes))
+        if _lane == len(_lanes):
+            _lanes.append(0.0)
+        _lanes[_lane] = _step["end"]
+        _args = {each_key: _step[each_key] for each_key in ("template_step", "status", "exit_code", "cpu_seconds",
+                                                            "max_rss_mb", "output_bytes", "queue_wait", "error")
+                 if _step[each_key] not in (None, "")}
+        _events.append({"name": _step["name"], "cat": "step", "ph": "X", "pid": 1, "tid": _lane + 1,
+                        "ts": _step["start"] * 1e6, "dur": _step["seconds"] * 1e6, "args": _args})
+        if _step["queue_wait"] > 0:
+            _events.append({"name": f"wait {_step['name']}", "cat": "queue", "ph": "X", "pid": 2, "tid": _lane + 1,
+                            "ts": _step["queued"] * 1e6, "dur": _step["queue_wait"] * 1e6})
+    _events += [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"steps {record['job_identifier']}"}},
+                {"name": "process_name", "ph": "M", "pid": 2, "args": {"name": "queue wait"}}]
+    return {"traceEvents": _events, "displayTimeUnit": "ms", "otherData": {each_key: record[each_key] for each_key in
+                                                                          ("run_id", "job_identifier", "started_at", "seconds")}}
@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import time
+import glob
+import hashlib
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from logging import Logger as Log
+from typing import Dict, Iterable, List, Optional, Union
+
+from _common import _common as _common_
+
+
+__DEFAULT_STEP_CACHE_LOC__ = "~/.deat/step_cache.sqlite"
+__DEFAULT_TTL_SECONDS__ = 7 * 24 * 3600
+__DEFAULT_MAX_ENTRIES__ = 10000
+__DEFAULT_MAX_OUTPUT_BYTES__ = 8 * 1024 * 1024
+__READ_SIZE__ = 1024 * 1024
+# bumped whenever the way a key is computed changes, entries of an older version are never hit again
+__KEY_VERSION__ = 1
+
+_SCHEMA_ = """
+CREATE TABLE IF NOT EXISTS steps (
+    key TEXT PRIMARY KEY,
+    description TEXT,
+    command TEXT,
+    output TEXT,
+    seconds REAL,
+    created_at REAL,
+    used_at REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS steps_used_at ON steps (used_at);
+"""
+
+_ENV_VAR_PATTERN_ = re.compile(r"\$\{?([A-Za-z_][A-Za-z0-9_]*)")
+
+
+@dataclass
+class CachedStep:
+    key: str
+    description: str
+    command: str
+    output: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    created_at: float = 0.0
+
+
+class StepOutput:
+    def __init__(self, max_bytes: int = __DEFAULT_MAX_OUTPUT_BYTES__):
+        """ output of a step being recorded, once it grows beyond max_bytes the lines are dropped and the step is
+            not cached, its output is still streamed to the sink as usual
+
+        Args:
+            max_bytes: maximum size of the recorded output
+        """
+        self.max_bytes = max_bytes
+        self.lines: List[str] = []
+        self.size = 0
+        self.overflow = False
+
+    def append(self, line: str) -> None:
+        if self.overflow:
+            return
+        self.size += len(line.encode("utf-8", "replace"))
+        if self.size > self.max_bytes:
+            self.overflow = True
+            self.lines = []
+        else:
+            self.lines.append(line)
+
+
+def file_digest(filepath: str) -> str:
+    """ sha256 of the content of a file, a missing file has a digest of its own so creating it changes the key """
+    _digest = hashlib.sha256()
+    try:
+        with open(filepath, "rb") as file:
+            while _chunk := file.read(__READ_SIZE__):
+                _digest.update(_chunk)
+    except FileNotFoundError:
+        return "missing"
+    return _digest.hexdigest()
+
+
+def referenced_env_vars(command: Union[str, List[str]]) -> List[str]:
+    """ environment variables a shell command refers to ($NAME or ${NAME}) """
+    return sorted(set(_ENV_VAR_PATTERN_.findall(command if isinstance(command, str) else " ".join(command))))
+
+
+def input_files(inputs: Union[str, List[str], None], working_dir: str = "") -> List[str]:
+    """ files of the _INPUTS_ directive, a comma separated string or a list of paths and glob patterns relative to
+        the working directory
+    """
+    if not inputs:
+        return []
+    if isinstance(inputs, str):
+        inputs = [each_input.strip() for each_input in inputs.split(",") if each_input.strip()]
+    _files = []
+    for _each_input in inputs:
+        _pattern = os.path.join(working_dir, os.path.expanduser(_each_input))
+        _files.extend(sorted(glob.glob(_pattern, recursive=True)) if glob.has_magic(_pattern) else [_pattern])
+    return _files
+
+
+def step_key(command: Union[str, List[str]],
+             env_vars: Dict,
+             working_dir: str = "",
+             inputs: Union[str, List[str], None] = None,
+             env_var_names: Iterable[str] = ()) -> str:
+    """ content address of a step, the same command run with the same environment in the same directory on the same
+        input files has the same key whatever the job it belongs to
+
+    Args:
+        command: rendered command
+        env_vars: environment of the step
+        working_dir: working directory of the step
+        inputs: files the step reads, see input_files
+        env_var_names: environment variables part of the key on top of the ones the command refers to
+
+    Returns: hex digest
+
+    """
+    _names = set(referenced_env_vars(command)) | set(env_var_names)
+    _key = {
+        "version": __KEY_VERSION__,
+        "command": command,
+        "env": {each_name: str(env_vars.get(each_name, "")) for each_name in sorted(_names)},
+        "working_dir": working_dir or "",
+        "inputs": {each_file: file_digest(each_file) for each_file in input_files(inputs, working_dir)},
+    }
+    return hashlib.sha256(json.dumps(_key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class StepCache:
+    def __init__(self,
+                 db_filepath: str = __DEFAULT_STEP_CACHE_LOC__,
+                 ttl_seconds: float = __DEFAULT_TTL_SECONDS__,
+                 max_entries: int = __DEFAULT_MAX_ENTRIES__,
+                 logger: Log = None):
+        """ results of successful steps keyed by step_key, a step whose key is found is skipped and its recorded
+            output is replayed. entries expire after ttl_seconds and the least recently used ones are evicted
+            beyond max_entries
+
+        Args:
+            db_filepath: sqlite file, :memory: keeps the cache in process
+            ttl_seconds: seconds an entry stays valid after it was recorded
+            max_entries: maximum number of entries
+            logger: logger object
+        """
+        self.logger = logger
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.db_filepath = db_filepath if db_filepath == ":memory:" else os.path.expanduser(db_filepath)
+        if self.db_filepath != ":memory:" and (_dirpath := os.path.dirname(self.db_filepath)):
+            os.makedirs(_dirpath, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.db_filepath, check_same_thread=False, isolation_level=None)
+        if self.db_filepath != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA_)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get(self, key: str) -> Optional[CachedStep]:
+        _now = time.time()
+        with self._lock:
+            _row = self._conn.execute("SELECT key, description, command, output, seconds, created_at FROM steps "
+                                      "WHERE key = ? AND created_at >= ?", (key, _now - self.ttl_seconds)).fetchone()
+            if _row is None:
+                return None
+            self._conn.execute("UPDATE steps SET used_at = ? WHERE key = ?", (_now, key))
+        return CachedStep(key=_row[0], description=_row[1], command=_row[2], output=json.loads(_row[3]),
+                          seconds=_row[4], created_at=_row[5])
+
+    def put(self, key: str, description: str, command: Union[str, List[str]], output: List[str], seconds: float) -> None:
+        _now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (key, description, command if isinstance(command, str) else " ".join(command),
+                                json.dumps(output), seconds, _now, _now))
+        self.evict()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM steps WHERE key = ?", (key,))
+
+    def evict(self) -> int:
+        """ drop the expired entries then the least recently used ones beyond max_entries
+
+        Returns: number of entries dropped
+
+        """
+        with self._lock:
+            _dropped = self._conn.execute("DELETE FROM steps WHERE created_at < ?", (time.time() - self.ttl_seconds,)).rowcount
+            if (_excess := self._conn.execute("SELECT COUNT(*) FROM steps").fetchone()[0] - self.max_entries) > 0:
+                _dropped += self._conn.execute("DELETE FROM steps WHERE key IN (SELECT key FROM steps ORDER BY used_at LIMIT ?)",
+                                               (_excess,)).rowcount
+        if _dropped:
+            _common_.info_logger(f"{_dropped} entries evicted from the step cache", logger=self.logger)
+        return _dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM steps")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM steps").fetchone()[0]
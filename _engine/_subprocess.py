@@ -1,5 +1,6 @@
 import os
-from typing import Dict
+import time
+from typing import Dict, List, Tuple, Union
 import subprocess
 import threading
 from inspect import currentframe
@@ -7,7 +8,6 @@ from os import environ, path
 from logging import Logger as Log
 
 from networkx import topological_sort
-from tenacity import sleep
 from _config import config as _config_
 
 from _common import _common as _common_
@@ -16,15 +16,25 @@ from _util import _util_file as _util_file_
 from _error_handling import _error_handling
 from concurrent.futures import as_completed, ThreadPoolExecutor
 from typing import Callable
+from collections import Counter
+from _engine import _dag_executor as _dag_executor_
+from _engine import _output_pump as _output_pump_
+from _engine import _step_cache as _step_cache_
+from _engine import _admission as _admission_
+from _engine import _run_history as _run_history_
 
 
-__WAIT_TIME__ = 5
-
 class ShellRunner:
 
     def __init__(self, profile_name: str):
         self._config = _config_.ConfigSingleton(profile_name)
         self.process_name = "shell_runner"
+        self._cache = None
+        self._cache_lock = threading.Lock()
+        self._admission = None
+        # commands running in a session of their own, Ctrl-C does not reach them and they are killed explicitly
+        self._processes = set()
+        self._processes_lock = threading.Lock()
 
 
     # @_common_.exception_handler
@@ -166,7 +176,9 @@ class ShellRunner:
                      timeout,
                      error_handle,
                      ignore_errors: bool = False,
-                     logger: Log = None) -> str:
+                     logger: Log = None,
+                     on_result: Callable[[_output_pump_.PumpResult], None] = None,
+                     on_line: Callable[[str], None] = None) -> str:
         """
 
         Args:
@@ -176,119 +188,47 @@ class ShellRunner:
             error_handle: error handling object, responsive for error detection and recovery
             ignore_errors: the process will not abort even encounter error
             logger: logger object
+            on_result: function receiving the result of the command (return code, tail of the output)
+            on_line: function receiving every line of the output, on top of the sink
 
         Returns:
 
         """
 
-        # def display_output(output: str) -> None:
-        #     for line in iter(process.stdout.readline, ""):
-        #         _common_.info_logger(line.strip())
-        #     process.stdout.close()
-
-        def monitor_process(process,
-                            timeout: int,
-                            logger: Log = None) -> None:
-            try:
-                # process.wait(timeout=timeout)
-                for line in iter(process.stdout.readline, ""):
-                    _common_.info_logger(line.strip())
-
-                # process.stdout.close()
-
-            except subprocess.TimeoutExpired:
-                _common_.info_logger(f"timeout is set to {timeout} and process {process.pid} exceeded {timeout} seconds.  killing the process...", logger=logger)
-                process.kill()
+        # output is read in binary and pumped without blocking, only the tail of each stream is kept in memory
+        _command_parameter = {each_key: each_value for each_key, each_value in command_parameter.items()
+                              if each_key not in ("text", "universal_newlines")}
+        _command_parameter.setdefault("start_new_session", True)
+        output_sink = self._output_sink(logger=logger)
+        sink = _output_pump_.tee_sink(output_sink, on_line) if on_line else output_sink
 
-        #     def display_output(output: str) -> None:
-        #         for line in iter(process.stdout.readline, ""):
-        #             _common_.info_logger(line.strip())
-        #         process.stdout.close()
-        #
-        #     # run the command
-        #     # from pprint import pprint
-        #     # pprint(command_parameter.get("env"))
-        #     #
-        #     # print(command_parameter.get("env", {}).get("SHELL"))
-        #
-        #     # test_command(command, _command_parameter.get("env"))
-        #
-        #     # exit(0)
-        #
-        #
-        #
-        #     process = subprocess.Popen(**command_parameter)
-        #     t = threading.Thread(target=display_output,
-        #                          args=(process.stdout,))
         try:
-            process = subprocess.Popen(**command_parameter)
-            monitor_thread = threading.Thread(target=monitor_process,  args=(process, timeout, logger))
-            monitor_thread.start()
-            error_message = ""
-            stdout_lines = []
-            stderr_lines = []
+            process = subprocess.Popen(**_command_parameter)
+            with self._processes_lock:
+                self._processes.add(process)
             try:
-                while process.poll() is None:
-                    if process.stdout:
-                        _current_output = process.stdout.readline()
-                        line = _current_output.decode("utf-8") if isinstance(_current_output, bytes) else _current_output
-                        if line:
-                            stderr_lines.append(line.strip())
-                            _common_.info_logger("STDOUT: " + line.strip())
-                    if process.stderr:
-                        _current_error = process.stderr.readline()
-                        line = _current_error.decode("utf-8") if isinstance(_current_error, bytes) else _current_error
-                        if line:
-                            stderr_lines.append(line.strip())
-                            _common_.info_logger("STDERR: " + line.strip())
-
-                _common_.info_logger(stderr_lines)
-
+                result = _output_pump_.pump(process,
+                                            timeout=timeout,
+                                            sink=sink,
+                                            tail_lines=int(self._config.config.get("SHELL_OUTPUT_TAIL_LINES") or _output_pump_.__DEFAULT_TAIL_LINES__),
+                                            logger=logger)
             except Exception as err:
+                _output_pump_.kill_process(process)
                 _common_.error_logger(currentframe().f_code.co_name,
                                       f"error during process command: {err}",
                                       logger=logger,
                                       mode="error",
                                       ignore_flag=False)
-
-
-            monitor_thread.join()
-            try:
-                stdout, stderr = process.communicate()
-                stdout_lines.extend(stdout.decode().splitlines() if isinstance(stdout, bytes) else stdout.splitlines())
-                stderr_lines.extend(stderr.decode().splitlines() if isinstance(stderr, bytes) else stderr.splitlines())
-            except Exception as err:
-                _common_.error_logger(currentframe().f_code.co_name,
-                                      f"error after process command: {err}",
-                                      logger=logger,
-                                      mode="error",
-                                      ignore_flag=False)
-            return_code = process.returncode
-            if return_code != 0:
-                _common_.info_logger(f"return code is {return_code}")
-                error_message = "\n".join(stderr_lines)
-                command_status_after_retry = False
-                if error_message:
-                    _common_.info_logger(f"Error occurred: {error_message}")
-                    recover_method = {
-                        "process_name": "shell_runner",
-                        "error_message": error_message
-                    }
-                    # error_handle.add_recovery_method(recover_method)
-                    _common_.info_logger(error_handle.solution_search(error_message))
-                    command_status_after_retry = False
-                if not command_status_after_retry:
-                    if ignore_errors:
-                        _common_.info_logger("ignore error turned on, continuing next command... ")
-                    else:
-                        _common_.error_logger(currentframe().f_code.co_name,
-                                              f"{command_parameter.get('args')} {error_message}",
-                                              logger=logger,
-                                              mode="error",
-                                              ignore_flag=False)
-                # return {"return_code": return_code,
-                #         "stdout": stdout_lines,
-                #         "stderr": stderr_lines}
+            finally:
+                with self._processes_lock:
+                    self._processes.discard(process)
+                if isinstance(output_sink, _output_pump_.FileSink):
+                    output_sink.close()
+
+            if on_result:
+                on_result(result)
+            error_message = self._check_result(command_parameter, result, timeout, error_handle,
+                                               ignore_errors=ignore_errors, logger=logger)
             return process, error_message
 
         except Exception as err:
@@ -298,6 +238,63 @@ class ShellRunner:
                                   mode="error",
                                   ignore_flag=False)
 
+    def kill_running(self) -> None:
+        """ kill every command still running, with the processes they started """
+        with self._processes_lock:
+            _processes = list(self._processes)
+        for _each_process in _processes:
+            _output_pump_.kill_process(_each_process)
+
+    def _check_result(self,
+                      command_parameter: Dict,
+                      result: _output_pump_.PumpResult,
+                      timeout,
+                      error_handle,
+                      ignore_errors: bool = False,
+                      logger: Log = None) -> str:
+        """ report a failed command (non zero return code or timeout), the error message is the tail of its output
+
+        Returns: the error message, empty if the command succeeded
+
+        """
+        error_message = ""
+        return_code = result.return_code
+        if return_code != 0 or result.timed_out:
+            _common_.info_logger(f"return code is {return_code}")
+            error_message = "\n".join(result.tail)
+            if result.timed_out:
+                error_message = f"{error_message}\nprocess killed after exceeding the timeout of {timeout} seconds".strip()
+            command_status_after_retry = False
+            if error_message:
+                _common_.info_logger(f"Error occurred: {error_message}")
+                recover_method = {
+                    "process_name": "shell_runner",
+                    "error_message": error_message
+                }
+                _common_.info_logger(error_handle.solution_search(error_message))
+                command_status_after_retry = False
+            if not command_status_after_retry:
+                if ignore_errors:
+                    _common_.info_logger("ignore error turned on, continuing next command... ")
+                else:
+                    _common_.error_logger(currentframe().f_code.co_name,
+                                          f"{command_parameter.get('args')} {error_message}",
+                                          logger=logger,
+                                          mode="error",
+                                          ignore_flag=False)
+        return error_message
+
+    def _output_sink(self, logger: Log = None):
+        """ where the output of a command goes, SHELL_OUTPUT_LOG in the profile is either all (echo every line,
+            the default), none (only the tail is kept for the error message) or a filepath the lines are appended to
+        """
+        output_log = str(self._config.config.get("SHELL_OUTPUT_LOG") or "all")
+        if output_log.lower() == "all":
+            return _output_pump_.log_sink(logger=logger)
+        if output_log.lower() == "none":
+            return None
+        return _output_pump_.FileSink(output_log)
+
 
 
     # @_common_.exception_handler
@@ -428,6 +425,76 @@ class ShellRunner:
 
 
 
+    def _prepare_command(self,
+                         profile_name: str,
+                         command,
+                         shell_mode: bool = True,
+                         env_vars: Dict = None,
+                         directive: Dict = None) -> Tuple[Dict, bool, bool]:
+        """ build the process parameters of a command, the environment of the runner is merged with env_vars and
+            the runner settings (DRY_RUN, _IGNORE_ERROR, ...) are taken out of it
+
+        Args:
+            profile_name: profile name
+            command: command to run
+            shell_mode: shell mode
+            env_vars: environment variables
+            directive: special instruction to facilitate shell commands
+
+        Returns: a tuple of (process parameters, dry run flag, ignore errors flag)
+
+        """
+        directive = directive or {}
+        env = environ.copy()
+        if env_vars:
+            env.update(env_vars)
+        env_vars = env
+
+        _command_parameter = {
+            "args": command,
+            "stdout": subprocess.PIPE,
+            "stderr": subprocess.PIPE,
+            "universal_newlines": True,
+            "text": True,
+            "shell": shell_mode,
+            "env": env_vars
+        }
+
+        if is_content := directive.get("_WORKING_DIR_", ""):
+            _command_parameter["cwd"] = is_content
+
+        dry_run_flag = True
+        if isinstance(env_vars.get("DRY_RUN"), bool):
+            dry_run_flag = env_vars.get("DRY_RUN")
+        elif isinstance(env_vars.get("DRY_RUN"), str):
+            dry_run_flag = False if env_vars.get("DRY_RUN").lower() == "false" else True
+
+        ignore_errors = env_vars.get("_IGNORE_ERROR", False) if isinstance(env_vars.get("_IGNORE_ERROR"), bool) else False
+
+        from _error_handling import _validation
+
+        if "DRY_RUN" in env_vars:
+            del env_vars["DRY_RUN"]
+        if "COMMAND_INT_WAIT" in env_vars:
+            del env_vars["COMMAND_INT_WAIT"]
+        if "COMMAND_PARAM_AUTO_FIX" in env_vars:
+            del env_vars["COMMAND_PARAM_AUTO_FIX"]
+        if "_IGNORE_ERROR" in env_vars:
+            del env_vars["_IGNORE_ERROR"]
+        if "TOKENIZERS_PARALLELISM" in env_vars:
+            del env_vars["TOKENIZERS_PARALLELISM"]
+
+        env_vars["SHELL"] = "/bin/zsh"
+        env_vars = _validation.val_auto_fix_all_string(profile_name=profile_name,
+                                                       data_dict=env_vars)
+        _command_parameter["env"] = env_vars
+
+        if directive.get("_IGNORE_ERROR_") is True:
+            _common_.info_logger(f"setting ignore error to {directive.get('_IGNORE_ERROR_')} ")
+            ignore_errors = directive.get("_IGNORE_ERROR_")
+
+        return _command_parameter, dry_run_flag, ignore_errors
+
     @_common_.exception_handler
     def run_command(self,
                     profile_name: str,
@@ -516,68 +583,13 @@ class ShellRunner:
         #     env.update(env_vars)
 
 
-        env = environ.copy()
-        if env_vars:
-            env.update(env_vars)
-        env_vars = env
-
-        _command_parameter = {
-            "args": command,
-            "stdout": subprocess.PIPE,
-            "stderr": subprocess.PIPE,
-            "universal_newlines": True,
-            "text": True,
-            "shell": shell_mode,
-            "env": env_vars
-        }
-
-        if is_content := directive.get("_WORKING_DIR_", ""):
-            _command_parameter["cwd"] = is_content
-
-        dry_run_flag = True
-        if isinstance(env_vars.get("DRY_RUN"), bool):
-            dry_run_flag = env_vars.get("DRY_RUN")
-        elif isinstance(env_vars.get("DRY_RUN"), str):
-            dry_run_flag = False if env_vars.get("DRY_RUN").lower() == "false" else True
-
-        ignore_errors = env_vars.get("_IGNORE_ERROR", False) if isinstance(env_vars.get("_IGNORE_ERROR"), bool) else False
-
-        from _error_handling import _validation
-
-        if "DRY_RUN" in env_vars:
-            del env_vars["DRY_RUN"]
-        if "COMMAND_INT_WAIT" in env_vars:
-            del env_vars["COMMAND_INT_WAIT"]
-        if "COMMAND_PARAM_AUTO_FIX" in env_vars:
-            del env_vars["COMMAND_PARAM_AUTO_FIX"]
-        if "_IGNORE_ERROR" in env_vars:
-            del env_vars["_IGNORE_ERROR"]
-        if "TOKENIZERS_PARALLELISM" in env_vars:
-            del env_vars["TOKENIZERS_PARALLELISM"]
-
-        # print(ignore_errors)
-        #
-        # exit(0)
-
-        env_vars["SHELL"] = "/bin/zsh"
-        env_vars = _validation.val_auto_fix_all_string(profile_name=profile_name,
-                                                       data_dict=env_vars)
-        _command_parameter["env"] = env_vars
+        _command_parameter, dry_run_flag, ignore_errors = self._prepare_command(profile_name,
+                                                                                command,
+                                                                                shell_mode=shell_mode,
+                                                                                env_vars=env_vars,
+                                                                                directive=directive)
         result = None
 
-        # print("AAA", directive)
-        # print("BBB", _command_parameter)
-
-        # exit(0)
-
-        if directive.get("_IGNORE_ERROR_") is True:
-            _common_.info_logger(f"setting ignore error to {directive.get('_IGNORE_ERROR_')} ")
-            ignore_errors = directive.get("_IGNORE_ERROR_")
-        # print(dry_run_flag)
-        # print(_command_parameter.get('args'))
-
-        # exit(0)
-
         print(f"time limit for each process: {timeout}")
 
         if dry_run_flag:
@@ -607,7 +619,9 @@ class ShellRunner:
                     command_parameter=_command_parameter,
                     timeout=timeout,
                     error_handle=error_handle,
-                    ignore_errors=ignore_errors
+                    ignore_errors=ignore_errors,
+                    on_result=kwargs.get("on_result"),
+                    on_line=kwargs.get("on_line")
                 )
 
 
@@ -676,21 +690,25 @@ class ShellRunner:
         # return process, error_message
 
     @_common_.exception_handler
-    def run_command_from_dag(self, profile_name: str, dag, logger: Log = None, *args, **kwargs, ) -> None:
-        """ facilitate  shell commands and
+    def run_command_from_dag(self, profile_name: str, dag, logger: Log = None, *args, **kwargs, ) -> _dag_executor_.DagReport:
+        """ run the steps of the dag, independent steps run concurrently on a bounded pool
 
         Args:
             profile_name: profile name
             dag: command to run
 
-        Returns:
+        Returns: the run report with the timing of each step and the critical path
 
         Note:
             kwargs includes:
-            timeout: timeout in seconds
-            env_vars: environment variables
+            timeout: timeout in seconds, _TIMEOUT_ of a step takes precedence
+            env_vars: environment variables, COMMAND_INT_WAIT sets a minimum gap in seconds between step launches
             shell_mode: shell mode
             directive: special instruction to facilitate shell commands
+            max_workers: number of steps running at the same time, defaults to DAG_MAX_WORKERS in the profile
+
+            a step starts once the resources of its _RESOURCE_ directive ("redshift_unload=1, memory_mb=4000") are
+            available, within RESOURCE_LIMITS and RESOURCE_RATES of the profile
 
         """
 
@@ -706,77 +724,180 @@ class ShellRunner:
 
         _config = _config_.ConfigSingleton()
 
+        # steps run as soon as their upstream steps are done, COMMAND_INT_WAIT is an opt-in minimum gap between
+        # two step launches, by default ready steps are launched immediately
+        max_workers, throttle = self._dag_settings(_config, env_vars, max_workers=kwargs.get("max_workers"))
 
+        # a template step made of several commands is complete once all of its commands are done
+        remaining_commands = Counter(self._step_progress_key(_config, each_command) for each_command in dag.nodes)
 
-        # detect circular dependency in the graph
-        # run jobs in the order in the graph
-
-        for each_command in topological_sort(dag):
-            # print(each_command.environment_variables, env_vars)
-            # print(each_command.metadata, directive)
-            environment_variable = {**each_command.environment_variables, **env_vars}
-            # print(environment_variable)
-            # print(each_command.metadata)
-            # print(each_command.command)
-            #
-            # exit(0)
-
-            # directive = {**each_command.metadata, **directive}
-            # self.run_command(command=each_command.command,
-            #             timeout=timeout,
-            #             shell_mode=shell_mode,
-            #             env_vars=environment_variable,
-            #             directive=directive)
-
-            # print("AAAA")
-            # exit(0)
-            timeout = int(each_command.metadata.get("_TIMEOUT_")) if each_command.metadata.get("_TIMEOUT_") else timeout
-            self.run_command(profile_name=profile_name,
-                             command=each_command.command,
-                             timeout=timeout,
-                             shell_mode=shell_mode,
-                             env_vars=environment_variable,
-                             directive=each_command.metadata)
-
-            # _config.config["__job_progress__"] = progress
-            # if not _config.config.get("RUNNER_JOB_ID"):
-            #     _config.config["RUNNER_JOB_ID"] = uuid4().hex[:10]
-
-            print(each_command.description)
-
-            # _progress.data["__job_progress__"] = _job_progress.JobProgress()
-            #
-            # if not _config.config.get("RUNNER_JOB_ID"):
-            #     _config.config["RUNNER_JOB_ID"] = uuid4().hex[:10]
-            #
-            # for command_num, commands in template_content.items():
-            #     if job_identifier := _config.config.get("RUNNER_JOB_ID") and (
-            #     _progress.data["__job_progress__"].get(job_identifier, {}).get(command_num, False)):
-            #         _common_.info_logger(f"this task already completed successfully, skipping...")
-            #         continue
-            from _job_progress._job_progress import JobProgressSingleton
-            _progress = JobProgressSingleton()
-
-            if pr := _progress.data.get("__job_progress__"):
-                if _config.config.get("JOB_IDENTIFIER") in pr.progress:
-                    pr.progress[_config.config.get("JOB_IDENTIFIER")][each_command.description] = True
-                else:
-                    pr.progress[_config.config.get("JOB_IDENTIFIER")] = {each_command.description: True}
-                _util_file_.json_dump(_config.config.get("JOB_PROGRESS_DEFAULT_LOC"), pr.progress)
-            else:
-                _common_.error_logger(currentframe().f_code.co_name,
-                                      f"internal error!! progress object is not found",
-                                      logger=logger,
-                                      mode="error",
-                                      ignore_flag=False)
+        report = _dag_executor_.DagReport.for_dag(dag, self._step_name)
 
+        def run_step(each_command) -> str:
+            step_parameters = self._step_parameters(profile_name, each_command, timeout, shell_mode, env_vars)
+            if (cache_key := self._step_cache_key(each_command, step_parameters)) and self._replay_step(cache_key, logger=logger):
+                return ""
+            results, output, start_time = [], self._step_output(cache_key), time.perf_counter()
+            try:
+                outcome = self.run_command(**step_parameters, on_result=results.append, on_line=output.append if output is not None else None)
+            finally:
+                if results:
+                    report.timings[each_command].record_usage(results[-1])
+            self._record_step(cache_key, each_command, results, output, time.perf_counter() - start_time, logger=logger)
+            return outcome
 
+        try:
+            return _dag_executor_.DagExecutor(max_workers=max_workers,
+                                              throttle=throttle,
+                                              admission=self._admission_controller(logger=logger),
+                                              logger=logger).run(dag,
+                                                                 run_step,
+                                                                 on_complete=lambda each_command: self._mark_step_complete(_config, remaining_commands, each_command, logger=logger),
+                                                                 priority=self._step_priority,
+                                                                 describe=self._step_name,
+                                                                 resources=self._step_resources,
+                                                                 report=report,
+                                                                 on_abort=self.kill_running)
+        finally:
+            self._save_run(report, _config, profile_name, logger=logger)
+
+    @staticmethod
+    def _dag_settings(config: _config_.ConfigSingleton, env_vars: Dict, max_workers: int = None) -> Tuple[int, float]:
+        """ number of steps running at the same time and minimum gap in seconds between two step launches """
+        return (int(max_workers or config.config.get("DAG_MAX_WORKERS") or _dag_executor_.__DEFAULT_MAX_WORKERS__),
+                float(env_vars.get("COMMAND_INT_WAIT") or config.config.get("COMMAND_INT_WAIT") or 0))
+
+    @staticmethod
+    def _step_parameters(profile_name: str, each_command, timeout: int, shell_mode: bool, env_vars: Dict) -> Dict:
+        return {"profile_name": profile_name,
+                "command": each_command.command,
+                "timeout": int(each_command.metadata.get("_TIMEOUT_") or timeout),
+                "shell_mode": shell_mode,
+                "env_vars": {**each_command.environment_variables, **env_vars},
+                "directive": each_command.metadata}
+
+    @staticmethod
+    def _step_priority(each_command) -> float:
+        return float(each_command.metadata.get("_PRIORITY_") or 0)
+
+    @staticmethod
+    def _step_resources(each_command) -> Dict[str, float]:
+        return _admission_.parse_resources(each_command.metadata.get("_RESOURCE_"))
+
+    def _admission_controller(self, logger: Log = None) -> _admission_.AdmissionController:
+        """ limits of the resources declared by the steps with _RESOURCE_, shared by every dag the runner runs """
+        with self._cache_lock:
+            if self._admission is None:
+                self._admission = _admission_.AdmissionController.from_config(self._config, logger=logger)
+            return self._admission
+
+    @staticmethod
+    def _step_name(each_command) -> str:
+        return f"{each_command.description}: {each_command.command}"
+
+    @staticmethod
+    def _step_progress_key(config: _config_.ConfigSingleton, each_command) -> Tuple[str, str]:
+        """ job and template step a command belongs to, a dag merging the flows of several models carries the job
+            identifier of its model in the environment of each step
+        """
+        return (each_command.environment_variables.get("JOB_IDENTIFIER") or config.config.get("JOB_IDENTIFIER"),
+                each_command.description)
+
+    @classmethod
+    def _mark_step_complete(cls, config: _config_.ConfigSingleton, remaining_commands: Counter, each_command, logger: Log = None) -> None:
+        """ record the template step as done in the job progress once the last of its commands completed """
+        print(each_command.description)
+        job_identifier, description = progress_key = cls._step_progress_key(config, each_command)
+        remaining_commands[progress_key] -= 1
+        if remaining_commands[progress_key] > 0:
+            return
 
-            sleep(env_vars.get("COMMAND_INT_WAIT", __WAIT_TIME__))
+        from _job_progress._job_progress import JobProgressSingleton
+        _progress = JobProgressSingleton()
 
+        if pr := _progress.data.get("__job_progress__"):
+            pr.mark(job_identifier, description, logger=logger)
+        else:
+            _common_.error_logger(currentframe().f_code.co_name,
+                                  f"internal error!! progress object is not found",
+                                  logger=logger,
+                                  mode="error",
+                                  ignore_flag=False)
 
-            # print(each_command.description, environment_variable, directive)
+    def _step_cache(self) -> _step_cache_.StepCache:
+        with self._cache_lock:
+            if self._cache is None:
+                self._cache = _step_cache_.StepCache(self._config.config.get("STEP_CACHE_LOC") or _step_cache_.__DEFAULT_STEP_CACHE_LOC__,
+                                                     ttl_seconds=float(self._config.config.get("STEP_CACHE_TTL") or _step_cache_.__DEFAULT_TTL_SECONDS__),
+                                                     max_entries=int(self._config.config.get("STEP_CACHE_MAX_ENTRIES") or _step_cache_.__DEFAULT_MAX_ENTRIES__))
+            return self._cache
+
+    def _step_cache_key(self, each_command, step_parameters: Dict) -> Union[str, None]:
+        """ cache key of a step, None when the step is not cached. caching is turned on for the profile with
+            STEP_CACHE_ENABLED or for one step with the _CACHE_ directive, which also turns it off for a step.
+            directives are never cached, the files of _INPUTS_ and the variables of STEP_CACHE_ENV_VARS are
+            part of the key
+        """
+        directive = each_command.metadata
+        if (enabled := directive.get("_CACHE_")) is None:
+            enabled = self._config.config.get("STEP_CACHE_ENABLED", False)
+        if str(enabled).lower() != "true" or directive.get("_RUN_DIRECTIVE_") or step_parameters.get("command") in (None, "", "ECHO1"):
+            return None
+        if isinstance(env_var_names := self._config.config.get("STEP_CACHE_ENV_VARS") or [], str):
+            env_var_names = [each_name.strip() for each_name in env_var_names.split(",") if each_name.strip()]
+        return _step_cache_.step_key(step_parameters.get("command"),
+                                     step_parameters.get("env_vars", {}),
+                                     working_dir=directive.get("_WORKING_DIR_", ""),
+                                     inputs=directive.get("_INPUTS_"),
+                                     env_var_names=env_var_names)
+
+    def _step_output(self, cache_key: Union[str, None]) -> Union[_step_cache_.StepOutput, None]:
+        """ recorder of the output of a cached step, STEP_CACHE_MAX_OUTPUT_BYTES in the profile caps its size """
+        if not cache_key:
+            return None
+        return _step_cache_.StepOutput(int(self._config.config.get("STEP_CACHE_MAX_OUTPUT_BYTES") or _step_cache_.__DEFAULT_MAX_OUTPUT_BYTES__))
+
+    def _replay_step(self, cache_key: str, logger: Log = None) -> bool:
+        """ replay the recorded output of a step whose inputs are unchanged
+
+        Returns: True if the step was found in the cache and does not have to run
 
+        """
+        if (cached_step := self._step_cache().get(cache_key)) is None:
+            return False
+        _common_.info_logger(f"{cached_step.description}: inputs unchanged since "
+                             f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(cached_step.created_at))}, "
+                             f"skipping {cached_step.command} ({cached_step.seconds:.1f} seconds saved)", logger=logger)
+        if sink := self._output_sink(logger=logger):
+            for each_line in cached_step.output:
+                sink("cached", each_line)
+            if isinstance(sink, _output_pump_.FileSink):
+                sink.close()
+        return True
+
+    def _record_step(self, cache_key: Union[str, None], each_command, results: List[_output_pump_.PumpResult],
+                     output: Union[_step_cache_.StepOutput, None], seconds: float, logger: Log = None) -> None:
+        """ record a step which succeeded with its full output, the lines of stdout and stderr interleaved. a failed
+            step (ignored error included), a dry run or a step whose output is over the cap is never recorded
+        """
+        if cache_key and output is not None and results and all(each_result.return_code == 0 and not each_result.timed_out for each_result in results):
+            if output.overflow:
+                _common_.info_logger(f"{each_command.description}: output over {output.max_bytes} bytes, not cached", logger=logger)
+                return
+            self._step_cache().put(cache_key, each_command.description, each_command.command, output.lines, seconds)
+
+    def _save_run(self, report: _dag_executor_.DagReport, config: _config_.ConfigSingleton, profile_name: str, logger: Log = None) -> None:
+        """ append the timing and resource usage of each step of the run to the run history, RUN_HISTORY_LOC in the
+            profile (~/.deat/run_history.jsonl by default, none turns it off). see run_history.py for the reports
+        """
+        if not report.started_at or str(history_loc := self._config.config.get("RUN_HISTORY_LOC") or _run_history_.__DEFAULT_RUN_HISTORY_LOC__).lower() == "none":
+            return
+        try:
+            _run_history_.RunHistory(history_loc).append(_run_history_.run_record(report,
+                                                                                 job_identifier=config.config.get("JOB_IDENTIFIER", ""),
+                                                                                 profile_name=profile_name))
+        except OSError as err:
+            _common_.info_logger(f"run history not saved in {history_loc}: {err}", logger=logger)
 
     def run_from_template(self, template) -> str:
         pass
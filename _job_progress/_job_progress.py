@@ -1,12 +1,23 @@
+import os
+import json
+import time
+import fcntl
+import threading
 from os import path
+from contextlib import contextmanager
 from inspect import currentframe
 from logging import Logger as Log
+from typing import Set
 from _common import _common as _common_
 from _config import config as _config_
 from _util import _util_file as _util_file_
 from collections import defaultdict
 
 
+# the journal is folded into the snapshot once it holds this many records
+__COMPACT_EVERY__ = 1000
+
+
 class JobProgressSingleton:
     def __new__(cls):
         if not hasattr(cls, "instance"):
@@ -21,23 +32,70 @@ class JobProgressSingleton:
 
 class JobProgress:
     def __init__(self):
+        """ progress of the steps of each job. JOB_PROGRESS_DEFAULT_LOC is a json snapshot {job: {step: status}}
+            and every step completed since the last compaction is a line appended to the journal next to it
+            (JOB_PROGRESS_DEFAULT_LOC.journal), so recording a step costs one small append whatever the number of
+            jobs. the journal is folded into the snapshot, written to a temporary file and renamed, every
+            JOB_PROGRESS_COMPACT_EVERY records. a crash leaves either the old or the new snapshot and at worst a
+            partial last journal line, which is skipped. appends and compactions hold a file lock, parallel steps
+            and concurrent jobs can record progress at the same time
+        """
         self._config = _config_.ConfigSingleton()
         self.progress = {}
+        self._lock = threading.RLock()
+        self._journal_records = 0
+        self.compact_every = int(self._config.config.get("JOB_PROGRESS_COMPACT_EVERY") or __COMPACT_EVERY__)
         self.load()
 
+    @property
+    def snapshot_loc(self) -> str:
+        return self._config.config.get("JOB_PROGRESS_DEFAULT_LOC")
+
+    @property
+    def journal_loc(self) -> str:
+        return f"{self.snapshot_loc}.journal"
+
+    @contextmanager
+    def _file_lock(self):
+        """ exclusive lock shared by every process recording progress in the same location """
+        with self._lock, open(f"{self.snapshot_loc}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _apply(self, job_identifier: str, command_num: str, status) -> None:
+        if job_identifier not in self.progress:
+            self.progress[job_identifier] = {command_num: status}
+        else:
+            self.progress[job_identifier][command_num] = status
+
+    def _read(self) -> None:
+        self.progress, self._journal_records = {}, 0
+        if _util_file_.is_file_exist(self.snapshot_loc) and not _util_file_.is_file_empty(self.snapshot_loc):
+            for job_identifier, value in _util_file_.json_load(self.snapshot_loc).items():
+                for command_num, status in value.items():
+                    self._apply(job_identifier, command_num, status)
+        if path.isfile(self.journal_loc):
+            with open(self.journal_loc, "r") as file:
+                for each_line in file:
+                    try:
+                        _record = json.loads(each_line)
+                    except ValueError:
+                        # partial line of an append interrupted by a crash, the step is simply not recorded
+                        continue
+                    self._apply(_record["job"], _record["step"], _record["status"])
+                    self._journal_records += 1
+
     def load(self, logger: Log = None):
 
         if default_loc := self._config.config.get("JOB_PROGRESS_DEFAULT_LOC"):
             _dirpath, _filepath = path.split(default_loc)
             from _util import _util_directory as _util_dir_
             _util_dir_.create_directory(_dirpath)
-            if _util_file_.is_file_exist(default_loc) and not _util_file_.is_file_empty(default_loc):
-                for job_identifier, value in _util_file_.json_load(default_loc).items():
-                    for command_num, status in value.items():
-                        if job_identifier not in self.progress:
-                            self.progress[job_identifier] = {command_num: status}
-                        else:
-                            self.progress[job_identifier][command_num] = status
+            with self._file_lock():
+                self._read()
         else:
             _common_.error_logger(currentframe().f_code.co_name,
                                   "Job progress location is not found",
@@ -45,15 +103,77 @@ class JobProgress:
                                   mode="error",
                                   ignore_flag=False)
 
-    def save(self, logger: Log = None):
-        if default_loc := self._config.config.get("JOB_PROGRESS_DEFAULT_LOC"):
-            _util_file_.json_dump(default_loc, self.progress)
-        else:
+    def mark(self, job_identifier: str, command_num: str, status=True, logger: Log = None) -> None:
+        """ record the status of a step, one line appended to the journal
+
+        Args:
+            job_identifier: job identifier
+            command_num: name of the step in the template
+            status: status of the step, True once completed
+            logger: logger object
+        """
+        if not self.snapshot_loc:
             _common_.error_logger(currentframe().f_code.co_name,
                                   "Job progress location is not found",
                                   logger=logger,
                                   mode="error",
                                   ignore_flag=False)
 
+        _line = json.dumps({"job": job_identifier, "step": command_num, "status": status, "time": time.time()}) + "\n"
+        with self._file_lock():
+            # a single write on a file opened in append mode, the line lands whole after the lines of other writers
+            _fd = os.open(self.journal_loc, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                # after a crash mid append the partial line is closed first, so it does not swallow this record
+                if (_size := os.fstat(_fd).st_size) and os.pread(_fd, 1, _size - 1) != b"\n":
+                    _line = "\n" + _line
+                os.write(_fd, _line.encode("utf-8"))
+                os.fsync(_fd)
+            finally:
+                os.close(_fd)
+            self._apply(job_identifier, command_num, status)
+            self._journal_records += 1
+            if self._journal_records >= self.compact_every:
+                self._compact()
+
+    def is_done(self, job_identifier: str, command_num: str) -> bool:
+        with self._lock:
+            return bool(self.progress.get(job_identifier, {}).get(command_num, False))
+
+    def done_steps(self, job_identifier: str) -> Set[str]:
+        with self._lock:
+            return {each_step for each_step, status in self.progress.get(job_identifier, {}).items() if status}
 
+    def _compact(self) -> None:
+        # other processes may have appended since this one loaded and progress may have been set directly in the
+        # dict, the snapshot is rebuilt from the files then the in memory progress is applied on top
+        _progress = self.progress
+        self._read()
+        for job_identifier, value in _progress.items():
+            for command_num, status in value.items():
+                self._apply(job_identifier, command_num, status)
+        _temp_loc = f"{self.snapshot_loc}.{os.getpid()}.tmp"
+        with open(_temp_loc, "w") as file:
+            file.write(json.dumps(self.progress))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(_temp_loc, self.snapshot_loc)
+        # replaying records already in the snapshot is harmless if the process dies before the truncation
+        with open(self.journal_loc, "w"):
+            pass
+        self._journal_records = 0
 
+    def compact(self) -> None:
+        """ fold the journal into the snapshot """
+        with self._file_lock():
+            self._compact()
+
+    def save(self, logger: Log = None):
+        if self._config.config.get("JOB_PROGRESS_DEFAULT_LOC"):
+            self.compact()
+        else:
+            _common_.error_logger(currentframe().f_code.co_name,
+                                  "Job progress location is not found",
+                                  logger=logger,
+                                  mode="error",
+                                  ignore_flag=False)
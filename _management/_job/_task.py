@@ -1,30 +1,139 @@
-from typing import List, Union, Dict
+import json
+import zlib
+import hashlib
+import threading
+import weakref
+from collections import ChainMap, Counter
+from collections.abc import Mapping
+from typing import Any, Iterator, List, Tuple, Union, Dict
 import networkx as nx
 
 
+__SERIALIZATION_FORMAT__ = 1
+
+
+class EnvironmentLayer(Mapping):
+    __slots__ = ("_variables", "key", "__weakref__")
+
+    def __init__(self, variables: Dict[str, str], key: str):
+        """ read only variables shared by the steps, layers with the same variables are interned and kept once in
+            memory. use environment_layer to get one
+        """
+        self._variables = variables
+        self.key = key
+
+    def __getitem__(self, name: str) -> str:
+        return self._variables[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._variables)
+
+    def __len__(self) -> int:
+        return len(self._variables)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._variables
+
+    def __reduce__(self):
+        # unpickled layers are interned in the receiving process as well
+        return environment_layer, (self._variables,)
+
+
+_LAYERS: "weakref.WeakValueDictionary[str, EnvironmentLayer]" = weakref.WeakValueDictionary()
+_LAYERS_LOCK = threading.Lock()
+
+
+def environment_layer(variables: Mapping) -> EnvironmentLayer:
+    """ the interned layer holding the variables, a copy of them taken once for every step sharing them """
+    if isinstance(variables, EnvironmentLayer):
+        return variables
+    _variables = dict(variables)
+    _key = hashlib.sha1(json.dumps(_variables, sort_keys=True, default=str).encode()).hexdigest()
+    with _LAYERS_LOCK:
+        if (_layer := _LAYERS.get(_key)) is None:
+            _layer = _LAYERS[_key] = EnvironmentLayer(_variables, _key)
+    return _layer
+
+
+class Environment(Mapping):
+    __slots__ = ("layers",)
+
+    def __init__(self, layers: Tuple[EnvironmentLayer, ...] = ()):
+        """ environment variables of a step, a stack of shared layers (the profile first, then the variables of the
+            model or the step) where a later layer overrides an earlier one
+        """
+        self.layers = layers
+
+    def __getitem__(self, name: str) -> str:
+        for _each_layer in reversed(self.layers):
+            if name in _each_layer:
+                return _each_layer[name]
+        raise KeyError(name)
+
+    def __contains__(self, name: object) -> bool:
+        return any(name in each_layer for each_layer in self.layers)
+
+    def __iter__(self) -> Iterator[str]:
+        if len(self.layers) == 1:
+            return iter(self.layers[0])
+        return iter(dict.fromkeys(each_name for each_layer in self.layers for each_name in each_layer))
+
+    def __len__(self) -> int:
+        if len(self.layers) == 1:
+            return len(self.layers[0])
+        return len(set().union(*self.layers))
+
+    def with_overrides(self, overrides: Mapping) -> "Environment":
+        return Environment(self.layers + (environment_layer(overrides),)) if overrides else self
+
+
+def environment(variables: Union[Mapping, None]) -> Environment:
+    """ the environment of a step from a mapping, a ChainMap keeps its maps as separate layers so that the profile
+        shared by many models is stored once
+    """
+    if isinstance(variables, Environment):
+        return variables
+    if isinstance(variables, ChainMap):
+        return Environment(tuple(environment_layer(each_map) for each_map in reversed(variables.maps) if each_map))
+    return Environment((environment_layer(variables or {}),))
+
+
 class Step:
+    __slots__ = ("command", "description", "environment_variables", "metadata", "recovery_command", "step_id")
+
     def __init__(self,
                  command: Union[str, List[str]],
-                 environment_variables: Dict[str, str],
+                 environment_variables: Union[Dict[str, str], Environment],
                  metadata: Dict[str, str],
                  description: str = "",
                  recovery_command: Union[str, List[str]] = None,
+                 overrides: Dict[str, str] = None,
+                 step_id: str = None,
                  ):
         """ contains the step and its associated commands
 
         Args:
             command: list of commands
+            environment_variables: environment of the step, build it once with environment() and pass it to every
+                                   step sharing it, a dict is copied into a layer for each step
+            metadata: directives of the step
             description: description of the step
             recovery_command: recovery command
+            overrides: variables of this step only, on top of environment_variables
+            step_id: identifier of the step, assigned by the task it is added to when not given
 
         """
         if isinstance(command, str):
             self.command = command.split()
         self.command = command
         self.description = description
-        self.environment_variables = environment_variables
+        self.environment_variables = environment(environment_variables).with_overrides(overrides)
         self.metadata = metadata
         self.recovery_command = recovery_command
+        self.step_id = step_id
+
+    def __repr__(self) -> str:
+        return f"Step({self.step_id or ''} {self.description}: {self.command})"
 
     # @property
     # def command(self):
@@ -43,11 +152,17 @@ class Step:
     #     self.description = value
 
 
+def step_id(job_identifier: str, description: str, ordinal: int) -> str:
+    """ identifier of the nth command of a template step in a job, the same on every render of the template """
+    return hashlib.sha1(f"{job_identifier}\0{description}\0{ordinal}".encode()).hexdigest()[:16]
+
+
 class Task:
     def __init__(self, description: str = ""):
         self.tasks = nx.DiGraph()
         self.last_step = None
         self.description = description
+        self._ordinals = Counter()
 
     # @property
     # def description(self):
@@ -57,7 +172,26 @@ class Task:
     # def description(self, value):
     #     self.description = value
 
-    def add_step(self, current_step: Step, previous_step: Step = None):
+    def _assign_id(self, current_step: Step) -> None:
+        if current_step.step_id is None:
+            _ordinal = self._ordinals[current_step.description]
+            self._ordinals[current_step.description] += 1
+            current_step.step_id = step_id(current_step.environment_variables.get("JOB_IDENTIFIER", ""),
+                                           current_step.description,
+                                           _ordinal)
+
+    def add_step(self, current_step: Step, previous_step: Step = None, upstream_steps: List[Step] = None):
+        """ add a step after the previous step, or after the last step added when there is none. steps given in
+            upstream_steps replace the previous step, an empty list adds a step which can start right away
+        """
+        self._assign_id(current_step)
+        if upstream_steps is not None:
+            self.tasks.add_node(current_step, label=current_step.description)
+            for each_step in upstream_steps:
+                self.tasks.add_edge(each_step, current_step)
+            self.last_step = current_step
+            return
+
         if not previous_step:
             previous_step = self.last_step
 
@@ -71,12 +205,76 @@ class Task:
 
         self.last_step = current_step
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {**dag_to_dict(self.tasks), "description": self.description,
+                "last_step": self.last_step.step_id if self.last_step else None}
+
+    @classmethod
+    def from_dict(cls, content: Dict[str, Any]) -> "Task":
+        task = cls(description=content.get("description", ""))
+        task.tasks = dag_from_dict(content)
+        _steps = {each_step.step_id: each_step for each_step in task.tasks.nodes}
+        task.last_step = _steps.get(content.get("last_step"))
+        task._ordinals = Counter(each_step.description for each_step in task.tasks.nodes)
+        return task
+
+    def dumps(self) -> bytes:
+        return zlib.compress(json.dumps(self.to_dict(), separators=(",", ":"), default=str).encode())
+
+    @classmethod
+    def loads(cls, data: bytes) -> "Task":
+        return cls.from_dict(json.loads(zlib.decompress(data)))
 
 
+def dag_to_dict(dag: nx.DiGraph) -> Dict[str, Any]:
+    """ json friendly form of a dag of steps, each environment layer and each directive mapping is written once and
+        the steps refer to them by position
+    """
+    _layers, _metadata, _positions = {}, {}, {}
+    _steps = []
+    for _position, _each_step in enumerate(dag.nodes):
+        _positions[_each_step] = _position
+        _layer_positions = [_layers.setdefault(each_layer.key, (len(_layers), each_layer))[0]
+                            for each_layer in _each_step.environment_variables.layers]
+        # the commands of a template step share its directives
+        _metadata_position = _metadata.setdefault(id(_each_step.metadata), (len(_metadata), _each_step.metadata))[0]
+        _steps.append([_each_step.step_id, _each_step.description, _each_step.command, _layer_positions,
+                       _metadata_position, _each_step.recovery_command])
+    return {"format": __SERIALIZATION_FORMAT__,
+            "layers": [dict(each_layer) for _, each_layer in _layers.values()],
+            "metadata": [each_metadata for _, each_metadata in _metadata.values()],
+            "steps": _steps,
+            "edges": [[_positions[each_upstream], _positions[each_downstream]]
+                      for each_upstream, each_downstream in dag.edges]}
 
 
+def dag_from_dict(content: Dict[str, Any]) -> nx.DiGraph:
+    if content.get("format") != __SERIALIZATION_FORMAT__:
+        raise ValueError(f"unsupported dag format {content.get('format')}, expecting {__SERIALIZATION_FORMAT__}")
+    _layers = [environment_layer(each_layer) for each_layer in content["layers"]]
+    _environments = {}
+    _steps = []
+    for _step_id, _description, _command, _layer_positions, _metadata_position, _recovery_command in content["steps"]:
+        _key = tuple(_layer_positions)
+        if (_environment := _environments.get(_key)) is None:
+            _environment = _environments[_key] = Environment(tuple(_layers[each_position] for each_position in _key))
+        _steps.append(Step(command=_command,
+                           environment_variables=_environment,
+                           metadata=content["metadata"][_metadata_position],
+                           description=_description,
+                           recovery_command=_recovery_command,
+                           step_id=_step_id))
 
+    dag = nx.DiGraph()
+    dag.add_nodes_from((each_step, {"label": each_step.description}) for each_step in _steps)
+    dag.add_edges_from((_steps[each_upstream], _steps[each_downstream]) for each_upstream, each_downstream in content["edges"])
+    return dag
 
 
+def dumps_dag(dag: nx.DiGraph) -> bytes:
+    """ compressed form of a dag of steps, to store it or send it to another worker """
+    return zlib.compress(json.dumps(dag_to_dict(dag), separators=(",", ":"), default=str).encode())
 
 
+def loads_dag(data: bytes) -> nx.DiGraph:
+    return dag_from_dict(json.loads(zlib.decompress(data)))
@@ -0,0 +1,153 @@
+import csv
+import re
+import time
+from collections import ChainMap
+from dataclasses import dataclass, field
+from inspect import currentframe
+from logging import Logger as Log
+from typing import Dict, List, Union
+
+import networkx as nx
+from _common import _common as _common_
+from _config import config as _config_
+from _util import _util_file as _util_file_
+from _pattern_template._process_template import _process_template
+
+
+@dataclass
+class ModelFlow:
+    model: str
+    job_identifier: str
+    task: object = None
+    seconds: float = 0.0
+    error: str = ""
+
+
+@dataclass
+class BatchReport:
+    flows: List[ModelFlow] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def rendered(self) -> List[ModelFlow]:
+        return [each_flow for each_flow in self.flows if each_flow.task is not None]
+
+    @property
+    def failed(self) -> List[ModelFlow]:
+        return [each_flow for each_flow in self.flows if each_flow.task is None]
+
+    def dags(self) -> Dict[str, nx.DiGraph]:
+        """ the dag of each model, to run the models one after another """
+        return {each_flow.model: each_flow.task.tasks for each_flow in self.rendered}
+
+    def merged_dag(self) -> nx.DiGraph:
+        """ one dag with the steps of every model, the models are independent and run concurrently """
+        return nx.compose_all([each_flow.task.tasks for each_flow in self.rendered]) if self.rendered else nx.DiGraph()
+
+    def summary(self) -> str:
+        _timings = sorted(each_flow.seconds for each_flow in self.rendered)
+        _median = _timings[len(_timings) // 2] if _timings else 0.0
+        return (f"{len(self.rendered)} of {len(self.flows)} models rendered in {self.seconds:.2f} seconds, "
+                f"{sum(each_flow.task.tasks.number_of_nodes() for each_flow in self.rendered)} steps, "
+                f"median {_median * 1000:.1f} ms, slowest {(_timings[-1] if _timings else 0.0) * 1000:.1f} ms per model")
+
+
+class _ModelConfig:
+    def __init__(self, config: ChainMap):
+        """ configuration of one model, the variables of its manifest row on top of the shared profile. the steps
+            keep them as separate environment layers, the profile is stored once for every model
+        """
+        self.config = config
+
+
+@_common_.exception_handler
+def load_manifest(filepath: str) -> List[Dict[str, str]]:
+    """ rows of a manifest, a csv file with a header or a yaml / json list of mappings (or a mapping of model to
+        mapping, the model is then the value of the MODEL column)
+    """
+    if filepath.lower().endswith(".csv"):
+        with open(filepath, "r", newline="") as file:
+            return [dict(each_row) for each_row in csv.DictReader(file)]
+
+    _content = _util_file_.yaml_load(filepath)
+    if isinstance(_content, dict):
+        return [{"MODEL": each_model, **(each_row or {})} for each_model, each_row in _content.items()]
+    return list(_content or [])
+
+
+def model_variables(row: Dict) -> Dict[str, str]:
+    """ the template variables of a manifest row, column names are upper cased as the variables of the profile and
+        the values are strings as they end up in the environment of the commands
+    """
+    return {str(each_column).strip().upper(): "" if each_value is None else str(each_value)
+            for each_column, each_value in row.items() if each_column is not None}
+
+
+def process_manifest(config: _config_.ConfigSingleton,
+                     template_name: str,
+                     manifest: Union[str, List[Dict]],
+                     key_column: str = None,
+                     job_identifier: str = None,
+                     limit: int = None,
+                     logger: Log = None) -> BatchReport:
+    """ generate the flow of every model of a manifest in one pass, the template is compiled once and the profile
+        and job progress are loaded once. a model which fails to render is reported and the others still render
+
+    Args:
+        config: configuration object shared by every model
+        template_name: pattern template filepath
+        manifest: manifest filepath or rows
+        key_column: column naming the model, the first column by default
+        job_identifier: prefix of the job identifier of each model, JOB_IDENTIFIER of the profile by default. a
+                        JOB_IDENTIFIER column takes precedence
+        limit: number of models to render, all by default
+        logger: logger object
+
+    Returns: the flow and render time of each model
+
+    """
+    from _job_progress import _job_progress
+
+    _rows = load_manifest(manifest) if isinstance(manifest, str) else manifest
+    if limit:
+        _rows = _rows[:limit]
+    if not _rows:
+        _common_.error_logger(currentframe().f_code.co_name,
+                              f"manifest {manifest if isinstance(manifest, str) else ''} has no model",
+                              logger=logger,
+                              mode="error",
+                              ignore_flag=False)
+
+    _key_column = (key_column or next(iter(_rows[0]))).upper()
+    _job_identifier = job_identifier or config.config.get("JOB_IDENTIFIER") or "batch"
+    _base_config = dict(config.config)
+    _job_progress_ = _job_progress.JobProgress()
+
+    report = BatchReport()
+    _begin = time.perf_counter()
+    for _each_row in _rows:
+        _variables = model_variables(_each_row)
+        _model = _variables.get(_key_column, "")
+        _model_job_identifier = _variables.get("JOB_IDENTIFIER") or f"{_job_identifier}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', _model)}"
+        _flow = ModelFlow(model=_model, job_identifier=_model_job_identifier)
+        _start = time.perf_counter()
+        try:
+            _flow.task = _process_template.process_template(config=_ModelConfig(ChainMap({**_variables,
+                                                                                          "JOB_IDENTIFIER": _model_job_identifier},
+                                                                                         _base_config)),
+                                                            template_name=template_name,
+                                                            job_progress=_job_progress_,
+                                                            logger=logger)
+        except SystemExit as err:
+            # error_logger exits on a model which can not be rendered (missing variable, invalid directive)
+            _flow.error = f"exit code {err.code}"
+        _flow.seconds = time.perf_counter() - _start
+        if _flow.task is None and not _flow.error:
+            _flow.error = "no flow generated"
+        if _flow.error:
+            _common_.info_logger(f"model {_model} failed to render: {_flow.error}", logger=logger)
+        report.flows.append(_flow)
+
+    report.seconds = time.perf_counter() - _begin
+    _common_.info_logger(report.summary(), logger=logger)
+    return report
@@ -1,3 +1,4 @@
+from os import path
 from inspect import currentframe
 from logging import Logger as Log
 from uuid import uuid4
@@ -63,6 +64,7 @@ def detect_template_type(filepath: str,
 @_common_.exception_handler
 def process_template(config: _config_.ConfigSingleton,
                      template_name: object,
+                     job_progress=None,
                      logger: Log = None):
     """ process template which contains a list of commands and then generate a
         self-sufficient flow dag which contains primitives along with
@@ -71,6 +73,7 @@ def process_template(config: _config_.ConfigSingleton,
     Args:
         config: configuration object
         template_name: template in the format python code
+        job_progress: progress of the jobs, loaded from JOB_PROGRESS_DEFAULT_LOC when not given
         logger: logger object
 
     Returns:
@@ -95,11 +98,19 @@ def process_template(config: _config_.ConfigSingleton,
     # load environment variable
     imported_var = set(_config.config.keys())
 
-    template_content = detect_template_type(template_name)
+    # a template file is parsed and compiled once, each flow generated from it only renders its steps
+    compiled_template = None
+    if isinstance(template_name, str) and path.isfile(template_name):
+        compiled_template = _get_template.compile_template(template_name)
+        template_content = compiled_template.content
+    else:
+        template_content = detect_template_type(template_name)
     print(template_content)
 
     print("AAAA")
-    if isinstance(template_content, ModuleType):
+    if compiled_template:
+        expected_var = compiled_template.variables
+    elif isinstance(template_content, ModuleType):
         expected_var = _get_template.extract_variables(template_content)
     else:
         expected_var =  extract_variables_from_text(str(template_content))
@@ -116,7 +127,7 @@ def process_template(config: _config_.ConfigSingleton,
 
     from pprint import pprint
     @_common_.exception_handler
-    def get_directive(command: str) -> Dict[str, str]:
+    def get_directive(command: Union[str, Dict]) -> Dict[str, str]:
 
         supported_directives = {
             # "_LABEL_TASK_": "",
@@ -125,10 +136,15 @@ def process_template(config: _config_.ConfigSingleton,
             # "run_directive": "",
             # "PROCESS_TASK": "",
             "_IGNORE_ERROR_": False,
-            "_TIMEOUT_": "120"
+            "_TIMEOUT_": "120",
+            "_PRIORITY_": "0",
+            "_DEPENDS_ON_": None,
+            "_CACHE_": None,
+            "_INPUTS_": None,
+            "_RESOURCE_": None
         }
 
-        command = {index.upper(): value for index, value in _util_file_.json_loads(command).items()}
+        command = {index.upper(): value for index, value in (_util_file_.json_loads(command) if isinstance(command, str) else command).items()}
 
         all_directives = set(each_directive for each_directive in command.keys() if
                              each_directive.startswith("_") and each_directive.endswith("_"))
@@ -145,9 +161,8 @@ def process_template(config: _config_.ConfigSingleton,
         return supported_directives
 
     @_common_.exception_handler
-    def get_instruction(commands: str) -> List:
-        _util_file_.json_loads(commands)
-        all_commands = _util_file_.json_loads(commands).get("_command_", [])
+    def get_instruction(commands: Union[str, Dict]) -> List:
+        all_commands = (_util_file_.json_loads(commands) if isinstance(commands, str) else commands).get("_command_", [])
         if not isinstance(all_commands, List):
             _common_.error_logger(currentframe().f_code.co_name,
                                   f"expecting a list of commands, getting {all_commands}, expecting {[all_commands]}",
@@ -163,17 +178,41 @@ def process_template(config: _config_.ConfigSingleton,
     from _job_progress import _job_progress
     _progress = _job_progress.JobProgressSingleton()
 
-    _progress.data["__job_progress__"] =_job_progress.JobProgress()
+    _progress.data["__job_progress__"] = job_progress or _job_progress.JobProgress()
 
     if not _config.config.get("JOB_IDENTIFIER"):
         _config.config["JOB_IDENTIFIER"] = uuid4().hex[:10]
 
+    # the steps share one copy of the variables of the profile
+    _environment = _task.environment(_config.config)
+
+    # last step of each template step, _DEPENDS_ON_ lists the template steps a step waits for instead of the
+    # previous one, independent steps then run concurrently
+    last_step_by_name = {}
+
+    def get_upstream_steps(directives: Dict) -> Union[List, None]:
+        if (depends_on := directives.get("_DEPENDS_ON_")) is None:
+            return None
+        if isinstance(depends_on, str):
+            depends_on = [each_name.strip() for each_name in depends_on.split(",") if each_name.strip()]
+        if unknown_steps := [each_name for each_name in depends_on if each_name not in template_content]:
+            _common_.error_logger(currentframe().f_code.co_name,
+                                  f"{', '.join(unknown_steps)} in _DEPENDS_ON_ are not steps of the template",
+                                  logger=logger,
+                                  mode="error",
+                                  ignore_flag=False)
+        # steps completed in a previous run are not in the dag, their dependency is already satisfied
+        return [last_step_by_name[each_name] for each_name in depends_on if each_name in last_step_by_name]
+
     for command_num, commands in template_content.items():
-        if (job_identifier := _config.config.get("JOB_IDENTIFIER")) and (_progress.data["__job_progress__"].progress.get(job_identifier, {}).get(command_num, False)):
+        if (job_identifier := _config.config.get("JOB_IDENTIFIER")) and _progress.data["__job_progress__"].is_done(job_identifier, command_num):
             _common_.info_logger(f"this task already completed successfully, skipping...")
             continue
 
-        _commands = _get_template.render(_util_file_.json_dumps(commands), _config.config).strip()
+        if compiled_template:
+            _commands = compiled_template.render_step(command_num, _config.config)
+        else:
+            _commands = _get_template.render(_util_file_.json_dumps(commands), _config.config).strip()
         _directives = get_directive(_commands)
         # print("@##", counter, _directives, _commands)
         print(_directives)
@@ -183,20 +222,25 @@ def process_template(config: _config_.ConfigSingleton,
         if len(all_commands) == 0 and _directives.get("_RUN_DIRECTIVE_"):
             # if there is no command but only directive, then create a dummy command for it to run
             _curr_step = _task.Step(command="ECHO1",
-                                    environment_variables=_config.config,
+                                    environment_variables=_environment,
                                     metadata=_directives,
                                     description=command_num
                                     )
-            t_task.add_step(_curr_step)
+            t_task.add_step(_curr_step, upstream_steps=get_upstream_steps(_directives))
+            last_step_by_name[command_num] = _curr_step
 
         else:
+            upstream_steps = get_upstream_steps(_directives)
             for command in all_commands:
                 _curr_step = _task.Step(command=command,
-                                        environment_variables=_config.config,
+                                        environment_variables=_environment,
                                         metadata=_directives,
                                         description=command_num
                                         )
-                t_task.add_step(_curr_step)
+                # commands of one template step always run in order
+                t_task.add_step(_curr_step, upstream_steps=upstream_steps)
+                upstream_steps = None
+                last_step_by_name[command_num] = _curr_step
 
     return t_task
 
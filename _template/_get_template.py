@@ -1,24 +1,109 @@
-from tempfile import template
-from typing import List, Set
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Set, Tuple
 from typing import Optional, Dict
+import yaml
 from _common import _common as _common_
-from jinja2 import Template, Environment,meta
+from jinja2 import Template, Environment, meta
+
+
+__MAX_COMPILED_TEMPLATES__ = 256
+
+# one environment for every template, compiled templates are cached by their source
+_ENVIRONMENT_ = Environment()
+_lock = threading.Lock()
+_compiled_templates: "OrderedDict[str, CompiledTemplate]" = OrderedDict()
+_source_hashes: Dict[str, Tuple[int, int, str]] = {}
+
+
+@lru_cache(maxsize=4096)
+def _compile(source: str) -> Template:
+    return _ENVIRONMENT_.from_string(source)
+
+
+@lru_cache(maxsize=4096)
+def _variables(source: str) -> frozenset:
+    return frozenset(meta.find_undeclared_variables(_ENVIRONMENT_.parse(source)))
+
 
 @_common_.exception_handler
 def render(template_name: str,
            parameters: Dict[str, str]) -> str:
-    return Template(template_name).render(parameters)
+    return _compile(template_name).render(parameters)
 
 @_common_.exception_handler
 def extract_variables(template: object) -> set[str]:
 
     from _management._meta import _inspect_module
 
-    env = Environment()
-    parsed_content = env.parse(_inspect_module.get_source(template))
+    return set(_variables(_inspect_module.get_source(template)))
+
+
+class CompiledTemplate:
+    def __init__(self, content: Dict, source_hash: str = ""):
+        """ a pattern template (a mapping of step name to step) parsed once, each step is kept as a compiled jinja
+            template of its json so generating a flow only renders the steps with a set of variables
+
+        Args:
+            content: template content, step name to step
+            source_hash: sha256 of the template source
+        """
+        self.content = content
+        self.source_hash = source_hash
+        self._steps: Dict[str, Template] = {}
+        self.variables: Set[str] = set()
+        for each_name, each_step in content.items():
+            _source = json.dumps(each_step)
+            self._steps[each_name] = _compile(_source)
+            self.variables |= _variables(_source)
+
+    @property
+    def steps(self) -> List[str]:
+        return list(self._steps)
+
+    def render_step(self, step_name: str, parameters: Dict[str, str]) -> Dict:
+        return json.loads(self._steps[step_name].render(parameters))
+
+    def render(self, parameters: Dict[str, str]) -> Dict[str, Dict]:
+        return {each_name: self.render_step(each_name, parameters) for each_name in self._steps}
+
+
+@_common_.exception_handler
+def compile_template(filepath: str) -> CompiledTemplate:
+    """ the compiled template of a yaml or json template file, a file is read again only once it changed on disk
+        and parsed again only if its content changed
+
+    Args:
+        filepath: template filepath
 
-    variables = meta.find_undeclared_variables(parsed_content)
-    return variables
+    Returns: the compiled template
 
+    """
+    _filepath = os.path.abspath(filepath)
+    _stat = os.stat(_filepath)
+    with _lock:
+        _mtime, _size, _hash = _source_hashes.get(_filepath, (None, None, None))
+        if (_mtime, _size) == (_stat.st_mtime_ns, _stat.st_size) and _hash in _compiled_templates:
+            _compiled_templates.move_to_end(_hash)
+            return _compiled_templates[_hash]
 
+    with open(_filepath, "rb") as file:
+        _source = file.read()
+    _hash = hashlib.sha256(_source).hexdigest()
+    with _lock:
+        _source_hashes[_filepath] = (_stat.st_mtime_ns, _stat.st_size, _hash)
+        if _hash in _compiled_templates:
+            _compiled_templates.move_to_end(_hash)
+            return _compiled_templates[_hash]
 
+    # yaml is a superset of json, one parser for both
+    _compiled = CompiledTemplate(yaml.safe_load(_source) or {}, source_hash=_hash)
+    with _lock:
+        _compiled_templates[_hash] = _compiled
+        while len(_compiled_templates) > __MAX_COMPILED_TEMPLATES__:
+            _compiled_templates.popitem(last=False)
+    return _compiled
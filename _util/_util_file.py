@@ -10,7 +10,6 @@ from logging import Logger as Log
 from yaml import Dumper
 
 from _common import _common as _common_
-import pandas as pd
 
 
 
@@ -166,6 +165,8 @@ def identity_load_file(filepath: str, logger: Log = None) -> str:
 
 
 def csv_to_json(filepath: str, logger: Log = None) -> Union[List, Dict]:
+    # pandas is imported on use, it would otherwise be loaded by every module importing _common
+    import pandas as pd
     try:
         return json_loads(pd.read_csv(filepath).to_json(orient="records"))
 
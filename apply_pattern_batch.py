@@ -0,0 +1,95 @@
+import os
+
+import click
+from logging import Logger as Log
+from _common import _common as _common_
+from _error_handling import _error_handling
+from _config import config as _config_
+
+@click.command()
+@click.option('--pattern_template_filepath', required=True, type=str)
+@click.option('--manifest_filepath', required=True, type=str)
+@click.option('--dw_home', required=True, type=str)
+@click.option('--profile_name', required=True, type=str)
+@click.option('--job_identifier', required=True, type=str)
+@click.option('--key_column', required=False, type=str)
+@click.option('--development_env', required=False, type=str)
+@click.option('--mode', required=False, type=click.Choice(["merged", "per_model", "render_only"]), default="merged")
+@click.option('--max_workers', required=False, type=int)
+@click.option('--limit', required=False, type=int)
+@click.option('--dry_run', required=False, type=str)
+def apply_pattern_batch(pattern_template_filepath: str,
+                        manifest_filepath: str,
+                        dw_home: str,
+                        job_identifier: str,
+                        profile_name: str = "default",
+                        key_column: str = None,
+                        development_env: str = "",
+                        mode: str = "merged",
+                        max_workers: int = None,
+                        limit: int = None,
+                        dry_run: bool = False,
+                        logger: Log = None):
+    """ apply a pattern template to every model of a manifest (csv with a header, yaml or json), each column is a
+        template variable. merged runs the steps of every model in one dag, per_model runs the models one after
+        another and render_only only reports the render time of each model
+
+    python apply_pattern_batch.py --pattern_template_filepath _pattern_template/tubibricks_run_model.yaml --manifest_filepath tubi_top_2000.csv --dw_home ~/projects --profile_name config_dev --job_identifier wave_1 --key_column id --mode render_only
+    """
+
+    error_handle = _error_handling.ErrorHandlingSingleton(profile_name=profile_name, error_handler="subprocess")
+
+    from _engine._subprocess import ShellRunner
+    from datetime import datetime
+
+    _common_.info_logger(f"start time:{datetime.now()}")
+
+    from _pattern_template._process_template import _batch_template
+    _config = _config_.ConfigSingleton(profile_name=profile_name)
+    for var_name, var_value in os.environ.items():
+        _config.config[var_name] = var_value
+
+    _config.config["PATTERN_TEMPLATE_FILEPATH"] = pattern_template_filepath
+    _config.config["DW_HOME"] = dw_home
+    _config.config["PROFILE_NAME"] = profile_name
+    _config.config["JOB_IDENTIFIER"] = job_identifier
+
+    if development_env:
+        _config.config["DEPLOYMENT_ENV"] = development_env
+    elif "DEPLOYMENT_ENV" in os.environ:
+        _config.config["DEPLOYMENT_ENV"] = os.environ.get("DEPLOYMENT_ENV")
+
+    if dry_run:
+        _config.config["DRY_RUN"] = dry_run
+    elif "DRY_RUN" in os.environ:
+        _config.config["DRY_RUN"] = os.environ.get("DRY_RUN")
+
+    _common_.info_logger(f"pattern_template_filepath: {pattern_template_filepath}")
+    _common_.info_logger(f"manifest_filepath: {manifest_filepath}")
+    _common_.info_logger(f"profile_name: {profile_name}")
+    _common_.info_logger(f"job_identifier: {job_identifier}")
+    _common_.info_logger(f"mode: {mode}")
+    _common_.info_logger(f"dry_run: {_config.config.get('DRY_RUN')}")
+
+    report = _batch_template.process_manifest(_config,
+                                              pattern_template_filepath,
+                                              manifest_filepath,
+                                              key_column=key_column,
+                                              job_identifier=job_identifier,
+                                              limit=limit,
+                                              logger=logger)
+    for each_flow in report.failed:
+        _common_.info_logger(f"model {each_flow.model} ({each_flow.job_identifier}) not rendered: {each_flow.error}")
+
+    shell_runner = ShellRunner(profile_name=profile_name)
+    if mode == "merged":
+        shell_runner.run_command_from_dag(profile_name, report.merged_dag(), logger=logger, max_workers=max_workers)
+    elif mode == "per_model":
+        for model, dag in report.dags().items():
+            _common_.info_logger(f"running model {model}")
+            shell_runner.run_command_from_dag(profile_name, dag, logger=logger, max_workers=max_workers)
+
+    _common_.info_logger(f"end time:{datetime.now()}")
+
+if __name__ == '__main__':
+    apply_pattern_batch()
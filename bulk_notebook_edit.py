@@ -0,0 +1,79 @@
+import os
+
+import click
+from datetime import datetime
+from logging import Logger as Log
+from _common import _common as _common_
+from _connect import _connect as _connect_
+from _util import _util_file as _util_file_
+
+
+def read_lines(filepath: str):
+    with open(os.path.expanduser(filepath)) as file:
+        return [each_line.strip() for each_line in file if each_line.strip()]
+
+
+@click.command()
+@click.option('--profile_name', required=True, type=str)
+@click.option('--workflow_names_filepath', required=False, type=str)
+@click.option('--notebook_paths_filepath', required=False, type=str)
+@click.option('--roll_date', required=False, type=str)
+@click.option('--search', required=False, type=str, multiple=True)
+@click.option('--replace', required=False, type=str, multiple=True)
+@click.option('--regex', is_flag=True, default=False)
+@click.option('--max_workers', required=False, type=int, default=8)
+@click.option('--rate', required=False, type=str, default="30/1")
+@click.option('--report_filepath', required=False, type=str)
+@click.option('--dry_run', is_flag=True, default=False)
+def bulk_notebook_edit(profile_name: str,
+                       workflow_names_filepath: str = None,
+                       notebook_paths_filepath: str = None,
+                       roll_date: str = None,
+                       search: tuple = (),
+                       replace: tuple = (),
+                       regex: bool = False,
+                       max_workers: int = 8,
+                       rate: str = "30/1",
+                       report_filepath: str = None,
+                       dry_run: bool = False,
+                       logger: Log = None):
+    """ edit the notebooks of many workflows (or workspace paths) concurrently, only the notebooks which changed are
+        uploaded. --roll_date replaces the single date of each notebook as update_note_book does, otherwise each
+        --search is replaced by the --replace at the same position
+
+    python bulk_notebook_edit.py --profile_name config_prod --workflow_names_filepath wave_1_workflows.txt --roll_date 2025-02-01 --dry_run
+    python bulk_notebook_edit.py --profile_name config_prod --notebook_paths_filepath notebooks.txt --search tubidw_dev --replace tubidw
+    """
+    from _databricks import databricks_notebook_pipeline as _notebook_pipeline_
+    from _engine import _admission as _admission_
+
+    if len(search) != len(replace):
+        _common_.error_logger("bulk_notebook_edit",
+                              f"expecting a --replace for each --search, getting {len(search)} search and {len(replace)} replace",
+                              logger=logger,
+                              mode="error",
+                              ignore_flag=False)
+
+    transforms = [_notebook_pipeline_.Transform(search=each_search, replace=each_replace, regex=regex)
+                  for each_search, each_replace in zip(search, replace)]
+    if roll_date:
+        transforms.append(_notebook_pipeline_.Transform(search=r"\d{4}-\d{2}-\d{2}", replace=roll_date, regex=True,
+                                                        max_distinct_matches=1))
+
+    databricks_obj = _connect_.get_directive("databricks_sdk", profile_name)
+    _common_.info_logger(f"start time:{datetime.now()}")
+    report = databricks_obj.bulk_edit_notebooks(transforms,
+                                                notebook_paths=read_lines(notebook_paths_filepath) if notebook_paths_filepath else None,
+                                                workflow_names=read_lines(workflow_names_filepath) if workflow_names_filepath else None,
+                                                max_workers=max_workers,
+                                                rate=next(iter(_admission_.parse_rates(f"{_notebook_pipeline_.__WORKSPACE_API__}={rate}").values())),
+                                                dry_run=dry_run,
+                                                logger=logger)
+    _common_.info_logger(f"{report.summary()}\n{report.table()}", logger=logger)
+    if report_filepath:
+        _util_file_.json_dump(report_filepath, report.to_dict(), logger=logger)
+    _common_.info_logger(f"end time:{datetime.now()}", logger=logger)
+
+
+if __name__ == '__main__':
+    bulk_notebook_edit()
@@ -68,12 +68,18 @@ def database_keep_alive(profile_name: str,
 
     while True:
         try:
+            if _config.refresh():
+                # the profile changed on disk, reconnect with the new settings
+                _common_.info_logger(f"profile {_config.profile_name} changed, reconnecting...", logger=logger)
+                _connect_.close_object("databrickscluster", profile_name, kind="api", logger=logger)
             object_api_databrick = _connect_.get_api("databrickscluster", profile_name)
             _common_.info_logger(object_api_databrick.query("select 1", ignore_error_flg=True), logger=logger)
             _common_.info_logger(f"keep alive {datetime.now()}...", logger=logger)
             sleep(time_interval)
         except Exception as err:
             _common_.info_logger(err, logger=logger)
+            # the cached session may be broken, reconnect on the next round
+            _connect_.close_object("databrickscluster", profile_name, kind="api", logger=logger)
             continue
 
 
@@ -0,0 +1,46 @@
+import click
+from logging import Logger as Log
+from _common import _common as _common_
+from _connect import _connect as _connect_
+
+
+@click.command()
+@click.option('--profile_name', required=True, type=str)
+@click.option('--full', is_flag=True, default=False)
+@click.option('--job_name', required=False, type=str)
+@click.option('--user_name', required=False, type=str)
+@click.option('--notebook_path', required=False, type=str)
+def run_databricks_job_index(profile_name: str,
+                             full: bool = False,
+                             job_name: str = None,
+                             user_name: str = None,
+                             notebook_path: str = None,
+                             logger: Log = None):
+    """ refresh the local index of the databricks jobs of the profile's workspace and look jobs up in it
+
+    python databricks_job_index.py --profile_name config_prod
+    python databricks_job_index.py --profile_name config_prod --full
+    python databricks_job_index.py --profile_name config_prod --job_name "[dev jian_huang] revenue_bydevice_daily"
+    """
+
+    databricks_obj = _connect_.get_directive("databricks_sdk", profile_name)
+    job_index = databricks_obj.job_index()
+    job_index.logger = logger
+
+    if not (job_name or user_name or notebook_path) or full:
+        job_index.refresh(full=full)
+
+    if job_name:
+        for each_job_id in job_index.job_ids(job_name):
+            _common_.info_logger(f"{each_job_id}  {job_index.notebook_path(each_job_id) or ''}", logger=logger)
+    if user_name:
+        for each_job in job_index.jobs_by_creator(user_name):
+            _common_.info_logger(f"{each_job['job_id']}  {each_job['name']}", logger=logger)
+    if notebook_path:
+        for each_job_id in job_index.jobs_by_notebook_path(notebook_path):
+            _common_.info_logger(f"{each_job_id}  {job_index.job(each_job_id)['name']}", logger=logger)
+    _common_.info_logger(job_index.summary(), logger=logger)
+
+
+if __name__ == "__main__":
+    run_databricks_job_index()
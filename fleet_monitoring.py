@@ -0,0 +1,79 @@
+import os
+
+import click
+from datetime import datetime
+from logging import Logger as Log
+from _common import _common as _common_
+from _config import config as _config_
+from _connect import _connect as _connect_
+
+@click.command()
+@click.option('--profile_name', required=True, type=str)
+@click.option('--job_names', required=False, type=str)
+@click.option('--job_names_filepath', required=False, type=str)
+@click.option('--model_names', required=False, type=str)
+@click.option('--user_name', required=False, type=str)
+@click.option('--poll_seconds', required=False, type=int, default=60)
+@click.option('--max_repairs', required=False, type=int, default=3)
+@click.option('--max_seconds', required=False, type=int)
+@click.option('--start_missing', is_flag=True, default=False)
+def fleet_monitoring(profile_name: str,
+                     job_names: str = None,
+                     job_names_filepath: str = None,
+                     model_names: str = None,
+                     user_name: str = None,
+                     poll_seconds: int = 60,
+                     max_repairs: int = 3,
+                     max_seconds: int = None,
+                     start_missing: bool = False,
+                     logger: Log = None):
+    """ this script monitors many databricks workflow jobs from one process and repairs the runs hitting an internal
+        error, instead of one job_monitoring.py process for each job
+
+    python fleet_monitoring.py --profile_name config_dev --job_names_filepath wave_1_jobs.txt
+    python fleet_monitoring.py --profile_name config_dev --user_name jian.huang --model_names revenue_bydevice_daily,active_users_daily
+
+    Args:
+        profile_name: profile, contains environment variables regarding to databricks environment (config_dev, config_prod, config_stage)
+        job_names: comma separated job names or job ids
+        job_names_filepath: file with a job name or job id on each line
+        model_names: comma separated model names, the job of each is named as in job_monitoring.py
+        user_name: the username of the jobs of model_names
+        poll_seconds: seconds between two polls
+        max_repairs: repairs of a job before giving up on it
+        max_seconds: stop monitoring after this long
+        start_missing: run a job which has no run yet
+        logger: logging object
+
+    Returns:
+        return true if every job succeeded otherwise return false
+
+    """
+
+    _config = _config_.ConfigSingleton(profile_name=profile_name)
+
+    jobs = [each_job.strip() for each_job in (job_names or "").split(",") if each_job.strip()]
+    if job_names_filepath:
+        with open(os.path.expanduser(job_names_filepath)) as file:
+            jobs += [each_line.strip() for each_line in file if each_line.strip()]
+    if model_names:
+        _user_name = (user_name or "").replace(".", "_")
+        jobs += [f"[{profile_name.split('_')[1]} {_user_name}] {each_model.strip().lower()}"
+                 for each_model in model_names.split(",") if each_model.strip()]
+    jobs = list(dict.fromkeys(jobs))
+    _common_.info_logger(f"monitoring {len(jobs)} jobs", logger=logger)
+
+    monitor_object = _connect_.get_directive(object_name="databricks_sdk", profile_name=profile_name)
+    _common_.info_logger(f"start time:{datetime.now()}")
+    final_states = monitor_object.monitor_jobs(jobs,
+                                               poll_seconds=poll_seconds,
+                                               max_repairs=max_repairs,
+                                               start_missing=start_missing,
+                                               max_seconds=max_seconds,
+                                               logger=logger)
+    _common_.info_logger(f"end time:{datetime.now()}", logger=logger)
+    return all(each_job.phase == "succeeded" for each_job in final_states.values())
+
+
+if __name__ == '__main__':
+    fleet_monitoring()
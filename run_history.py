@@ -0,0 +1,69 @@
+import time
+
+import click
+from logging import Logger as Log
+from _common import _common as _common_
+from _config import config as _config_
+from _util import _util_file as _util_file_
+from _engine import _run_history as _run_history_
+
+@click.command()
+@click.option('--profile_name', required=False, type=str, default="default")
+@click.option('--run_id', required=False, type=str)
+@click.option('--job_identifier', required=False, type=str)
+@click.option('--top', required=False, type=int, default=10)
+@click.option('--list', 'list_runs', is_flag=True, default=False)
+@click.option('--chrome_trace', required=False, type=str)
+@click.option('--json', 'json_filepath', required=False, type=str)
+def run_history(profile_name: str = "default",
+                run_id: str = None,
+                job_identifier: str = None,
+                top: int = 10,
+                list_runs: bool = False,
+                chrome_trace: str = None,
+                json_filepath: str = None,
+                logger: Log = None):
+    """ report of a dag run from the run history, the critical path and the slowest steps with their queue wait,
+        cpu time, peak memory, output size and exit code. the latest run (of the job) by default
+
+    python run_history.py --profile_name config_dev --job_identifier wave_1
+    python run_history.py --profile_name config_dev --list
+    python run_history.py --profile_name config_dev --run_id 3f2a9c01b7e4 --chrome_trace /tmp/wave_1.json
+
+    Args:
+        profile_name: profile, RUN_HISTORY_LOC is the run history file (~/.deat/run_history.jsonl by default)
+        run_id: the run to report
+        job_identifier: the job of the run
+        top: number of slowest steps
+        list_runs: list the runs instead
+        chrome_trace: write the run in the chrome trace format to this file (chrome://tracing, ui.perfetto.dev)
+        json_filepath: write the run record to this file
+        logger: logging object
+
+    """
+
+    _config = _config_.ConfigSingleton(profile_name=profile_name)
+    history = _run_history_.RunHistory(_config.config.get("RUN_HISTORY_LOC") or _run_history_.__DEFAULT_RUN_HISTORY_LOC__)
+
+    if list_runs:
+        for each_run in history.runs(job_identifier):
+            _common_.info_logger(f"{each_run['run_id']}  "
+                                 f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(each_run['started_at']))}  "
+                                 f"{each_run['seconds']:>8.1f}s  {len(each_run['steps']):>5} steps  "
+                                 f"{each_run['job_identifier']}", logger=logger)
+        return
+
+    if (record := history.get(run_id, job_identifier)) is None:
+        _common_.info_logger(f"no run {run_id or ''} {job_identifier or ''} in {history.filepath}", logger=logger)
+        return
+
+    print(_run_history_.report_text(record, top=top))
+    if chrome_trace:
+        _util_file_.json_dump(chrome_trace, _run_history_.chrome_trace(record), logger=logger)
+        _common_.info_logger(f"chrome trace written to {chrome_trace}", logger=logger)
+    if json_filepath:
+        _util_file_.json_dump(json_filepath, record, logger=logger)
+
+
+if __name__ == '__main__':
+    run_history()